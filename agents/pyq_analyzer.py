@@ -11,25 +11,25 @@ load_dotenv()
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
 
+# Ingestion stores doc_type lowercase (see vectorstore/pipeline.py).
+PYQ_FILTER = {"doc_type": "pyq"}
+
+
 def fetch_pyq_chunks():
     """
     Fetches only PYQ chunks from vector database.
     """
-    from vectorstore.store import get_vector_store
-    vector_store = get_vector_store()
+    from vectorstore.store import iter_chunks
 
-    all_docs = vector_store.get()
     pyq_chunks = []
-
-    for i, doc_id in enumerate(all_docs['ids']):
-        metadata = all_docs['metadatas'][i]
-        if metadata.get('doc_type', '').lower() == 'pyq':
-            pyq_chunks.append({
-                "text": all_docs['documents'][i],
-                "source_file": metadata.get('source_file', 'unknown'),
-                "page_number": metadata.get('page_number', '?'),
-                "subject": metadata.get('subject', 'general')
-            })
+    for chunk in iter_chunks(where=PYQ_FILTER):
+        metadata = chunk['metadata']
+        pyq_chunks.append({
+            "text": chunk['document'],
+            "source_file": metadata.get('source_file', 'unknown'),
+            "page_number": metadata.get('page_number', '?'),
+            "subject": metadata.get('subject', 'general')
+        })
 
     return pyq_chunks
 
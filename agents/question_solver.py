@@ -1,6 +1,7 @@
 import os
 from groq import Groq
 from dotenv import load_dotenv
+from utils.context_formatter import DEFAULT_CONTEXT_TOKENS, pack_context
 
 load_dotenv()
 
@@ -47,25 +48,9 @@ Reply with ONLY the type label, nothing else.
     return q_type
 
 
-def format_context_with_citations(docs):
-    context = ""
-    for i, doc in enumerate(docs):
-        # Handle both Document objects and plain dicts
-        if hasattr(doc, 'metadata'):
-            # ChromaDB Document object
-            source = doc.metadata.get("source_file", "unknown")
-            page = doc.metadata.get("page_number", "?")
-            doc_type = doc.metadata.get("doc_type", "notes")
-            text = doc.page_content[:500]
-        else:
-            # Plain dict
-            source = doc.get("source_file", "unknown")
-            page = doc.get("page_number", "?")
-            doc_type = doc.get("doc_type", "notes")
-            text = doc.get("text", "")[:500]
-
-        context += f"\n[Source {i+1}: {source} | Page {page} | Type: {doc_type}]\n{text}\n"
-    return context
+def format_context_with_citations(docs, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    # Handles both Document objects and plain dicts
+    return pack_context(docs, max_tokens, header="[Source {n}: {source} | Page {page} | Type: {doc_type}]")
 
 
 def get_difficulty_instruction(difficulty):
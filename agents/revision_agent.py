@@ -5,6 +5,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from groq import Groq
 from dotenv import load_dotenv
 from vectorstore.retriever import retrieve_docs
+from utils.context_formatter import REVISION_CONTEXT_TOKENS, pack_context
 
 load_dotenv()
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
@@ -15,17 +16,7 @@ def generate_revision(query, docs, mode="standard"):
     Generates quick revision content from retrieved docs.
     mode: standard, lightning
     """
-    context = ""
-    for i, doc in enumerate(docs):
-        if hasattr(doc, 'page_content'):
-            text = doc.page_content[:400]
-            source = doc.metadata.get('source_file', 'unknown')
-            page = doc.metadata.get('page_number', '?')
-        else:
-            text = doc.get('text', '')[:400]
-            source = doc.get('source_file', 'unknown')
-            page = doc.get('page_number', '?')
-        context += f"\n[Source: {source} | Page {page}]\n{text}\n"
+    context = pack_context(docs, REVISION_CONTEXT_TOKENS, header="[Source: {source} | Page {page}]")
 
     if mode == "lightning":
         prompt = f"""
@@ -92,7 +83,7 @@ def get_revision(query, mode="standard"):
     """
     Main function called by router for revision queries.
     """
-    docs = retrieve_docs(query, k=6)
+    docs = retrieve_docs(query, k=6, mmr=True)
 
     if not docs:
         return "No relevant content found for revision. Please upload study materials first."
@@ -5,8 +5,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from groq import Groq
 from dotenv import load_dotenv
 from vectorstore.retriever import retrieve_docs
-from vectorstore.store import get_vector_store
+from vectorstore.store import iter_chunks
 from collections import defaultdict
+from itertools import islice
 
 load_dotenv()
 groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
@@ -25,10 +26,13 @@ def extract_document_topics():
     Intelligently extracts topics from all uploaded documents.
     Maps topics to their source documents for citations.
     """
-    vector_store = get_vector_store()
-    all_docs = vector_store.get()
+    # Only the first few chunks are sampled, so fetch a single small page
+    sampled_docs = [
+        chunk['document']
+        for chunk in islice(iter_chunks(fields=("documents",), page_size=10), 10)
+    ]
     
-    if not all_docs or not all_docs.get('documents'):
+    if not sampled_docs:
         return {}
     
     client = _get_groq_client()
@@ -36,9 +40,7 @@ def extract_document_topics():
         return {}
     
     # Sample documents to extract key topics
-    sample_size = min(20, len(all_docs['documents']))
-    sampled_docs = all_docs['documents'][:sample_size]
-    sample_text = "\n---\n".join(sampled_docs[:10])
+    sample_text = "\n---\n".join(sampled_docs)
     
     prompt = f"""
 You are an academic curriculum analyst.
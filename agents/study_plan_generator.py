@@ -19,7 +19,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from groq import Groq
 from dotenv import load_dotenv
-from vectorstore.retriever import retrieve_docs
+from vectorstore.retriever import retrieve_docs_batch
 
 load_dotenv()
 
@@ -207,6 +207,12 @@ def map_modules_to_docs(
     """
     mapped_modules = []
     
+    # Retrieve every topic of the syllabus in one batched call
+    all_topics = list(dict.fromkeys(
+        topic for module in modules for topic in module.get("topics", [])
+    ))
+    docs_by_topic = dict(zip(all_topics, retrieve_docs_batch(all_topics, k=retriever_k)))
+    
     for module in modules:
         mapped_module = {
             "module_title": module["module_title"],
@@ -218,8 +224,8 @@ def map_modules_to_docs(
         topic_scores = []
         
         for topic in module.get("topics", []):
-            # Retrieve documents for this topic
-            docs = retrieve_docs(query=topic, k=retriever_k)
+            # Documents retrieved for this topic
+            docs = docs_by_topic[topic]
             
             # Extract and summarize content
             retrieved_chunks = []
@@ -15,7 +15,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from groq import Groq
 from dotenv import load_dotenv
-from vectorstore.retriever import retrieve_docs
+from vectorstore.retriever import retrieve_docs, retrieve_docs_batch
+from utils.context_formatter import pack_context
 
 load_dotenv()
 
@@ -57,34 +58,14 @@ def _extract_sources_from_docs(docs: List[Any]) -> List[str]:
     return sources
 
 
-def _format_context_from_docs(docs: List[Any], max_chars: int = 3000) -> str:
+def _format_context_from_docs(docs: List[Any], max_tokens: int = 750) -> str:
     """
     Format retrieved documents into context string for LLM.
     
-    Includes source markers for traceability.
+    Includes source markers for traceability. Overlapping chunks are merged
+    and the result is kept within max_tokens.
     """
-    context = ""
-    total_chars = 0
-    
-    for i, doc in enumerate(docs):
-        if hasattr(doc, 'metadata'):
-            text = doc.page_content
-            source = doc.metadata.get("source_file", "unknown")
-            page = doc.metadata.get("page_number", "?")
-        else:
-            text = doc.get("text", "")
-            source = doc.get("source_file", "unknown")
-            page = doc.get("page_number", "?")
-        
-        chunk = f"\n[Source {i+1}: {source}, Page {page}]\n{text}\n"
-        
-        if total_chars + len(chunk) > max_chars:
-            break
-        
-        context += chunk
-        total_chars += len(chunk)
-    
-    return context
+    return pack_context(docs, max_tokens, header="[Source {n}: {source}, Page {page}]")
 
 
 def _extract_formulas_from_docs(
@@ -184,7 +165,8 @@ Extract formulas (JSON only, no markdown):"""
 def generate_summary(
     query: str,
     mode: str = "standard",
-    retriever_k: int = 5
+    retriever_k: int = 5,
+    docs: Optional[List[Any]] = None
 ) -> Dict[str, Any]:
     """
     Core summary generator function.
@@ -195,6 +177,7 @@ def generate_summary(
         query: Topic to summarize
         mode: One of ["standard", "revision", "detailed"]
         retriever_k: Number of documents to retrieve
+        docs: Already retrieved documents; skips retrieval when given
         
     Returns:
         JSON with title, content, and sources:
@@ -219,7 +202,8 @@ def generate_summary(
     
     # Retrieve relevant documents
     try:
-        docs = retrieve_docs(query, k=retriever_k)
+        if docs is None:
+            docs = retrieve_docs(query, k=retriever_k, mmr=True)
     except Exception as e:
         return {
             "title": query,
@@ -505,9 +489,16 @@ def generate_summaries_batch(
     Returns:
         List of summary results
     """
+    # Retrieve all topics in one batched call
+    try:
+        docs_per_topic = retrieve_docs_batch(topics, k=retriever_k, mmr=True)
+    except Exception:
+        # Let each generate_summary retrieve (and report errors) on its own
+        docs_per_topic = [None] * len(topics)
+    
     results = []
-    for topic in topics:
-        result = generate_summary(topic, mode=mode, retriever_k=retriever_k)
+    for topic, docs in zip(topics, docs_per_topic):
+        result = generate_summary(topic, mode=mode, retriever_k=retriever_k, docs=docs)
         results.append(result)
     
     return results
@@ -12,7 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from groq import Groq
 from dotenv import load_dotenv
 from vectorstore.retriever import retrieve_docs
-from utils.context_formatter import format_context
+from utils.context_formatter import pack_context
 
 load_dotenv()
 
@@ -25,27 +25,13 @@ def _get_groq_client():
     return Groq(api_key=api_key)
 
 
-def _build_cited_context(docs, max_per_section=400):
+def _build_cited_context(docs, max_tokens=600):
     """
     Build context with clear source markers for citation tracking.
-    Each piece of text is tagged with its source.
+    Each piece of text is tagged with its source; the whole context
+    is kept within max_tokens.
     """
-    context = ""
-    for i, doc in enumerate(docs):
-        if hasattr(doc, 'metadata'):
-            source = doc.metadata.get("source_file", "unknown")
-            page = doc.metadata.get("page_number", "?")
-            doc_type = doc.metadata.get("doc_type", "notes")
-            text = doc.page_content[:max_per_section]
-        else:
-            source = doc.get("source_file", "unknown")
-            page = doc.get("page_number", "?")
-            doc_type = doc.get("doc_type", "notes")
-            text = doc.get("text", "")[:max_per_section]
-        
-        context += f"\n[Source {i+1}: {source} | Page {page}]\n{text}\n"
-    
-    return context
+    return pack_context(docs, max_tokens, header="[Source {n}: {source} | Page {page}]")
 
 
 def generate_standard_summary(query, docs):
@@ -117,7 +103,7 @@ def generate_lightning_summary(query, docs):
     if not client:
         return "Please set GROQ_API_KEY environment variable"
     
-    context = _build_cited_context(docs, max_per_section=300)
+    context = _build_cited_context(docs, max_tokens=450)
     
     prompt = f"""
 You are an expert at creating ultra-concise revision notes for students.
@@ -176,7 +162,7 @@ def generate_detailed_summary(query, docs):
     if not client:
         return "Please set GROQ_API_KEY environment variable"
     
-    context = _build_cited_context(docs, max_per_section=500)
+    context = _build_cited_context(docs, max_tokens=750)
     
     prompt = f"""
 You are an expert professor creating detailed lecture notes for exam preparation.
@@ -322,7 +308,7 @@ def generate_summary(query, format_type="standard"):
         Generated summary with citations
     """
     # Retrieve relevant documents
-    docs = retrieve_docs(query, k=6)
+    docs = retrieve_docs(query, k=6, mmr=True)
     
     if not docs:
         return f"No materials found for '{query}'. Please upload study materials first."
@@ -1,6 +1,7 @@
 import os
 from groq import Groq
 from dotenv import load_dotenv
+from utils.context_formatter import DEFAULT_CONTEXT_TOKENS, pack_context
 
 load_dotenv()
 
@@ -15,22 +16,8 @@ def _get_groq_client():
     return Groq(api_key=api_key)
 
 
-def format_context(docs):
-    context = ""
-    for i, doc in enumerate(docs):
-        if hasattr(doc, 'metadata'):
-            source = doc.metadata.get("source_file", "unknown")
-            page = doc.metadata.get("page_number", "?")
-            doc_type = doc.metadata.get("doc_type", "notes")
-            text = doc.page_content[:500]
-        else:
-            source = doc.get("source_file", "unknown")
-            page = doc.get("page_number", "?")
-            doc_type = doc.get("doc_type", "notes")
-            text = doc.get("text", "")[:500]
-
-        context += f"\n[Source {i+1}: {source} | Page {page} | Type: {doc_type}]\n{text}\n"
-    return context
+def format_context(docs, max_tokens=DEFAULT_CONTEXT_TOKENS):
+    return pack_context(docs, max_tokens, header="[Source {n}: {source} | Page {page} | Type: {doc_type}]")
 
 
 def get_difficulty_instruction(difficulty):
@@ -2,7 +2,7 @@ import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from agents.pyq_analyzer import analyze_pyq_frequency
+from agents.pyq_analyzer import PYQ_FILTER, analyze_pyq_frequency
 
 
 def get_heatmap_data():
@@ -34,19 +34,14 @@ def get_subject_wise_heatmap_data():
     Gets topic frequency broken down by subject.
     Returns dict with subject as key and topic frequencies as value.
     """
-    from vectorstore.store import get_vector_store
-    vector_store = get_vector_store()
+    from vectorstore.store import iter_chunks
 
-    all_docs = vector_store.get()
     subject_chunks = {}
-
-    for i, doc_id in enumerate(all_docs['ids']):
-        metadata = all_docs['metadatas'][i]
-        if metadata.get('doc_type', '').lower() == 'pyq':
-            subject = metadata.get('subject', 'general')
-            if subject not in subject_chunks:
-                subject_chunks[subject] = []
-            subject_chunks[subject].append(all_docs['documents'][i])
+    for chunk in iter_chunks(where=PYQ_FILTER):
+        subject = chunk['metadata'].get('subject', 'general')
+        if subject not in subject_chunks:
+            subject_chunks[subject] = []
+        subject_chunks[subject].append(chunk['document'])
 
     return subject_chunks
 
@@ -0,0 +1,177 @@
+"""
+Benchmark: sparse-matrix BM25 engine vs rank_bm25.
+
+Builds a synthetic Zipf-distributed corpus (roughly the token count of a
+600-character chunk per document) and measures build time, single-query
+latency and batched-query latency for both engines, filtered latency on
+one partition, and checks that the top-k scores agree.
+
+Then fills an on-disk BM25Index (--index-docs chunks, written in batches
+of --write-batch like the ingestion pipeline) and times what the first
+query after a write pays: loading the snapshot from scratch versus
+bringing the cached one up to date with one more batch.
+
+Usage:
+    python benchmarks/bench_bm25.py
+    python benchmarks/bench_bm25.py --sizes 10000 100000 1000000 --rank-bm25-max 100000
+    python benchmarks/bench_bm25.py --sizes --index-docs 100000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from vectorstore import bm25_index
+from vectorstore.bm25_index import BM25Index
+from vectorstore.bm25_matrix import BM25Matrix
+
+
+def make_corpus(n_docs, vocab_size, doc_len, seed=0):
+    """Return (vocab, term_rows, doc_cols, tfs, doc_lengths, (docs, terms)) without Python loops."""
+    rng = np.random.default_rng(seed)
+    lengths = rng.poisson(doc_len, n_docs).clip(min=5)
+    terms = (rng.zipf(1.2, lengths.sum()) - 1) % vocab_size
+    docs = np.repeat(np.arange(n_docs), lengths)
+
+    keys, tfs = np.unique(docs * vocab_size + terms, return_counts=True)
+    doc_cols, term_rows = np.divmod(keys, vocab_size)
+    vocab = {f"t{i}": i for i in range(vocab_size)}
+    return vocab, term_rows, doc_cols, tfs, lengths, (docs, terms)
+
+
+def make_queries(n_queries, vocab_size, seed=1):
+    rng = np.random.default_rng(seed)
+    return [
+        [f"t{t}" for t in (rng.zipf(1.2, rng.integers(2, 6)) - 1) % vocab_size]
+        for _ in range(n_queries)
+    ]
+
+
+def time_it(fn, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def bench(n_docs, args):
+    print(f"\n=== {n_docs:,} chunks ===")
+    vocab, term_rows, doc_cols, tfs, lengths, (docs, terms) = make_corpus(
+        n_docs, args.vocab_size, args.doc_len
+    )
+    queries = make_queries(args.queries, args.vocab_size)
+    if n_docs > args.rank_bm25_max:
+        del docs, terms  # only needed to build the rank_bm25 corpus
+
+    build, matrix = time_it(
+        lambda: BM25Matrix(vocab, term_rows, doc_cols, tfs, lengths)
+    )
+    print(f"  matrix build:           {build:8.3f} s  (nnz={matrix.nnz:,})")
+
+    single, _ = time_it(
+        lambda: [matrix.top_k_batch([q], args.top_k) for q in queries]
+    )
+    print(f"  matrix per query:       {single / len(queries) * 1000:8.3f} ms")
+
+    batched, matrix_top = time_it(lambda: matrix.top_k_batch(queries, args.top_k))
+    print(f"  matrix batched / query: {batched / len(queries) * 1000:8.3f} ms")
+
+    # Filtered search: one of --partitions equally sized (subject, doc_type) blocks.
+    del matrix
+    keys = np.random.default_rng(2).integers(0, args.partitions, n_docs)
+    partitioned = BM25Matrix(vocab, term_rows, doc_cols, tfs, lengths, partition_keys=keys.tolist())
+    filtered, _ = time_it(lambda: partitioned.top_k_batch(queries, args.top_k, keys=[0]))
+    print(f"  filtered 1/{args.partitions} / query:  {filtered / len(queries) * 1000:8.3f} ms")
+
+    if n_docs > args.rank_bm25_max:
+        print(f"  rank_bm25:              skipped (> --rank-bm25-max {args.rank_bm25_max:,})")
+        return
+
+    bounds = np.cumsum(lengths)[:-1]
+    corpus = [[f"t{t}" for t in doc] for doc in np.split(terms, bounds)]
+    build, reference = time_it(lambda: BM25Okapi(corpus))
+    print(f"  rank_bm25 build:        {build:8.3f} s")
+
+    def rank_bm25_top_k():
+        out = []
+        for q in queries:
+            scores = reference.get_scores(q)
+            top = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:args.top_k]
+            out.append([(i, scores[i]) for i in top if scores[i] > 0])
+        return out
+
+    single, reference_top = time_it(rank_bm25_top_k)
+    print(f"  rank_bm25 per query:    {single / len(queries) * 1000:8.3f} ms")
+
+    max_diff = max(
+        (abs(a[1] - b[1]) for mine, ref in zip(matrix_top, reference_top)
+         for a, b in zip(mine, ref)),
+        default=0.0
+    )
+    print(f"  max top-k score diff:   {max_diff:.2e}")
+
+
+def bench_reload(args):
+    n_docs, batch = args.index_docs, args.write_batch
+    print(f"\n=== on-disk index, {n_docs:,} chunks, {batch}-chunk writes ===")
+    _, _, _, _, lengths, (_, terms) = make_corpus(n_docs + batch, args.vocab_size, args.doc_len)
+    bounds = np.cumsum(lengths)[:-1]
+    texts = [" ".join(f"t{t}" for t in doc) for doc in np.split(terms, bounds)]
+    metas = [{"subject": f"s{i % 5}", "doc_type": "notes"} for i in range(len(texts))]
+    queries = [" ".join(q) for q in make_queries(args.queries, args.vocab_size)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(os.path.join(tmp, "bm25.sqlite3"))
+        start = time.perf_counter()
+        for i in range(0, n_docs, batch):
+            end = min(i + batch, n_docs)
+            index.add([f"c{j}" for j in range(i, end)], texts[i:end], metas[i:end])
+        print(f"  write:                  {time.perf_counter() - start:8.3f} s")
+
+        full, _ = time_it(lambda: index.search(queries[0], args.top_k))
+        print(f"  first query, full load: {full * 1000:8.1f} ms")
+
+        ids = [f"c{j}" for j in range(n_docs, n_docs + batch)]
+        index.add(ids, texts[n_docs:], metas[n_docs:])
+        # A write that replaces chunks, like re-ingesting a changed page.
+        index.add(ids[:batch // 2], texts[:batch // 2], metas[:batch // 2])
+        delta, updated = time_it(lambda: index.search_batch(queries, args.top_k))
+        print(f"  first query after write, update cached: {delta * 1000:8.1f} ms")
+
+        bm25_index._snapshots.pop(index.path)
+        reload, fresh = time_it(lambda: index.search_batch(queries, args.top_k))
+        print(f"  first query after write, full reload:   {reload * 1000:8.1f} ms")
+        print(f"  results identical:      {updated == fresh}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--rank-bm25-max", type=int, default=100_000,
+                        help="Largest corpus to run rank_bm25 on (it is slow and memory hungry).")
+    parser.add_argument("--vocab-size", type=int, default=50_000)
+    parser.add_argument("--doc-len", type=int, default=90)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--partitions", type=int, default=20,
+                        help="Number of filter partitions for the filtered-search timing.")
+    parser.add_argument("--index-docs", type=int, default=20_000,
+                        help="Chunks in the on-disk index for the reload timing (0 to skip).")
+    parser.add_argument("--write-batch", type=int, default=256)
+    args = parser.parse_args()
+
+    for n_docs in args.sizes:
+        bench(n_docs, args)
+    if args.index_docs:
+        bench_reload(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark: how deep does each search leg need to fetch for a stable top-k?
+
+Simulates the two legs of retrieve_docs over a synthetic corpus. Each
+query has a hidden relevance per chunk; the vector leg sees it through
+noisy similarity scores in [0, 1], the BM25 leg only scores chunks that
+share terms with the query, on an unbounded scale. For each fusion method
+the top-k fused from `depth` candidates per leg is compared against the
+top-k fused from the full candidate lists.
+
+Reports, per k / method / depth, the mean top-k overlap with the full-depth
+answer, the share of queries whose top-k is identical (same docs, same
+order), recall against the top-k by hidden relevance and the fusion time.
+
+Usage:
+    python benchmarks/bench_fusion.py
+    python benchmarks/bench_fusion.py --ks 4 6 --queries 500
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_core.documents import Document
+
+from vectorstore.fusion import FUSION_METHODS, fuse
+
+FULL_DEPTH = 200
+
+
+def make_legs(rng, n_docs, docs):
+    """Ranked (doc, score) lists for one query, FULL_DEPTH long per leg."""
+    relevance = rng.standard_normal(n_docs)
+
+    similarity = np.clip(0.5 + 0.12 * relevance + 0.04 * rng.standard_normal(n_docs), 0, 1)
+    vector_order = np.argsort(-similarity)[:FULL_DEPTH]
+
+    # BM25 only sees chunks sharing a query term.
+    lexical = rng.random(n_docs) < 0.6
+    bm25 = np.where(lexical, np.exp(0.6 * relevance + 0.3 * rng.standard_normal(n_docs)) * 4, 0)
+    bm25_order = [i for i in np.argsort(-bm25)[:FULL_DEPTH] if bm25[i] > 0]
+
+    truth = [f"c{i}" for i in np.argsort(-relevance)]
+    return truth, {
+        "vector": [(docs[i], float(similarity[i])) for i in vector_order],
+        "bm25": [(docs[i], float(bm25[i])) for i in bm25_order],
+    }
+
+
+def truncate(legs, depth):
+    return {name: results[:depth] for name, results in legs.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--ks", type=int, nargs="+", default=[4, 6, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    docs = [Document(page_content=f"chunk {i}", id=f"c{i}") for i in range(args.docs)]
+    queries = [make_legs(rng, args.docs, docs) for _ in range(args.queries)]
+
+    for k in args.ks:
+        depths = sorted({k, k + 2, k + k // 2, 2 * k, 3 * k, 5 * k})
+        print(f"\n=== top-{k} ({args.queries} queries, {args.docs:,} chunks) ===")
+        print(f"  {'method':7s} {'depth':>5s} {'overlap':>8s} {'identical':>10s} {'recall':>7s} {'fuse ms':>8s}")
+        for method in FUSION_METHODS:
+            reference = [[doc.id for doc, _, _ in fuse(legs, k, method)] for _, legs in queries]
+            for depth in depths:
+                start = time.perf_counter()
+                answers = [[doc.id for doc, _, _ in fuse(truncate(legs, depth), k, method)] for _, legs in queries]
+                elapsed = (time.perf_counter() - start) / len(queries) * 1000
+
+                overlap = np.mean([len(set(a) & set(r)) / k for a, r in zip(answers, reference)])
+                identical = np.mean([a == r for a, r in zip(answers, reference)])
+                recall = np.mean([len(set(a) & set(truth[:k])) / k for a, (truth, _) in zip(answers, queries)])
+                print(f"  {method:7s} {depth:5d} {overlap:8.3f} {identical:10.1%} {recall:7.3f} {elapsed:8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark: per-page text extraction throughput of each PDF engine.
+
+Runs every engine in document_processor/pdf_engines.py over the PDFs in
+sample_docs (or the files given) and reports pages/sec, plus how much
+text each engine found relative to pdfplumber and on how many pages
+extract_tables ran / found a table.
+
+Usage:
+    python benchmarks/bench_pdf_engines.py
+    python benchmarks/bench_pdf_engines.py --repeat 5 path/to/book.pdf
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processor.pdf_engines import PDF_ENGINES, open_pdf_engine
+
+SAMPLE_DOCS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_docs")
+
+
+def extract(filepath, engine):
+    """Extract every page; returns (page count, characters, seconds, table stats)."""
+    start = time.perf_counter()
+    chars = 0
+    with open_pdf_engine(filepath, engine) as pdf:
+        pages = len(pdf)
+        for page_num in range(pages):
+            chars += len(pdf.page_text(page_num))
+    return pages, chars, time.perf_counter() - start, pdf.table_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(SAMPLE_DOCS, "*.pdf")))
+    totals = {engine: [0, 0.0] for engine in PDF_ENGINES}
+
+    for filepath in files:
+        print(f"\n=== {os.path.basename(filepath)} ===")
+        reference_chars = None
+        for engine in ("pdfplumber",) + tuple(e for e in PDF_ENGINES if e != "pdfplumber"):
+            best = None
+            for _ in range(args.repeat):
+                pages, chars, seconds, tables = extract(filepath, engine)
+                best = seconds if best is None else min(best, seconds)
+            if reference_chars is None:
+                reference_chars = chars
+            totals[engine][0] += pages
+            totals[engine][1] += best
+            text_ratio = f"{chars / reference_chars:5.2f}x" if reference_chars else "  n/a"
+            print(f"  {engine:10s} {pages:4d} pages | {best * 1000:8.1f} ms | "
+                  f"{pages / best:8.1f} pages/s | text {text_ratio} pdfplumber | "
+                  f"tables {tables['found']}/{tables['attempted']} attempted")
+
+    print("\n=== all files ===")
+    for engine, (pages, seconds) in totals.items():
+        if seconds:
+            print(f"  {engine:10s} {pages:4d} pages | {pages / seconds:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: resident memory while streaming a large PDF page by page.
+
+Writes a synthetic textbook (default 1000 pages of text, a ruled table on
+every tenth page) with pypdfium2, then reads it in a fresh process per
+mode and samples that process's RSS as pages go by:
+
+    pdfium      open_pdf_engine(..., "pdfium").iter_pages()
+    pdfplumber  open_pdf_engine(..., "pdfplumber").iter_pages()
+    ocr         render + OCR through ocr_pdf_pages (in-process, 300 dpi;
+                OCR itself may fail without tesseract, rendering still runs)
+
+A streaming reader should show flat RSS after the first few pages rather
+than growth proportional to the page count.
+
+Linux only (reads RSS from /proc).
+
+Usage:
+    python benchmarks/bench_pdf_memory.py
+    python benchmarks/bench_pdf_memory.py --pages 2000 --ocr-pages 50
+"""
+
+import argparse
+import ctypes
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pypdfium2
+import pypdfium2.raw as pdfium_c
+
+LINES_PER_PAGE = 40
+TABLE_EVERY = 10
+
+
+def rss_mb():
+    """Current resident set size of this process."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def write_synthetic_pdf(path, n_pages):
+    """n_pages of numbered text lines; every TABLE_EVERY-th page has a ruled 3 x 3 table."""
+    doc = pypdfium2.PdfDocument.new()
+
+    def text(page, value, x, y):
+        obj = pdfium_c.FPDFPageObj_NewTextObj(doc.raw, b"Helvetica", ctypes.c_float(10))
+        buffer = ctypes.create_string_buffer((value + "\0").encode("utf-16-le"))
+        pdfium_c.FPDFText_SetText(obj, ctypes.cast(buffer, ctypes.POINTER(pdfium_c.FPDF_WCHAR)))
+        pdfium_c.FPDFPageObj_Transform(obj, 1, 0, 0, 1, x, y)
+        pdfium_c.FPDFPage_InsertObject(page.raw, obj)
+
+    def line(page, x0, y0, x1, y1):
+        path = pdfium_c.FPDFPageObj_CreateNewPath(x0, y0)
+        pdfium_c.FPDFPath_LineTo(path, x1, y1)
+        pdfium_c.FPDFPath_SetDrawMode(path, pdfium_c.FPDF_FILLMODE_NONE, True)
+        pdfium_c.FPDFPage_InsertObject(page.raw, path)
+
+    for page_num in range(n_pages):
+        page = doc.new_page(612, 792)
+        lines = LINES_PER_PAGE // 2 if page_num % TABLE_EVERY == 0 else LINES_PER_PAGE
+        for i in range(lines):
+            text(page, f"Page {page_num + 1} line {i + 1}: process scheduling, paging "
+                       f"and deadlock avoidance in operating systems.", 60, 740 - 17 * i)
+        if page_num % TABLE_EVERY == 0:
+            xs, ys = [72, 200, 330, 460], [300, 280, 260, 240]
+            for y in ys:
+                line(page, xs[0], y, xs[-1], y)
+            for x in xs:
+                line(page, x, ys[0], x, ys[-1])
+            for row in range(3):
+                for col in range(3):
+                    text(page, f"r{row}c{col}", xs[col] + 5, ys[row + 1] + 5)
+        pdfium_c.FPDFPage_GenerateContent(page.raw)
+        page.close()
+
+    doc.save(path)
+    doc.close()
+
+
+def run_mode(mode, path, n_pages, samples, result):
+    from document_processor.ocr_loader import ocr_pdf_pages
+    from document_processor.pdf_engines import open_pdf_engine
+
+    every = max(1, n_pages // samples)
+    trace = []
+    baseline = rss_mb()
+    start = time.perf_counter()
+
+    if mode == "ocr":
+        for i, _ in enumerate(ocr_pdf_pages(path, range(n_pages), workers=1), start=1):
+            if i % every == 0:
+                trace.append((i, rss_mb() - baseline))
+    else:
+        with open_pdf_engine(path, mode) as pdf:
+            for i, _ in enumerate(pdf.iter_pages(), start=1):
+                if i % every == 0:
+                    trace.append((i, rss_mb() - baseline))
+
+    result["seconds"] = time.perf_counter() - start
+    result["trace"] = trace
+
+
+def measure(mode, path, n_pages, samples):
+    with mp.Manager() as manager:
+        result = manager.dict()
+        process = mp.Process(target=run_mode, args=(mode, path, n_pages, samples, result))
+        process.start()
+        process.join()
+        return dict(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--ocr-pages", type=int, default=40)
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["pdfium", "pdfplumber", "ocr"])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.pdf")
+        start = time.perf_counter()
+        write_synthetic_pdf(path, args.pages)
+        print(f"wrote {args.pages} pages ({os.path.getsize(path) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        for mode in args.modes:
+            n_pages = args.ocr_pages if mode == "ocr" else args.pages
+            result = measure(mode, path, n_pages, args.samples)
+            trace = result.get("trace") or [(0, 0.0)]
+            print(f"\n=== {mode}: {n_pages} pages in {result.get('seconds', 0):.1f}s ===")
+            print("  " + " ".join(f"{pages:>6d}" for pages, _ in trace) + "  pages")
+            print("  " + " ".join(f"{mb:6.1f}" for _, mb in trace) + "  MB above start")
+            first, last = trace[0][1], trace[-1][1]
+            print(f"  growth after first sample: {last - first:+.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
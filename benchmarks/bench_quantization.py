@@ -0,0 +1,143 @@
+"""
+Benchmark: recall vs memory for int8 quantized search in the flat backend.
+
+Writes clustered synthetic 384-dim unit vectors (closer to sentence
+embeddings than uniform noise) to a FlatVectorStore, then searches them in
+a fresh process with float16 and with int8 first-pass scans. Reports the
+store's size on disk with and without the int8 codes, query latency, the
+size of the scanned vectors next to the float16 matrix the store holds,
+serving RSS, recall@k against exact float32 search and how much the int8
+top-k differs from the float16 top-k that retrieve_docs uses today.
+
+Linux only (reads the serving process's RSS from /proc).
+
+Usage:
+    python benchmarks/bench_quantization.py
+    python benchmarks/bench_quantization.py --sizes 100000 300000 --top-k 8
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def rss_mb():
+    """Current resident set size of this process."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+DIM = 384
+
+
+def make_vectors(n, n_clusters=200, seed=0):
+    """Unit vectors scattered around random topic centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, DIM)).astype(np.float32)
+    vectors = centres[rng.integers(0, n_clusters, n)] + 0.8 * rng.standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(n_queries):
+    """Queries drawn around the same topic centres as the corpus."""
+    rng = np.random.default_rng(1)
+    centres = np.random.default_rng(0).standard_normal((200, DIM)).astype(np.float32)
+    queries = centres[rng.integers(0, 200, n_queries)] + 0.8 * rng.standard_normal((n_queries, DIM)).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def write_store(path, n_docs, quantization=None, batch=10000):
+    from vectorstore.flat_store import FlatVectorStore
+    vectors = make_vectors(n_docs)
+    store = FlatVectorStore(path, embedding_function=None, quantization=quantization)
+    for i in range(0, n_docs, batch):
+        ids = [f"c{j}" for j in range(i, min(i + batch, n_docs))]
+        store.upsert_vectors(ids, vectors[i:i + len(ids)], [f"chunk {j}" for j in range(i, i + len(ids))],
+                             [{"subject": "os", "doc_type": "notes"}] * len(ids))
+
+
+def query_store(path, quantization, n_queries, top_k, result):
+    from vectorstore.flat_store import FlatVectorStore
+    queries = make_queries(n_queries)
+    baseline = rss_mb()
+    store = FlatVectorStore(path, embedding_function=None, quantization=quantization)
+    times, hits = [], []
+    for q in queries:
+        start = time.perf_counter()
+        found = store.similarity_search_by_vector_with_relevance_scores(q, k=top_k)
+        times.append(time.perf_counter() - start)
+        hits.append([int(doc.id[1:]) for doc, _ in found])
+    result["ms"] = float(np.median(times) * 1000)
+    result["hits"] = hits
+    result["rss_mb"] = rss_mb() - baseline
+
+
+def disk_mb(path):
+    return sum(entry.stat().st_blocks * 512 for entry in os.scandir(path)) / 2**20
+
+
+def bench(n_docs, args):
+    print(f"\n=== {n_docs:,} chunks ===")
+    vectors = make_vectors(n_docs)
+    queries = make_queries(args.queries)
+    truth = [set(np.argsort(-row)[:args.top_k]) for row in queries @ vectors.T]
+    del vectors
+
+    scanned_mb = {None: n_docs * DIM * 2 / 2**20, "int8": n_docs * (DIM + 4) / 2**20}
+
+    ctx = mp.get_context("spawn")
+    path = tempfile.mkdtemp(prefix="bench_quant_")
+    try:
+        with ctx.Pool(1) as pool:
+            pool.apply(write_store, (path, n_docs))
+            float16_disk = disk_mb(path)
+            shutil.rmtree(path)
+            pool.apply(write_store, (path, n_docs, "int8"))
+        print(f"  store on disk: float16 only {float16_disk:7.1f} MB, with int8 codes {disk_mb(path):7.1f} MB")
+        found = {}
+        for quantization in (None, "int8"):
+            with ctx.Manager() as manager:
+                result = manager.dict()
+                proc = ctx.Process(target=query_store,
+                                   args=(path, quantization, args.queries, args.top_k, result))
+                proc.start()
+                proc.join()
+                result = dict(result)
+            found[quantization] = result["hits"]
+            recall = np.mean([len(set(h) & t) / args.top_k for h, t in zip(result["hits"], truth)])
+            name = quantization or "float16"
+            print(f"  {name:7s} scan {scanned_mb[quantization]:7.1f} MB"
+                  f" ({scanned_mb[None] / scanned_mb[quantization]:.1f}x smaller than float16)"
+                  f" | serving RSS +{result['rss_mb']:6.0f} MB | query {result['ms']:6.2f} ms"
+                  f" | recall@{args.top_k} {recall:.4f}")
+
+        same = np.mean([a == b for a, b in zip(found[None], found["int8"])])
+        overlap = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(found[None], found["int8"])])
+        print(f"  int8 vs float16: identical ranked top-{args.top_k} {same:.1%}, overlap {overlap:.4f}")
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 300_000])
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=4)
+    args = parser.parse_args()
+
+    for n_docs in args.sizes:
+        bench(n_docs, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Benchmark: Chroma persistent client vs the memory-mapped flat backend.
+
+Writes the same random unit vectors (MiniLM-sized, 384 dims) with subject /
+doc_type metadata to both backends, then opens each store in a fresh
+process and measures unfiltered and filtered query latency, the RSS of
+that serving process and top-k overlap with exact float32 search.
+
+Linux only (reads the serving process's RSS from /proc).
+
+Usage:
+    python benchmarks/bench_vector_backends.py
+    python benchmarks/bench_vector_backends.py --sizes 50000 200000 --queries 100
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def rss_mb():
+    """Current resident set size of this process."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+SUBJECTS = ["os", "dbms", "cn", "ds", "algo"]
+DOC_TYPES = ["notes", "pyq", "textbook", "lecture_slides"]
+DIM = 384
+
+
+def unit_vectors(n, seed):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_corpus(n_docs, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    subjects = rng.integers(0, len(SUBJECTS), n_docs)
+    doc_types = rng.integers(0, len(DOC_TYPES), n_docs)
+    return unit_vectors(n_docs, seed), subjects, doc_types
+
+
+def make_queries(n_queries, seed=2):
+    return unit_vectors(n_queries, seed)
+
+
+def open_store(backend, path):
+    if backend == "flat":
+        from vectorstore.flat_store import FlatVectorStore
+        return FlatVectorStore(path, embedding_function=None)
+    from langchain_chroma import Chroma
+    return Chroma(collection_name="bench", embedding_function=None, persist_directory=path)
+
+
+def write_store(backend, path, n_docs, batch=5000):
+    vectors, subjects, doc_types = make_corpus(n_docs)
+    store = open_store(backend, path)
+    start = time.perf_counter()
+    for i in range(0, n_docs, batch):
+        ids = [f"c{j}" for j in range(i, min(i + batch, n_docs))]
+        texts = [f"chunk {j}" for j in range(i, i + len(ids))]
+        metas = [{"subject": SUBJECTS[subjects[j]], "doc_type": DOC_TYPES[doc_types[j]]}
+                 for j in range(i, i + len(ids))]
+        if backend == "flat":
+            store.upsert_vectors(ids, vectors[i:i + len(ids)], texts, metas)
+        else:
+            store._collection.upsert(ids=ids, embeddings=vectors[i:i + len(ids)],
+                                     documents=texts, metadatas=metas)
+    return time.perf_counter() - start
+
+
+def query_store(backend, path, n_queries, top_k, result):
+    queries = make_queries(n_queries)
+    # Import the backend's libraries first so only the opened index counts.
+    if backend == "flat":
+        import vectorstore.flat_store  # noqa: F401
+    else:
+        import langchain_chroma  # noqa: F401
+    baseline = rss_mb()
+    store = open_store(backend, path)
+    where = {"$and": [{"subject": "os"}, {"doc_type": "pyq"}]}
+
+    def run(filter_):
+        times, hits = [], []
+        for q in queries:
+            start = time.perf_counter()
+            found = store.similarity_search_by_vector_with_relevance_scores(q.tolist(), k=top_k, filter=filter_)
+            times.append(time.perf_counter() - start)
+            hits.append([int(doc.page_content.split()[1]) for doc, _ in found])
+        return np.median(times) * 1000, hits
+
+    result["unfiltered_ms"], result["hits"] = run(None)
+    result["filtered_ms"], _ = run(where)
+    result["rss_mb"] = rss_mb() - baseline
+
+
+def exact_top_k(n_docs, n_queries, top_k):
+    vectors, _, _ = make_corpus(n_docs)
+    scores = make_queries(n_queries) @ vectors.T
+    return [list(np.argsort(-row)[:top_k]) for row in scores]
+
+
+def bench(n_docs, args):
+    print(f"\n=== {n_docs:,} chunks ===")
+    ctx = mp.get_context("spawn")
+    truth = exact_top_k(n_docs, args.queries, args.top_k)
+
+    for backend in ("chroma", "flat"):
+        path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+        try:
+            with ctx.Pool(1) as pool:
+                write_s = pool.apply(write_store, (backend, path, n_docs))
+            with ctx.Manager() as manager:
+                result = manager.dict()
+                proc = ctx.Process(target=query_store,
+                                   args=(backend, path, args.queries, args.top_k, result))
+                proc.start()
+                proc.join()
+                result = dict(result)
+            recall = np.mean([len(set(h) & set(t)) / args.top_k for h, t in zip(result["hits"], truth)])
+            print(f"  {backend:6s} write {write_s:7.1f} s | query {result['unfiltered_ms']:7.2f} ms"
+                  f" | filtered {result['filtered_ms']:6.2f} ms | serving RSS +{result['rss_mb']:6.0f} MB"
+                  f" | recall@{args.top_k} {recall:.3f}")
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20_000, 100_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    for n_docs in args.sizes:
+        bench(n_docs, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,12 @@
 
 import sys
 import os
+from itertools import islice
 
 # Add parent to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from vectorstore.store import get_vector_store
+from vectorstore.store import count_chunks, get_vector_store, iter_chunks
 from vectorstore.retriever import retrieve_docs
 
 print("[*] Checking ChromaDB...")
@@ -24,14 +25,15 @@ except Exception as e:
 
 # Check ChromaDB contents
 try:
-    all_docs = vector_store.get()
-    doc_count = len(all_docs['ids'])
+    # Count without reading any chunk, then fetch metadata for a handful of samples
+    doc_count = count_chunks()
     print(f"[OK] ChromaDB contains {doc_count} documents")
     
     if doc_count > 0:
         print(f"[OK] Sample documents:")
-        for i in range(min(5, len(all_docs['ids']))):
-            print(f"  {i+1}. {all_docs['metadatas'][i]}")
+        samples = islice(iter_chunks(fields=("metadatas",), page_size=5), 5)
+        for i, chunk in enumerate(samples):
+            print(f"  {i+1}. {chunk['metadata']}")
     else:
         print("[WARN] No documents in ChromaDB!")
 except Exception as e:
@@ -0,0 +1,41 @@
+"""
+Keeps test runs away from the stores under vectorstore/.
+
+Every test gets its own BM25 index, Chroma and flat store directories,
+ingest manifest and embedding cache under tmp_path. Test modules that
+query the store while they are imported run before any fixture, so
+collection uses one temporary directory for the whole session.
+"""
+
+import shutil
+import tempfile
+
+import pytest
+
+from vectorstore import bm25_index, embedding_cache, manifest, store
+
+
+def _use_stores_in(monkeypatch, directory):
+    monkeypatch.setattr(bm25_index, "BM25_INDEX_PATH", f"{directory}/bm25_index.sqlite3")
+    monkeypatch.setattr(store, "CHROMA_PATH", f"{directory}/chroma_db")
+    monkeypatch.setattr(store, "FLAT_PATH", f"{directory}/flat_db")
+    monkeypatch.setattr(store, "_vector_store", None)
+    monkeypatch.setattr(store, "_chroma_collection", None)
+    monkeypatch.setattr(manifest, "_manifest", manifest.IngestManifest(f"{directory}/ingest_manifest.sqlite3"))
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_DIR", f"{directory}/embedding_cache")
+
+
+_session_dir = tempfile.mkdtemp(prefix="test_stores_")
+_session_patch = pytest.MonkeyPatch()
+_use_stores_in(_session_patch, _session_dir)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    _session_patch.undo()
+    shutil.rmtree(_session_dir, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def isolated_stores(tmp_path, monkeypatch):
+    """Point every store path at tmp_path for the duration of the test."""
+    _use_stores_in(monkeypatch, tmp_path)
@@ -62,4 +62,96 @@ def classify_document(filepath, text_preview=""):
     best_match, best_score = rule_based_classify(filepath, text_preview)
     if best_score >= 2:
         return best_match
-    return llm_classify(filepath, text_preview)
\ No newline at end of file
+    return llm_classify(filepath, text_preview)
+
+
+def detect_subject(filename, text_preview=""):
+    filename = filename.lower()
+    combined = filename + " " + text_preview.lower()
+
+    subject_map = {
+        "os": ["operating system", "process scheduling", "deadlock",
+               "memory management", "virtual memory", "semaphore", "banker"],
+        "dbms": ["database", "sql", "normalization", "transaction",
+                 "relational", "entity relationship", "acid"],
+        "cn": ["computer network", "tcp", "ip address", "routing",
+               "protocol", "osi model", "dns", "http", "subnet"],
+        "ds": ["data structure", "linked list", "stack", "queue",
+               "tree", "graph", "sorting", "hashing"],
+        "algo": ["algorithm", "complexity", "dynamic programming",
+                 "greedy", "divide and conquer", "big o"],
+        "oops": ["object oriented", "class", "inheritance",
+                 "polymorphism", "encapsulation", "java", "c++"],
+        "iot": ["internet of things", "iot", "sensor", "mqtt",
+                "arduino", "raspberry pi", "embedded"],
+        "ml": ["machine learning", "neural network", "deep learning",
+               "classification", "regression", "clustering"],
+        "ai": ["artificial intelligence", "search algorithm",
+               "expert system", "heuristic", "planning"],
+        "cloud": ["cloud computing", "aws", "azure", "virtualization",
+                  "docker", "kubernetes", "microservice"],
+        "cyber": ["cybersecurity", "cryptography", "encryption",
+                  "firewall", "vulnerability", "authentication"],
+        "maths": ["mathematics", "calculus", "integration",
+                  "differentiation", "algebra", "trigonometry", "matrix"],
+        "stats": ["statistics", "probability", "distribution",
+                  "hypothesis", "regression", "sampling", "bayes"],
+        "discrete": ["discrete mathematics", "set theory", "logic",
+                     "boolean", "graph theory", "combinatorics"],
+        "physics": ["physics", "mechanics", "thermodynamics",
+                    "optics", "electromagnetism", "quantum", "wave"],
+        "chemistry": ["chemistry", "organic", "inorganic",
+                      "reaction", "periodic table", "molecule"],
+        "biology": ["biology", "cell", "genetics", "evolution",
+                    "photosynthesis", "dna", "rna", "organism"],
+        "electronics": ["electronics", "diode", "transistor",
+                        "amplifier", "circuit", "resistor", "op amp"],
+        "electrical": ["electrical", "voltage", "current", "power",
+                       "motor", "transformer", "generator"],
+        "mechanical": ["mechanical", "fluid mechanics",
+                       "manufacturing", "heat transfer", "turbine"],
+        "civil": ["civil", "structural", "concrete", "soil",
+                  "surveying", "construction", "beam"],
+        "management": ["management", "organization", "leadership",
+                       "strategy", "hrm", "marketing", "accounting"],
+        "economics": ["economics", "demand", "supply", "gdp",
+                      "inflation", "microeconomics", "macroeconomics"],
+        "english": ["english", "grammar", "vocabulary",
+                    "comprehension", "essay", "literature"],
+        "hindi": ["hindi", "vyakaran", "nibandh", "kavita",
+                  "sahitya", "shabd"],
+        "se": ["software engineering", "sdlc", "agile",
+               "waterfall", "testing", "uml", "design pattern"],
+    }
+
+    scores = {subject: 0 for subject in subject_map}
+    for subject, keywords in subject_map.items():
+        for keyword in keywords:
+            if keyword in combined:
+                scores[subject] += 1
+
+    best_match = max(scores, key=scores.get)
+    best_score = scores[best_match]
+
+    if best_score == 0:
+        print("  Subject unclear — asking LLM...")
+        return llm_detect_subject(text_preview)
+
+    return best_match
+
+
+def llm_detect_subject(text_preview):
+    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    prompt = f"""
+You are a subject classifier for an academic assistant.
+Given this text preview identify the subject it belongs to.
+Reply with ONLY a short label like: os, dbms, maths, physics, iot, ml, english etc.
+Nothing else.
+
+Text: {text_preview[:300]}
+Subject:"""
+    response = groq_client.chat.completions.create(
+        model="llama-3.3-70b-versatile",
+        messages=[{"role": "user", "content": prompt}]
+    )
+    return response.choices[0].message.content.strip().lower()
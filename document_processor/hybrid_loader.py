@@ -0,0 +1,93 @@
+import os
+from collections import deque
+
+from document_processor.pdf_engines import open_pdf_engine
+from document_processor.pdf_loader import load_pdf_pypdf
+from document_processor.ocr_loader import OCR_WORKERS, ocr_page_result, submit_ocr_page
+
+# Pages with less extracted text than this are treated as scanned and OCR'd.
+MIN_PAGE_TEXT_CHARS = 50
+
+
+def iter_pdf_hybrid(filepath, min_text_chars=MIN_PAGE_TEXT_CHARS, ocr_workers=None, engine=None,
+                    max_in_flight=None):
+    """
+    Streaming form of load_pdf_hybrid: yields each page dict as soon as the
+    page is final. Pages with a text layer come straight from the text
+    pass; pages without one are queued for OCR (at most max_in_flight,
+    default 2 per worker) and yielded when their OCR finishes, so pages can
+    arrive out of order. If the PDF engine fails, the pages not yet yielded
+    come from pypdf instead.
+    """
+    workers = OCR_WORKERS if ocr_workers is None else ocr_workers
+    max_in_flight = max_in_flight or 2 * max(1, workers)
+    pending = deque()
+    yielded = set()
+
+    def page_dict(page_num, text, method, total_pages):
+        yielded.add(page_num + 1)
+        return {
+            "text": text.strip(),
+            "page_number": page_num + 1,
+            "source_file": os.path.basename(filepath),
+            "total_pages": total_pages,
+            "extraction_method": method
+        }
+
+    try:
+        with open_pdf_engine(filepath, engine) as pdf:
+            total_pages = len(pdf)
+
+            def finish_oldest():
+                page_num, text, future = pending.popleft()
+                _, ocr_text, ocr_method = ocr_page_result(page_num, future)
+                # Keep the short text layer if OCR finds nothing better.
+                if len(ocr_text.strip()) > len(text.strip()):
+                    return page_dict(page_num, ocr_text, ocr_method, total_pages)
+                if text.strip():
+                    return page_dict(page_num, text, pdf.name, total_pages)
+                return None
+
+            for page_num, text in pdf.iter_pages():
+                if len(text.strip()) >= min_text_chars:
+                    yield page_dict(page_num, text, pdf.name, total_pages)
+                else:
+                    if len(pending) >= max_in_flight:
+                        page = finish_oldest()
+                        if page:
+                            yield page
+                    pending.append((page_num, text, submit_ocr_page(filepath, page_num, workers)))
+                while pending and pending[0][2].done():
+                    page = finish_oldest()
+                    if page:
+                        yield page
+
+            while pending:
+                page = finish_oldest()
+                if page:
+                    yield page
+
+    except Exception as e:
+        print(f"  PDF engine failed: {e} — trying PyPDF2")
+        for page in load_pdf_pypdf(filepath):
+            if page["page_number"] not in yielded:
+                yield page
+
+
+def load_pdf_hybrid(filepath, min_text_chars=MIN_PAGE_TEXT_CHARS, ocr_workers=None, engine=None):
+    """
+    Single-pass PDF loader for digital, scanned and mixed PDFs.
+    Opens the file once and decides per page: pages with a text layer
+    are extracted with the PDF engine (text + tables), pages without one
+    are handed to the OCR pool as soon as they are seen, so OCR runs
+    alongside the rest of the text pass. Pages are returned in order.
+    """
+    pages = iter_pdf_hybrid(filepath, min_text_chars, ocr_workers, engine)
+    return sorted(pages, key=lambda page: page["page_number"])
+
+if __name__ == "__main__":
+    result = load_pdf_hybrid("data/sample_docs/test.pdf")
+    for page in result:
+        print(f"--- Page {page['page_number']} ({page['extraction_method']}) ---")
+        print(page['text'][:300])
+        print()
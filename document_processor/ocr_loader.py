@@ -1,10 +1,28 @@
 import pytesseract
 from PIL import Image, ImageEnhance, ImageFilter
-import pdfplumber
+import pypdfium2
+import multiprocessing
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from document_processor.pdf_engines import open_pdf_engine, pdfium_lock
 
 pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 
+OCR_RESOLUTION = 300
+# Pages rendered + OCR'd in parallel (OCR_WORKERS=1 runs them in-process).
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+
+_ocr_executor = None
+_ocr_executor_workers = None
+_ocr_executor_lock = threading.Lock()
+
+# Per-process pdfium handle, reused while consecutive pages come from one file.
+_worker_pdf = None
+_worker_pdf_path = None
+
 def preprocess_image(image):
     """
     Preprocesses image for better OCR accuracy.
@@ -39,53 +57,186 @@ def load_image(filepath):
         return []
 
 
-def load_scanned_pdf(filepath):
+def _init_ocr_worker():
+    """One tesseract thread per worker; the pool provides the parallelism."""
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _close_worker_document():
+    global _worker_pdf, _worker_pdf_path
+    with pdfium_lock:
+        if _worker_pdf is not None:
+            _worker_pdf.close()
+        _worker_pdf = _worker_pdf_path = None
+
+
+def _worker_document(filepath):
+    global _worker_pdf, _worker_pdf_path
+    # Keyed on mtime and size too, so a re-uploaded file isn't served stale.
+    stat = os.stat(filepath)
+    key = (filepath, stat.st_mtime_ns, stat.st_size)
+    if _worker_pdf_path != key:
+        _close_worker_document()
+        _worker_pdf = pypdfium2.PdfDocument(filepath)
+        _worker_pdf_path = key
+    return _worker_pdf
+
+
+def render_pdf_page(filepath, page_num, resolution=OCR_RESOLUTION):
+    """Renders one page (0-based) to a PIL image, as pdfplumber's to_image would."""
+    with pdfium_lock:
+        page = _worker_document(filepath)[page_num]
+        try:
+            bitmap = page.render(
+                scale=resolution / 72,
+                no_smoothtext=True,
+                no_smoothpath=True,
+                no_smoothimage=True,
+                prefer_bgrx=True,
+            )
+            try:
+                # to_pil() shares the bitmap's buffer; convert() copies it out.
+                return bitmap.to_pil().convert("RGB")
+            finally:
+                bitmap.close()
+        finally:
+            page.close()
+
+
+def ocr_pdf_page_from_file(filepath, page_num, resolution=OCR_RESOLUTION):
+    """
+    Renders and OCRs page page_num (0-based) of filepath.
+    Returns (page_num, text, extraction_method); never raises.
+    """
+    image = None
+    try:
+        image = preprocess_image(render_pdf_page(filepath, page_num, resolution))
+        custom_config = r"--oem 3 --psm 6"
+        return page_num, pytesseract.image_to_string(image, config=custom_config), "ocr"
+    except Exception as e:
+        print(f"  OCR failed on page {page_num+1}: {e}")
+        return page_num, "", "failed"
+    finally:
+        # A 300 dpi page is ~25 MB; free it before the next page is rendered.
+        if image is not None:
+            image.close()
+
+
+def _get_ocr_executor(workers):
+    global _ocr_executor, _ocr_executor_workers
+    with _ocr_executor_lock:
+        if _ocr_executor is None or _ocr_executor_workers != workers:
+            if _ocr_executor is not None:
+                _ocr_executor.shutdown(wait=True)
+            # Spawned, not forked: the pool is started from ingestion threads
+            # while other threads may hold locks a forked child would inherit.
+            _ocr_executor = ProcessPoolExecutor(
+                workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_ocr_worker
+            )
+            _ocr_executor_workers = workers
+        return _ocr_executor
+
+
+def submit_ocr_page(filepath, page_num, workers=None):
+    """
+    Queues page page_num (0-based) of filepath for rendering and OCR and
+    returns a Future of (page_num, text, extraction_method); collect it
+    with ocr_page_result. With workers <= 1 the page is OCR'd in-process
+    before this returns.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    if workers > 1:
+        return _get_ocr_executor(workers).submit(ocr_pdf_page_from_file, filepath, page_num)
+    future = Future()
+    try:
+        future.set_result(ocr_pdf_page_from_file(filepath, page_num))
+    finally:
+        _close_worker_document()
+    return future
+
+
+def ocr_page_result(page_num, future):
+    """The future's result, or a "failed" page if its worker died."""
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"  OCR failed on page {page_num+1}: {e}")
+        return page_num, "", "failed"
+
+
+def ocr_pdf_pages(filepath, page_nums, workers=None, max_in_flight=None):
+    """
+    Renders and OCRs the given pages (0-based) of filepath on a process pool.
+    Yields (page_num, text, extraction_method) in the order of page_nums.
+
+    page_nums may be a lazy iterable; it is only advanced while fewer than
+    max_in_flight pages (default 2 per worker) are queued, so rendered pages
+    never pile up. A page whose OCR fails, or whose worker dies, comes back
+    as ("", "failed") without affecting the others.
+    """
+    workers = OCR_WORKERS if workers is None else workers
+    if workers <= 1:
+        try:
+            for page_num in page_nums:
+                yield ocr_pdf_page_from_file(filepath, page_num)
+        finally:
+            _close_worker_document()
+        return
+
+    max_in_flight = max_in_flight or 2 * workers
+    pending = deque()
+
+    for page_num in page_nums:
+        if len(pending) >= max_in_flight:
+            yield ocr_page_result(*pending.popleft())
+        pending.append((page_num, submit_ocr_page(filepath, page_num, workers)))
+    while pending:
+        yield ocr_page_result(*pending.popleft())
+
+
+def load_scanned_pdf(filepath, workers=None):
     """
     Handles scanned PDFs, image-based PDFs and mixed PDFs.
     For each page tries text extraction first.
-    If text is too short falls back to OCR on that page.
+    If text is too short falls back to OCR on that page; OCR pages are
+    rendered and recognised in parallel (see ocr_pdf_pages).
     """
     pages = []
+    results = {}
 
     try:
-        with pdfplumber.open(filepath) as pdf:
-            total_pages = len(pdf.pages)
-
-            for page_num, page in enumerate(pdf.pages):
-                text = page.extract_text() or ""
-
-                if len(text.strip()) < 50:
-                    # Text extraction failed — use OCR on this page
-                    try:
-                        image = page.to_image(resolution=300).original
-                        image = preprocess_image(image)
-                        custom_config = r"--oem 3 --psm 6"
-                        text = pytesseract.image_to_string(
-                            image, config=custom_config
-                        )
-                        method = "ocr"
-                    except Exception as e:
-                        print(f"  OCR failed on page {page_num+1}: {e}")
-                        text = ""
-                        method = "failed"
-                else:
-                    method = "pdfplumber"
-
-                if text.strip():
-                    pages.append({
-                        "text": text.strip(),
-                        "page_number": page_num + 1,
-                        "source_file": os.path.basename(filepath),
-                        "total_pages": total_pages,
-                        "extraction_method": method
-                    })
+        with open_pdf_engine(filepath) as pdf:
+            total_pages = len(pdf)
+
+            def text_pass():
+                for page_num, text in pdf.iter_pages():
+                    if len(text.strip()) < 50:
+                        # Text extraction failed — use OCR on this page
+                        yield page_num
+                    else:
+                        results[page_num] = (text, pdf.name)
+
+            for page_num, text, method in ocr_pdf_pages(filepath, text_pass(), workers):
+                results[page_num] = (text, method)
+
+        for page_num in sorted(results):
+            text, method = results[page_num]
+            if text.strip():
+                pages.append({
+                    "text": text.strip(),
+                    "page_number": page_num + 1,
+                    "source_file": os.path.basename(filepath),
+                    "total_pages": total_pages,
+                    "extraction_method": method
+                })
 
     except Exception as e:
         print(f"  Scanned PDF loading failed: {e}")
 
     return pages
 
-
 if __name__ == "__main__":
     result = load_scanned_pdf("data/sample_docs/test.pdf")
     for page in result:
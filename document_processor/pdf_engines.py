@@ -0,0 +1,293 @@
+"""
+PDF text engines.
+
+Each engine opens one PDF and returns the text of a page (with any tables
+appended as " | " rows) by index, or streams them one page at a time:
+
+    with open_pdf_engine(filepath) as pdf:
+        for page_num, text in pdf.iter_pages():
+            ...
+
+Pages are released as soon as their text is returned (pdfplumber would
+otherwise keep every page's layout objects until the file is closed).
+
+    pdfium      pypdfium2 text layer; pdfplumber is opened lazily for
+                table extraction
+    pdfplumber  pdfplumber for text and tables
+
+Either way extract_tables only runs on pages whose ruling lines could
+form a table: pdfplumber's default table finder builds cells from ruled
+lines, so a page needs a horizontal rule crossed by at least three
+distinct vertical rules, and a vertical rule crossed by at least three
+horizontal ones (the smallest ruled 2 x 2 grid). Single-column stacks
+of boxes are skipped on purpose: their cells only repeat text already on
+the page. get_table_stats() counts pages checked, pages where extraction
+was attempted and pages where a table was found.
+
+PDFium is not thread-safe, so every pypdfium2 call in the process (the
+pdfium engine and in-process OCR rendering) holds pdfium_lock. pdfplumber
+table extraction runs outside it.
+
+PDF_ENGINE (env) picks the default engine.
+"""
+
+import ctypes
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pdfplumber
+import pypdfium2
+import pypdfium2.raw as pdfium_c
+
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pdfium")
+
+# Shorter segments (underline ticks, bullet glyph outlines) are not rulings.
+MIN_RULE_LENGTH = 8.0
+# Points within this distance are treated as touching.
+RULE_TOLERANCE = 2.0
+# Rules each way a table cell grid needs (a 2 x 2 table has 3 and 3).
+MIN_TABLE_RULES = 3
+# Beyond this many rulings a page is dense line art; let pdfplumber decide.
+MAX_RULES_CHECKED = 2000
+
+# Serializes pypdfium2 calls across threads (re-entrant, for helpers that
+# open or close a document while rendering).
+pdfium_lock = threading.RLock()
+
+_table_stats = {"pages": 0, "attempted": 0, "found": 0}
+_table_stats_lock = threading.Lock()
+
+
+def get_table_stats():
+    """Pages checked for tables, pages extract_tables ran on, pages with a table."""
+    with _table_stats_lock:
+        return dict(_table_stats)
+
+
+def reset_table_stats():
+    with _table_stats_lock:
+        for key in _table_stats:
+            _table_stats[key] = 0
+
+
+def _count_table_page(attempted, found):
+    with _table_stats_lock:
+        _table_stats["pages"] += 1
+        _table_stats["attempted"] += attempted
+        _table_stats["found"] += found
+
+
+def may_have_ruled_table(horizontal, vertical):
+    """
+    horizontal: (y, x0, x1) rules; vertical: (x, y0, y1) rules.
+    True if some rules cross like the lines of a table grid.
+    """
+    if len(horizontal) < MIN_TABLE_RULES or len(vertical) < MIN_TABLE_RULES:
+        return False
+    if len(horizontal) > MAX_RULES_CHECKED or len(vertical) > MAX_RULES_CHECKED:
+        return True
+
+    h = np.asarray(horizontal, dtype=np.float32)
+    v = np.asarray(vertical, dtype=np.float32)
+    tol = RULE_TOLERANCE
+    crosses = (
+        (v[None, :, 0] >= h[:, None, 1] - tol) & (v[None, :, 0] <= h[:, None, 2] + tol)
+        & (h[:, None, 0] >= v[None, :, 1] - tol) & (h[:, None, 0] <= v[None, :, 2] + tol)
+    )
+
+    def distinct_crossings(positions, rows):
+        snapped = np.round(positions / tol)
+        return any(len(np.unique(snapped[row])) >= MIN_TABLE_RULES
+                   for row in rows if row.sum() >= MIN_TABLE_RULES)
+
+    return distinct_crossings(v[:, 0], crosses) and distinct_crossings(h[:, 0], crosses.T)
+
+
+def _add_rule(horizontal, vertical, x0, y0, x1, y1):
+    if abs(y1 - y0) <= RULE_TOLERANCE and abs(x1 - x0) >= MIN_RULE_LENGTH:
+        horizontal.append(((y0 + y1) / 2, min(x0, x1), max(x0, x1)))
+    elif abs(x1 - x0) <= RULE_TOLERANCE and abs(y1 - y0) >= MIN_RULE_LENGTH:
+        vertical.append(((x0 + x1) / 2, min(y0, y1), max(y0, y1)))
+
+
+def table_rows_text(tables):
+    """pdfplumber tables as newline-prefixed " | " rows."""
+    text = ""
+    for table in tables or []:
+        for row in table:
+            row_text = " | ".join(
+                [str(cell) if cell else "" for cell in row]
+            )
+            text += "\n" + row_text
+    return text
+
+
+class PdfEngine(ABC):
+    """Base class: one open PDF, page text by 0-based index."""
+
+    name = None
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.table_stats = {"pages": 0, "attempted": 0, "found": 0}
+
+    def _tables_text(self, page_num, rules, extract):
+        """Runs extract() for tables only if rules() = (horizontal, vertical) allow one."""
+        attempted = may_have_ruled_table(*rules())
+        tables = extract() if attempted else []
+        found = bool(tables)
+        self.table_stats["pages"] += 1
+        self.table_stats["attempted"] += attempted
+        self.table_stats["found"] += found
+        _count_table_page(attempted, found)
+        return table_rows_text(tables)
+
+    @abstractmethod
+    def __len__(self):
+        """Number of pages."""
+
+    @abstractmethod
+    def page_text(self, page_num):
+        """Text of one page, with any tables appended."""
+
+    def iter_pages(self, page_nums=None):
+        """
+        Yields (page_num, text) for page_nums (default every page), one page
+        at a time. Engines release a page's parsed objects before returning
+        its text, so memory stays flat however long the document is.
+        """
+        for page_num in range(len(self)) if page_nums is None else page_nums:
+            yield page_num, self.page_text(page_num)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PdfplumberEngine(PdfEngine):
+    """pdfplumber text and tables for every page (slow, layout-aware)."""
+
+    name = "pdfplumber"
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        self._pdf = pdfplumber.open(filepath)
+
+    def __len__(self):
+        return len(self._pdf.pages)
+
+    @staticmethod
+    def _rules(page):
+        horizontal = [(e["top"], e["x0"], e["x1"]) for e in page.horizontal_edges
+                      if e["x1"] - e["x0"] >= MIN_RULE_LENGTH]
+        vertical = [(e["x0"], e["top"], e["bottom"]) for e in page.vertical_edges
+                    if e["bottom"] - e["top"] >= MIN_RULE_LENGTH]
+        return horizontal, vertical
+
+    def page_text(self, page_num):
+        page = self._pdf.pages[page_num]
+        try:
+            text = (page.extract_text() or "").strip()
+            return text + self._tables_text(page_num, lambda: self._rules(page), page.extract_tables)
+        finally:
+            # pdfplumber caches a page's layout objects until the PDF is closed.
+            page.close()
+
+    def close(self):
+        self._pdf.close()
+
+
+class PdfiumEngine(PdfEngine):
+    """
+    pypdfium2 text layer for every page. Ruling lines are read from the
+    page's path objects, and pdfplumber is only opened to extract tables
+    on pages where they could form one. pdfium calls hold pdfium_lock.
+    """
+
+    name = "pdfium"
+
+    def __init__(self, filepath):
+        super().__init__(filepath)
+        with pdfium_lock:
+            self._pdf = pypdfium2.PdfDocument(filepath)
+        self._plumber = None
+
+    def __len__(self):
+        with pdfium_lock:
+            return len(self._pdf)
+
+    @staticmethod
+    def _rules(page):
+        """Axis-aligned straight segments of the page's paths, in page space."""
+        horizontal, vertical = [], []
+        x, y = ctypes.c_float(), ctypes.c_float()
+        for obj in page.get_objects(max_depth=2):
+            if obj.type != pdfium_c.FPDF_PAGEOBJ_PATH:
+                continue
+            matrix = obj.get_matrix()
+            current = start = None
+            for i in range(pdfium_c.FPDFPath_CountSegments(obj.raw)):
+                segment = pdfium_c.FPDFPath_GetPathSegment(obj.raw, i)
+                pdfium_c.FPDFPathSegment_GetPoint(segment, x, y)
+                point = matrix.on_point(x.value, y.value)
+                kind = pdfium_c.FPDFPathSegment_GetType(segment)
+                if kind == pdfium_c.FPDF_SEGMENT_MOVETO:
+                    start = point
+                elif kind == pdfium_c.FPDF_SEGMENT_LINETO and current is not None:
+                    _add_rule(horizontal, vertical, *current, *point)
+                if pdfium_c.FPDFPathSegment_GetClose(segment) and start is not None:
+                    _add_rule(horizontal, vertical, *point, *start)
+                current = point
+            if len(horizontal) > MAX_RULES_CHECKED and len(vertical) > MAX_RULES_CHECKED:
+                break
+        return horizontal, vertical
+
+    def _tables(self, page_num):
+        if self._plumber is None:
+            self._plumber = pdfplumber.open(self.filepath)
+        page = self._plumber.pages[page_num]
+        try:
+            return page.extract_tables()
+        finally:
+            page.close()
+
+    def page_text(self, page_num):
+        with pdfium_lock:
+            page = self._pdf[page_num]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_bounded().replace("\r\n", "\n").strip()
+                finally:
+                    textpage.close()
+                rules = self._rules(page)
+            finally:
+                page.close()
+        return text + self._tables_text(page_num, lambda: rules, lambda: self._tables(page_num))
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+        with pdfium_lock:
+            self._pdf.close()
+
+
+PDF_ENGINES = {
+    PdfiumEngine.name: PdfiumEngine,
+    PdfplumberEngine.name: PdfplumberEngine,
+}
+
+
+def open_pdf_engine(filepath, engine=None):
+    """Opens filepath with the named engine (default PDF_ENGINE)."""
+    engine = engine or PDF_ENGINE
+    if engine not in PDF_ENGINES:
+        raise ValueError(f"Unknown PDF engine {engine!r}; expected one of {sorted(PDF_ENGINES)}")
+    return PDF_ENGINES[engine](filepath)
@@ -10,10 +10,19 @@ if PROJECT_ROOT not in sys.path:
 
 from frontend.ask_query import show_query_page
 from frontend.upload_docs import show_upload_page
+from vectorstore.store import warm_up_vector_store
+
+
+@st.cache_resource(show_spinner="Loading embedding model...")
+def _warm_up():
+    # Load the model and open the collection once per server process.
+    warm_up_vector_store()
+    return True
 
 
 def main():
     st.set_page_config(page_title="Subject Guide Agent", layout="wide")
+    _warm_up()
 
     st.sidebar.title("Subject Guide Agent")
     page = st.sidebar.radio("Go to", ["Upload Documents", "Ask Question"])
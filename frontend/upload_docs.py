@@ -2,8 +2,7 @@ import os
 
 import streamlit as st
 
-from vectorstore.chunker import chunk_document
-from vectorstore.store import add_documents
+from vectorstore.pipeline import IngestJob, IngestionPipeline
 
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads")
@@ -44,14 +43,20 @@ def show_upload_page():
 
     if st.button("Process Documents"):
         with st.spinner("Processing documents..."):
-            total_chunks = 0
-            for uploaded in uploaded_files:
-                file_path = save_uploaded_file(uploaded)
-                chunks = chunk_document(file_path, subject=subject.lower())
-                add_documents(chunks)
-                total_chunks += len(chunks)
+            # Same staged pipeline as the ingest.py CLI; re-uploads of an
+            # unchanged file skip extraction and embedding.
+            jobs = [IngestJob(save_uploaded_file(uploaded), subject=subject.lower())
+                    for uploaded in uploaded_files]
+            IngestionPipeline().run(jobs)
+            total_chunks = sum(job.chunks_written for job in jobs)
+            skipped_files = sum(job.status == "skipped" for job in jobs)
+            failed = [os.path.basename(job.file_path) for job in jobs if job.status == "failed"]
 
         st.success(
             f"✅ Processed {len(uploaded_files)} file(s) and stored {total_chunks} chunks in vector DB."
         )
+        if skipped_files:
+            st.info(f"{skipped_files} file(s) were already up to date and were skipped.")
+        if failed:
+            st.warning(f"Could not process: {', '.join(failed)}. They will be retried on the next upload.")
         st.write("You can now ask questions in the **Ask Question** tab.")
@@ -0,0 +1,114 @@
+"""
+Tests for store.add_documents: batches are encoded while earlier ones are
+written, with a bounded number in flight.
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vectorstore import store
+from vectorstore.bm25_index import BM25Index
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    delay: float = 0.0
+    events: list = []
+
+    def embed_documents(self, texts):
+        self.events.append(("encode start", texts[0]))
+        time.sleep(self.delay)
+        self.events.append(("encode end", texts[0]))
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    """A fresh Chroma collection and BM25 index, with a fake embedding model."""
+    model = SlowEmbeddings(size=8, events=[])
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    monkeypatch.setattr(store, "CHROMA_PATH", str(tmp_path / "chroma"))
+    monkeypatch.setattr(store, "_vector_store", None)
+    monkeypatch.setattr(store, "_chroma_collection", None)
+    monkeypatch.setattr(store, "_embedding_function", model)
+    monkeypatch.setattr(store, "get_bm25_index", lambda: index)
+    store._get_embed_executor(1)
+    return model, index
+
+
+def _docs(n, prefix="chunk"):
+    return [Document(page_content=f"{prefix} {i} about paging", id=f"{prefix}-{i}",
+                     metadata={"subject": "os", "page_number": i})
+            for i in range(n)]
+
+
+def test_every_chunk_is_stored_once(collection):
+    _, index = collection
+    docs = _docs(10) + [Document(page_content="chunk 3 rewritten", id="chunk-3", metadata={"subject": "os"})]
+    stats = store.add_documents(docs, batch_size=4)
+
+    assert stats["chunks"] == 10
+    assert store.count_chunks() == 10 and len(index) == 10
+    page = store.get_vector_store().get(ids=["chunk-3"])
+    assert page["documents"] == ["chunk 3 rewritten"]
+
+
+def test_write_embedded_keeps_the_last_copy_of_a_repeated_id(collection):
+    model, index = collection
+    docs = _docs(3) + _docs(1)
+    docs[-1].page_content = "chunk 0 again"
+    store.write_embedded([doc.id for doc in docs], model.embed_documents([d.page_content for d in docs]), docs)
+
+    assert store.count_chunks() == 3 and len(index) == 3
+    assert store.get_vector_store().get(ids=["chunk-0"])["documents"] == ["chunk 0 again"]
+
+
+def test_batches_are_encoded_while_earlier_ones_are_written(collection, monkeypatch):
+    model, _ = collection
+    model.delay = 0.1
+    events = model.events
+    write = store.write_embedded
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def encode(texts):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        return model.embed_documents(texts)
+
+    def slow_write(ids, embeddings, documents):
+        events.append(("write start", documents[0].page_content))
+        time.sleep(0.1)
+        write(ids, embeddings, documents)
+        with lock:
+            in_flight[0] -= 1
+        events.append(("write end", documents[0].page_content))
+
+    monkeypatch.setattr(store, "_encode_batch", encode)
+    monkeypatch.setattr(store, "write_embedded", slow_write)
+    start = time.perf_counter()
+    store.add_documents(_docs(16), batch_size=4, workers=1)
+    elapsed = time.perf_counter() - start
+
+    # Sequential encode + write would take 8 x 0.1 s.
+    assert elapsed < 0.7
+    first_write_end = events.index(("write end", "chunk 0 about paging"))
+    assert events.index(("encode start", "chunk 4 about paging")) < first_write_end
+    # Besides the batch being written, at most two per worker are in flight.
+    assert peak[0] <= 3
+    assert store.count_chunks() == 16
+
+
+def test_embedding_processes_are_spawned():
+    executor = store._get_embed_executor(2)
+    try:
+        assert executor._mp_context.get_start_method() == "spawn"
+    finally:
+        store._get_embed_executor(1)
@@ -0,0 +1,177 @@
+"""
+Tests for the persistent BM25 index.
+
+Scores are checked against rank_bm25's BM25Okapi, which the index replaces.
+"""
+
+import sys
+import os
+import sqlite3
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from rank_bm25 import BM25Okapi
+
+from vectorstore import bm25_index
+from vectorstore.bm25_index import BM25Index, tokenize
+from vectorstore.bm25_matrix import BM25Matrix
+
+
+CORPUS = [
+    ("c1", "Demand paging loads pages only when they are needed.", {"subject": "os", "doc_type": "notes"}),
+    ("c2", "A page fault occurs when a page is not in memory.", {"subject": "os", "doc_type": "textbook"}),
+    ("c3", "The virtual file system hides differences between file systems.", {"subject": "os", "doc_type": "notes"}),
+    ("c4", "Normalization removes redundancy from relational tables.", {"subject": "dbms", "doc_type": "notes"}),
+    ("c5", "Explain demand paging with a neat diagram. (10 marks)", {"subject": "os", "doc_type": "PYQ"}),
+    ("c6", "Transactions follow the ACID properties.", {"subject": "dbms", "doc_type": "pyq"}),
+]
+
+QUERIES = [
+    "Explain demand paging",
+    "What is virtual file system",
+    "page fault memory",
+    "ACID transactions",
+    "page page paging",
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    ids, texts, metas = zip(*CORPUS)
+    idx.add(list(ids), list(texts), list(metas))
+    return idx
+
+
+def _reference_scores(query):
+    bm25 = BM25Okapi([tokenize(text) for _, text, _ in CORPUS])
+    scores = bm25.get_scores(tokenize(query))
+    return {CORPUS[i][0]: s for i, s in enumerate(scores) if s > 0}
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_rank_bm25(index, query):
+    expected = _reference_scores(query)
+    results = index.search(query, top_k=len(CORPUS))
+
+    assert {doc_id for doc_id, _, _, _ in results} == set(expected)
+    for doc_id, _, _, score in results:
+        assert score == pytest.approx(expected[doc_id])
+    scores = [score for _, _, _, score in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_matrix_dense_scores_match_rank_bm25():
+    corpus = [tokenize(text) for _, text, _ in CORPUS]
+    reference = BM25Okapi(corpus)
+    matrix = BM25Matrix.from_corpus(corpus)
+
+    for query in QUERIES:
+        assert matrix.get_scores(tokenize(query)) == pytest.approx(
+            reference.get_scores(tokenize(query))
+        )
+
+
+def test_partitioned_scores_match_full_matrix():
+    corpus = [tokenize(text) for _, text, _ in CORPUS]
+    keys = [(meta["subject"], meta["doc_type"].lower()) for _, _, meta in CORPUS]
+    full = BM25Matrix.from_corpus(corpus)
+    partitioned = BM25Matrix.from_corpus(corpus, partition_keys=keys)
+
+    for query in QUERIES:
+        tokens = tokenize(query)
+        assert partitioned.get_scores(tokens) == pytest.approx(full.get_scores(tokens))
+
+    os_notes = partitioned.top_k_batch([tokenize("page paging file")], 10, keys=[("os", "notes")])[0]
+    assert {col for col, _ in os_notes} <= {0, 2}
+    dense = full.get_scores(tokenize("page paging file"))
+    for col, score in os_notes:
+        assert score == pytest.approx(dense[col])
+
+
+def test_search_batch_matches_single_queries(index):
+    batch = index.search_batch(QUERIES, top_k=3)
+    assert batch == [index.search(query, top_k=3) for query in QUERIES]
+
+
+def test_filters(index):
+    results = index.search("demand paging", top_k=5, doc_type="pyq")
+    assert [r[0] for r in results] == ["c5"]
+
+    results = index.search("page", top_k=5, doc_type=["notes", "textbook"], subject="os")
+    assert {r[0] for r in results} <= {"c1", "c2", "c3"}
+
+    assert index.search("normalization", top_k=5, subject="os") == []
+
+
+def test_readd_replaces_and_remove(index):
+    assert len(index) == len(CORPUS)
+
+    index.add(["c4"], ["Demand paging again"], [{"subject": "os", "doc_type": "notes"}])
+    assert len(index) == len(CORPUS)
+    assert index.search("normalization", top_k=5) == []
+
+    index.remove(["c4", "missing"])
+    assert len(index) == len(CORPUS) - 1
+    assert all(r[0] != "c4" for r in index.search("demand paging", top_k=10))
+
+
+def test_generation_bumps_on_write(index):
+    before = index.stats()["generation"]
+    index.add(["c7"], ["Deadlock needs circular wait"], [{}])
+    assert index.stats()["generation"] == before + 1
+
+
+def test_clear(index):
+    index.clear()
+    assert len(index) == 0
+    assert index.search("demand paging") == []
+
+
+def test_snapshot_updates_from_changed_rows(index, monkeypatch):
+    queries = QUERIES + ["translation lookaside buffer"]
+    index.search("paging")  # cache a snapshot
+    full_loads = []
+    real_load = bm25_index._Corpus.load
+    monkeypatch.setattr(bm25_index._Corpus, "load",
+                        classmethod(lambda cls, conn: full_loads.append(1) or real_load(conn)))
+
+    index.add(["c7"], ["Paging with a translation lookaside buffer"], [{"subject": "os", "doc_type": "notes"}])
+    index.remove(["c2"])
+    index.add(["c1"], ["Demand paging revisited for page replacement"], [{"subject": "os", "doc_type": "notes"}])
+    updated = index.search_batch(queries, top_k=len(CORPUS) + 5)
+    assert not full_loads
+
+    # Same results as a snapshot loaded from scratch.
+    bm25_index._snapshots.pop(index.path)
+    fresh = index.search_batch(queries, top_k=len(CORPUS) + 5)
+    assert full_loads
+    for mine, expected in zip(updated, fresh):
+        assert [r[0] for r in mine] == [r[0] for r in expected]
+        assert [r[3] for r in mine] == pytest.approx([r[3] for r in expected])
+
+
+def test_reads_do_not_wait_for_a_writer(index):
+    index.search("paging")
+    writer = sqlite3.connect(index.path)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE stats SET value = value WHERE key = 'generation'")
+    try:
+        start = time.perf_counter()
+        assert index.generation_key()
+        assert index.search("demand paging")
+        assert len(index) == len(CORPUS)
+        assert time.perf_counter() - start < 1.0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_search_skips_rows_removed_after_the_snapshot(index, monkeypatch):
+    snapshot = index._load_snapshot()
+    index.remove(["c1"])
+    monkeypatch.setattr(index, "_load_snapshot", lambda: snapshot)
+
+    results = index.search("demand paging", top_k=5)
+    assert results and all(r[0] != "c1" for r in results)
@@ -0,0 +1,58 @@
+"""
+Tests for the token-budgeted context packer.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from utils.context_formatter import count_tokens, pack_context
+
+PAGE = " ".join(f"Sentence {i} about virtual memory and demand paging." for i in range(40))
+
+
+def _doc(text, source="os_notes.pdf", page=3):
+    return Document(page_content=text, metadata={"source_file": source, "page_number": page, "doc_type": "notes"})
+
+
+def test_overlapping_chunks_from_one_page_are_merged():
+    first, second = PAGE[:600], PAGE[450:1100]
+    context = pack_context([_doc(first), _doc(second)], max_tokens=2000)
+
+    assert context.count("[Source") == 1
+    assert PAGE[:1100].strip() in context
+    assert context.count(PAGE[450:600]) == 1
+
+
+def test_contained_and_duplicate_chunks_are_dropped():
+    docs = [_doc(PAGE[:800]), _doc(PAGE[100:300]), _doc(PAGE[:800])]
+    context = pack_context(docs, max_tokens=2000)
+    assert context.count(PAGE[100:300]) == 1
+
+
+def test_pages_keep_relevance_order_and_separate_headers():
+    docs = [
+        _doc("Paging splits memory into frames.", page=7),
+        {"text": "A page fault traps to the kernel.", "source_file": "book.pdf", "page_number": 45},
+        _doc("Frames hold pages.", page=7),
+    ]
+    context = pack_context(docs, max_tokens=500, header="[{n}: {source} p{page}]")
+
+    assert context.index("[1: os_notes.pdf p7]") < context.index("[2: book.pdf p45]")
+    assert "Paging splits memory into frames.\n...\nFrames hold pages." in context
+
+
+def test_budget_is_respected():
+    docs = [_doc(PAGE, page=p) for p in range(10)]
+    for budget in (50, 200, 700):
+        context = pack_context(docs, max_tokens=budget)
+        assert count_tokens(context) <= budget + 2
+        assert context.startswith("\n[Source 1: os_notes.pdf | Page 0")
+
+
+def test_budget_smaller_than_one_header():
+    header_tokens = count_tokens("\n[Source 1: os_notes.pdf | Page 0 | Type: notes | Subject: general]")
+    for budget in (1, header_tokens, header_tokens + 2):
+        assert pack_context([_doc(PAGE, page=0)], max_tokens=budget) == ""
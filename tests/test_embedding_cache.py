@@ -0,0 +1,115 @@
+"""
+Tests for the persistent embedding cache.
+"""
+
+import sys
+import os
+import sqlite3
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from vectorstore import store
+from vectorstore.embedding_cache import CachedEmbeddings, EmbeddingCache, text_key
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    encoded: list = []
+
+    def embed_documents(self, texts):
+        self.encoded.extend(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def model():
+    return CountingEmbeddings(size=8, encoded=[])
+
+
+def test_identical_texts_are_encoded_once(tmp_path, model):
+    cached = CachedEmbeddings(model, "fake", EmbeddingCache(str(tmp_path / "fake")))
+    first = cached.embed_documents(["paging", "deadlock", "paging"])
+    second = cached.embed_documents(["deadlock", "paging", "semaphore"])
+
+    assert model.encoded == ["paging", "deadlock", "semaphore"]
+    assert first[0] == first[2] == second[1]
+    assert first[1] == second[0]
+    assert first[0] == pytest.approx(model.embed_query("paging"))
+
+
+def test_cache_survives_reopening(tmp_path, model):
+    CachedEmbeddings(model, "fake", EmbeddingCache(str(tmp_path / "fake"))).embed_documents(["paging"])
+    reopened = CachedEmbeddings(model, "fake", EmbeddingCache(str(tmp_path / "fake")))
+    reopened.embed_documents(["paging"])
+
+    assert model.encoded == ["paging"]
+    assert reopened.hits == 1
+
+
+def test_model_name_is_part_of_the_key(tmp_path, model):
+    cache = EmbeddingCache(str(tmp_path / "shared"))
+    CachedEmbeddings(model, "model-a", cache).embed_documents(["paging"])
+    CachedEmbeddings(model, "model-b", cache).embed_documents(["paging"])
+    assert model.encoded == ["paging", "paging"]
+
+
+def test_evicts_least_recently_used(tmp_path, model):
+    cache = EmbeddingCache(str(tmp_path / "fake"), max_entries=2)
+    cached = CachedEmbeddings(model, "fake", cache)
+    cached.embed_documents(["a", "b"])
+    cached.embed_documents(["a"])        # "b" is now least recently used
+    cached.embed_documents(["c"])        # evicts "b"
+    assert len(cache) == 2
+
+    model.encoded.clear()
+    result = cached.embed_documents(["a", "b", "c"])
+    assert model.encoded == ["b"]
+    assert result[1] == pytest.approx(model.embed_query("b"))
+
+
+def test_lookups_do_not_wait_for_a_writer(tmp_path, model):
+    cache = EmbeddingCache(str(tmp_path / "fake"))
+    cached = CachedEmbeddings(model, "fake", cache)
+    cached.embed_documents(["paging"])
+
+    writer = sqlite3.connect(cache.index_path)
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE meta SET value = value WHERE key = 'clock'")
+    try:
+        start = time.perf_counter()
+        assert cached.embed_documents(["paging"])[0] == pytest.approx(model.embed_query("paging"))
+        assert len(cache) == 1
+        assert time.perf_counter() - start < 1.0
+    finally:
+        writer.rollback()
+        writer.close()
+
+
+def test_lookup_discards_slots_freed_while_copying(tmp_path, model, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "fake"), max_entries=1)
+    cached = CachedEmbeddings(model, "fake", cache)
+    cached.embed_documents(["a"])
+
+    real_map = cache._map
+
+    def map_then_evict(dim, rows):
+        vectors = real_map(dim, rows)
+        if not model.encoded[1:]:
+            other = CachedEmbeddings(model, "fake", EmbeddingCache(str(tmp_path / "fake"), max_entries=1))
+            other.embed_documents(["b"])  # reuses the slot of "a"
+        return vectors
+
+    monkeypatch.setattr(cache, "_map", map_then_evict)
+    assert cache.get_many([text_key("fake", "a")], attempts=1) == {}
+    assert model.encoded == ["a", "b"]
+
+
+def test_queries_bypass_the_persistent_cache(tmp_path, model, monkeypatch):
+    cache = EmbeddingCache(str(tmp_path / "fake"))
+    monkeypatch.setattr(store, "_embedding_function", CachedEmbeddings(model, "fake", cache))
+
+    vectors = store.encode_queries(["what is paging", "what is paging"])
+    assert vectors[0] == pytest.approx(model.embed_query("what is paging"))
+    assert len(cache) == 0
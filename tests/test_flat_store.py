@@ -0,0 +1,204 @@
+"""
+Tests for the memory-mapped flat vector backend.
+"""
+
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from vectorstore import flat_store
+from vectorstore.flat_store import FlatVectorStore
+
+SUBJECTS = ["os", "dbms"]
+DOC_TYPES = ["notes", "pyq", "textbook"]
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 16)).astype(np.float32)
+    metas = [
+        {"subject": SUBJECTS[i % 2], "doc_type": DOC_TYPES[i % 3], "page_number": i}
+        for i in range(300)
+    ]
+    return vectors, metas
+
+
+@pytest.fixture(params=[None, "int8"])
+def store(request, tmp_path, data):
+    vectors, metas = data
+    store = FlatVectorStore(str(tmp_path / "flat"), embedding_function=None, quantization=request.param)
+    ids = [f"c{i}" for i in range(300)]
+    texts = [f"chunk {i}" for i in range(300)]
+    # Two writes so the files have to grow and get remapped.
+    store.upsert_vectors(ids[:100], vectors[:100], texts[:100], metas[:100])
+    store.upsert_vectors(ids[100:], vectors[100:], texts[100:], metas[100:])
+    return store
+
+
+def _exact(vectors, query, allowed, k):
+    distances = ((vectors.astype(np.float16).astype(np.float32) - query) ** 2).sum(axis=1)
+    order = [i for i in np.argsort(distances) if allowed(i)]
+    return [f"c{i}" for i in order[:k]], distances
+
+
+def test_search_matches_exact_l2(store, data):
+    vectors, _ = data
+    query = np.random.default_rng(1).standard_normal(16).astype(np.float32)
+
+    hits = store.similarity_search_by_vector_with_relevance_scores(query, k=5)
+    expected, distances = _exact(vectors, query, lambda i: True, 5)
+    assert [doc.id for doc, _ in hits] == expected
+    for doc, distance in hits:
+        assert distance == pytest.approx(distances[int(doc.id[1:])], rel=1e-4)
+
+
+@pytest.mark.parametrize("where, allowed", [
+    ({"doc_type": "pyq"}, lambda i: i % 3 == 1),
+    ({"$and": [{"subject": "os"}, {"doc_type": {"$in": ["notes", "pyq"]}}]},
+     lambda i: i % 2 == 0 and i % 3 in (0, 1)),
+    ({"subject": "dbms", "doc_type": "textbook"}, lambda i: i % 2 == 1 and i % 3 == 2),
+    ({"page_number": {"$lt": 10}}, lambda i: i < 10),
+    ({"subject": "missing"}, lambda i: False),
+])
+def test_where_filters(store, data, where, allowed):
+    vectors, _ = data
+    query = np.random.default_rng(2).standard_normal(16).astype(np.float32)
+
+    hits = store.similarity_search_by_vector_with_relevance_scores(query, k=4, filter=where)
+    assert [doc.id for doc, _ in hits] == _exact(vectors, query, allowed, 4)[0]
+
+    matched = store.get(where=where, include=[])["ids"]
+    assert matched == [f"c{i}" for i in range(300) if allowed(i)]
+
+
+def test_upsert_delete_and_get(store, data):
+    vectors, _ = data
+    store.upsert_vectors(["c0"], vectors[5:6], ["replaced"], [{"subject": "os", "doc_type": "pyq"}])
+    page = store.get(ids=["c0"], include=["documents", "metadatas", "embeddings"])
+    assert page["documents"] == ["replaced"]
+    assert page["metadatas"][0]["doc_type"] == "pyq"
+    assert page["embeddings"][0] == pytest.approx(vectors[5], abs=1e-2)
+
+    store.delete(["c5", "c7"])
+    ids = store.get(include=[])["ids"]
+    assert len(ids) == 298 and "c5" not in ids
+    assert store.count() == 298
+    hits = store.similarity_search_by_vector_with_relevance_scores(vectors[5], k=3)
+    assert "c5" not in [doc.id for doc, _ in hits]
+
+    # The replaced chunk moved to a new row at the end.
+    assert store.get(limit=2, offset=1, include=[])["ids"] == ["c2", "c3"]
+    assert store.get(include=[])["ids"][-1] == "c0"
+
+
+def test_upsert_leaves_published_rows_alone(store, data):
+    vectors, metas = data
+    with store._connect() as conn:
+        before = store._refresh(conn)
+    published = {name: np.array(array[:before.n_rows]) for name, array in before.arrays.items()}
+
+    store.upsert_vectors(["c0", "c1"], vectors[5:7], ["first", "second"], metas[5:7])
+    for name, array in before.arrays.items():
+        if name != "live":
+            assert np.array_equal(array[:before.n_rows], published[name])
+    assert list(before.arrays["live"][:3]) == [0, 0, 1]
+
+    hits = store.similarity_search_by_vector_with_relevance_scores(vectors[6], k=2)
+    assert {doc.id for doc, _ in hits} == {"c1", "c6"}
+    assert store.count() == 300
+
+
+def test_second_handle_sees_writes(store, tmp_path, data):
+    vectors, metas = data
+    reader = FlatVectorStore(str(tmp_path / "flat"), embedding_function=None, quantization=store.quantization)
+    assert len(reader.get(include=[])["ids"]) == 300
+
+    store.upsert_vectors(["new"], vectors[:1] * 3, ["new chunk"], [metas[0]])
+    hits = reader.similarity_search_by_vector_with_relevance_scores(vectors[0] * 3, k=1)
+    assert hits[0][0].id == "new"
+
+
+def test_searches_do_not_wait_for_each_other(store, data, monkeypatch):
+    vectors, _ = data
+    entered, release = threading.Event(), threading.Event()
+    real_first_pass = store._first_pass
+
+    def first_pass(*args):
+        if threading.current_thread().name == "slow-search":
+            entered.set()
+            release.wait(5)
+        return real_first_pass(*args)
+
+    monkeypatch.setattr(store, "_first_pass", first_pass)
+    slow = threading.Thread(name="slow-search", target=lambda: (
+        store.similarity_search_by_vector_with_relevance_scores(vectors[0], k=1)))
+    slow.start()
+    assert entered.wait(5)
+    try:
+        start = time.perf_counter()
+        hits = store.similarity_search_by_vector_with_relevance_scores(vectors[1], k=1)
+        assert time.perf_counter() - start < 1.0
+        assert hits[0][0].id == "c1"
+    finally:
+        release.set()
+        slow.join()
+
+
+def test_int8_codes_approximate_vectors(store, data):
+    if store.quantization != "int8":
+        # Codes cost disk and are never scanned without int8.
+        assert not os.path.exists(os.path.join(store.path, "vectors.i8"))
+        return
+    vectors, _ = data
+    with store._connect() as conn:
+        arrays = store._refresh(conn).arrays
+    codes = np.asarray(arrays["codes"][:300], dtype=np.float32)
+    scales = np.asarray(arrays["scales"][:300])
+    error = np.abs(codes * scales[:, None] - vectors).max(axis=1)
+    assert (error <= scales / 2 + 1e-6).all()
+
+
+def test_enabling_int8_quantizes_existing_rows(tmp_path, data):
+    vectors, metas = data
+    plain = FlatVectorStore(str(tmp_path / "flat"), embedding_function=None)
+    plain.upsert_vectors([f"c{i}" for i in range(300)], vectors, [f"chunk {i}" for i in range(300)], metas)
+    quantized = FlatVectorStore(str(tmp_path / "flat"), embedding_function=None, quantization="int8")
+    query = vectors[7] + 0.01
+
+    # Without codes an int8 handle scans float16.
+    assert quantized.similarity_search_by_vector_with_relevance_scores(query, k=1)[0][0].id == "c7"
+
+    quantized.upsert_vectors(["new"], vectors[:1] * 3, ["new chunk"], [metas[0]])
+    with quantized._connect() as conn:
+        snapshot = quantized._refresh(conn)
+    assert snapshot.quantized
+    codes = np.asarray(snapshot.arrays["codes"][:300], dtype=np.float32)
+    assert np.abs(codes * snapshot.arrays["scales"][:300, None] - vectors).max() < 0.05
+    assert quantized.similarity_search_by_vector_with_relevance_scores(query, k=1)[0][0].id == "c7"
+
+    # A float16 write leaves codes behind, so int8 handles stop using them.
+    plain.upsert_vectors(["c7"], vectors[8:9], ["moved"], [metas[0]])
+    with quantized._connect() as conn:
+        assert not quantized._refresh(conn).quantized
+
+
+def test_int8_dot_without_int_mm(monkeypatch):
+    rng = np.random.default_rng(3)
+    block = rng.integers(-127, 128, (50, 16)).astype(np.int8)
+    query = rng.integers(-127, 128, 16).astype(np.int8)
+    expected = block.astype(np.int64) @ query.astype(np.int64)
+
+    assert (FlatVectorStore._int8_dot(block, query) == expected).all()
+    monkeypatch.delattr(flat_store.torch, "_int_mm", raising=False)
+    assert (FlatVectorStore._int8_dot(block, query) == expected).all()
+
+
+def test_unknown_quantization_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        FlatVectorStore(str(tmp_path / "flat"), embedding_function=None, quantization="int4")
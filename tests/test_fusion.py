@@ -0,0 +1,53 @@
+"""
+Tests for rank fusion of the vector and BM25 legs.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.documents import Document
+
+from vectorstore.fusion import RRF_K, fuse
+
+
+def _doc(doc_id):
+    return Document(page_content=f"text of {doc_id}", id=doc_id)
+
+
+VECTOR = [(_doc("a"), 0.91), (_doc("b"), 0.90), (_doc("c"), 0.40)]
+BM25 = [(_doc("c"), 14.0), (_doc("d"), 9.0), (_doc("a"), 2.0)]
+
+
+def test_rrf_uses_ranks_not_raw_scores():
+    fused = fuse({"vector": VECTOR, "bm25": BM25}, top_k=4, method="rrf")
+    assert [doc.id for doc, _, _ in fused] == ["a", "c", "b", "d"]
+    assert fused[0][1] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 3))
+    assert fused[0][2] == "vector+bm25"
+    assert fused[2][2] == "vector"
+
+
+def test_minmax_normalises_each_leg():
+    fused = fuse({"vector": VECTOR, "bm25": BM25}, top_k=2, method="minmax")
+    # a: 1.0 + 0.0, c: 0.0 + 1.0, b: 0.98 -> a and c tie ahead of b.
+    assert [doc.id for doc, _, _ in fused] == ["a", "c"]
+    assert fused[0][1] == pytest.approx(1.0)
+
+
+def test_duplicates_within_a_leg_count_once():
+    legs = {"vector": [(_doc("a"), 0.9), (_doc("a"), 0.9), (_doc("b"), 0.8)], "bm25": []}
+    fused = fuse(legs, top_k=5)
+    assert [doc.id for doc, _, _ in fused] == ["a", "b"]
+    assert fused[1][1] == pytest.approx(1 / (RRF_K + 2))
+
+
+def test_bm25_doc_id_in_metadata_matches_vector_id():
+    bm25_doc = Document(page_content="text of a", metadata={"id": "a"})
+    fused = fuse({"vector": [(_doc("a"), 0.5)], "bm25": [(bm25_doc, 3.0)]}, top_k=5)
+    assert len(fused) == 1 and fused[0][2] == "vector+bm25"
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        fuse({"vector": VECTOR}, top_k=2, method="borda")
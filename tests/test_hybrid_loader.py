@@ -0,0 +1,105 @@
+"""
+Tests for the single-pass hybrid PDF loader.
+"""
+
+import sys
+import os
+from concurrent.futures import Future
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_processor import hybrid_loader, ocr_loader
+
+MIXED_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "sample_docs", "IOT_unit 1.pdf")
+
+
+def done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_mixed_pdf_is_opened_once_and_ocr_only_runs_on_scanned_pages(monkeypatch):
+    opens = []
+    real_open = hybrid_loader.open_pdf_engine
+    monkeypatch.setattr(hybrid_loader, "open_pdf_engine",
+                        lambda *a, **kw: opens.append(a) or real_open(*a, **kw))
+
+    ocr_pages = []
+
+    def fake_ocr(filepath, page_num, workers=None):
+        ocr_pages.append(page_num)
+        return done((page_num, f"scanned text of page {page_num + 1} " * 5, "ocr"))
+
+    monkeypatch.setattr(hybrid_loader, "submit_ocr_page", fake_ocr)
+
+    pages = hybrid_loader.load_pdf_hybrid(MIXED_PDF)
+
+    assert len(opens) == 1
+    methods = {page["page_number"]: page["extraction_method"] for page in pages}
+    assert methods[8] == "pdfium"               # has a text layer
+    assert methods[2] == "ocr"                  # image-only page
+    assert sorted(p + 1 for p in ocr_pages) == sorted(n for n, m in methods.items() if m == "ocr")
+    assert [page["page_number"] for page in pages] == sorted(methods)
+
+
+def test_short_text_layer_is_kept_when_ocr_fails(monkeypatch):
+    def failing_ocr(filepath, page_num, workers=None):
+        return done((page_num, "", "failed"))
+
+    monkeypatch.setattr(hybrid_loader, "submit_ocr_page", failing_ocr)
+    pages = hybrid_loader.load_pdf_hybrid(MIXED_PDF)
+
+    # Page 7 only has a 35-character text layer: below the OCR threshold, but kept.
+    page = next(page for page in pages if page["page_number"] == 7)
+    assert page["extraction_method"] == "pdfium"
+    assert all(page["text"] for page in pages)
+
+
+def test_text_pages_stream_while_ocr_is_pending(monkeypatch):
+    futures = {}
+
+    def slow_ocr(filepath, page_num, workers=None):
+        futures[page_num] = Future()
+        return futures[page_num]
+
+    monkeypatch.setattr(hybrid_loader, "submit_ocr_page", slow_ocr)
+    stream = hybrid_loader.iter_pdf_hybrid(MIXED_PDF, max_in_flight=100)
+
+    # Pages 2-7 are queued for OCR that has not finished; 1 and 8 have text.
+    assert [next(stream)["page_number"] for _ in range(2)] == [1, 8]
+    assert sorted(futures) == [1, 2, 3, 4, 5, 6]
+
+    rest = []
+    for page in stream:
+        rest.append(page)
+        for page_num, future in futures.items():
+            if not future.done():
+                future.set_result((page_num, "late ocr text " * 5, "ocr"))
+
+    assert sorted(page["page_number"] for page in rest) == [n for n in range(2, 34) if n != 8]
+
+
+def test_ocr_keeps_page_order_and_isolates_failures(monkeypatch):
+    calls = []
+
+    def fake_tesseract(image, config=None):
+        calls.append(image.size)
+        if len(calls) == 2:
+            raise RuntimeError("tesseract crashed")
+        return f"page image {image.size[0]}x{image.size[1]}"
+
+    monkeypatch.setattr(ocr_loader.pytesseract, "image_to_string", fake_tesseract)
+
+    results = list(ocr_loader.ocr_pdf_pages(MIXED_PDF, iter([4, 1, 2]), workers=1))
+    assert [page_num for page_num, _, _ in results] == [4, 1, 2]
+    assert [method for _, _, method in results] == ["ocr", "failed", "ocr"]
+    # Rendered at 300 dpi: an A4 page is about 2480 pixels wide.
+    assert calls[0][0] > 2000
+
+
+def test_ocr_pool_returns_every_page_in_order():
+    # Whether or not tesseract is installed, each page comes back exactly once.
+    results = list(ocr_loader.ocr_pdf_pages(MIXED_PDF, range(6), workers=2, max_in_flight=3))
+    assert [page_num for page_num, _, _ in results] == list(range(6))
+    assert {method for _, _, method in results} <= {"ocr", "failed"}
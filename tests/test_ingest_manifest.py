@@ -0,0 +1,89 @@
+"""
+Tests for content-addressed chunk ids and the ingestion manifest.
+"""
+
+import sys
+import os
+import json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vectorstore.manifest import IngestManifest, chunk_id, hash_file
+
+
+def test_chunk_id_is_deterministic(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_bytes(b"demand paging")
+    file_hash = hash_file(str(path))
+
+    assert chunk_id(file_hash, 1, "text") == chunk_id(hash_file(str(path)), 1, "text")
+    assert chunk_id(file_hash, 1, "text") != chunk_id(file_hash, 2, "text")
+    assert chunk_id(file_hash, 1, "text") != chunk_id("other", 1, "text")
+
+
+def test_record_returns_stale_ids(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    assert not manifest.is_unchanged("a.pdf", "h1")
+
+    stale = manifest.record("a.pdf", "h1", {
+        1: {"hash": "p1", "ids": ["a", "b"]},
+        2: {"hash": "p2", "ids": ["c"]},
+    })
+    assert stale == []
+    assert manifest.is_unchanged("a.pdf", "h1")
+    assert not manifest.is_unchanged("a.pdf", "h2")
+
+    # Page 1 kept, page 2 changed, page 3 new.
+    stale = manifest.record("a.pdf", "h2", {
+        1: {"hash": "p1", "ids": ["a", "b"]},
+        2: {"hash": "p2b", "ids": ["d"]},
+        3: {"hash": "p3", "ids": ["e"]},
+    })
+    assert stale == ["c"]
+    assert manifest.entry("a.pdf")["pages"]["3"]["ids"] == ["e"]
+
+
+def test_ids_shared_with_another_file_are_not_stale(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    manifest.record("a.pdf", "h1", {1: {"hash": "p1", "ids": ["x"]}})
+    manifest.record("copy_of_a.pdf", "h1", {1: {"hash": "p1", "ids": ["x"]}})
+
+    stale = manifest.record("a.pdf", "h2", {1: {"hash": "p1b", "ids": ["y"]}})
+    assert stale == []
+
+
+def test_classification_is_part_of_the_skip_key(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    manifest.record("a.pdf", "h1", {1: {"hash": "p1", "ids": ["x"]}}, subject="os", doc_type="notes")
+
+    assert manifest.is_unchanged("a.pdf", "h1", "os", "notes")
+    assert manifest.is_unchanged("a.pdf", "h1")  # classification left to detection
+    assert not manifest.is_unchanged("a.pdf", "h1", "dbms", "notes")
+    assert not manifest.is_unchanged("a.pdf", "h1", "os", "pyq")
+    assert manifest.entry("a.pdf")["subject"] == "os"
+
+
+def test_record_only_rewrites_its_own_file(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    other = IngestManifest(str(tmp_path / "manifest.sqlite3"))  # e.g. another process
+    manifest.record("a.pdf", "h1", {1: {"hash": "p1", "ids": ["x"]}})
+    other.record("b.pdf", "h2", {1: {"hash": "p2", "ids": ["y"]}})
+    manifest.record("a.pdf", "h3", {1: {"hash": "p3", "ids": ["z"]}})
+
+    assert other.entry("b.pdf")["pages"]["1"]["ids"] == ["y"]
+    assert manifest.entry("a.pdf")["file_hash"] == "h3"
+
+
+def test_json_manifest_is_imported(tmp_path):
+    (tmp_path / "manifest.json").write_text(json.dumps({"files": {
+        os.path.abspath("a.pdf"): {"file_hash": "h1", "pages": {"1": {"hash": "p1", "ids": ["x"]}}}
+    }}))
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    assert manifest.is_unchanged("a.pdf", "h1")
+    assert manifest.record("a.pdf", "h2", {1: {"hash": "p2", "ids": ["y"]}}) == ["x"]
+
+
+def test_clear(tmp_path):
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    manifest.record("a.pdf", "h1", {1: {"hash": "p1", "ids": ["x"]}})
+    manifest.clear()
+    assert manifest.entry("a.pdf") is None
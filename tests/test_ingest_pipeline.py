@@ -0,0 +1,337 @@
+"""
+Tests for the staged ingestion pipeline (load → classify → split → embed → write).
+"""
+
+import sys
+import os
+import threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_core.documents import Document
+
+from vectorstore import pipeline, store, text_splitter
+from vectorstore.manifest import IngestManifest, chunk_id, hash_file
+
+SAMPLE_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                          "sample_docs", "test.pdf")
+
+
+def _page(number, text):
+    return {"text": text, "page_number": number, "extraction_method": "test"}
+
+
+def _text(name, number, version=1):
+    return f"{name} page {number} v{version}: demand paging loads pages only when they are needed. " * 3
+
+
+class WhitespaceTokenizer:
+    def tokenize(self, text):
+        return text.split()
+
+
+@pytest.fixture
+def world(tmp_path, monkeypatch):
+    """Fake files, loaders and store around the real pipeline threads."""
+    state = {"pages": {}, "written": [], "deleted": [], "recorded": [], "fail": set()}
+    manifest = IngestManifest(str(tmp_path / "manifest.sqlite3"))
+    lock = threading.Lock()
+
+    def load_pages(path):
+        for number, text in state["pages"][path]:
+            if (path, number) in state["fail"]:
+                raise RuntimeError("corrupt page")
+            yield _page(number, text)
+
+    def write_embedded(ids, embeddings, docs):
+        assert len(ids) == len(embeddings) == len(docs)
+        with lock:
+            state["written"].extend(docs)
+
+    real_record = manifest.record
+
+    def record(path, file_hash, pages, *classification):
+        # Every chunk of the file must be stored before its manifest entry.
+        stored = {doc.id for doc in state["written"]}
+        ids = {chunk for info in pages.values() for chunk in info["ids"]}
+        state["recorded"].append((path, ids - stored))
+        return real_record(path, file_hash, pages, *classification)
+
+    monkeypatch.setattr(manifest, "record", record)
+    monkeypatch.setattr(pipeline, "get_ingest_manifest", lambda: manifest)
+    monkeypatch.setattr(pipeline, "hash_file", lambda path: str(hash(tuple(state["pages"][path]))))
+    monkeypatch.setattr(pipeline, "load_pages", load_pages)
+    monkeypatch.setattr(pipeline, "classify_document", lambda path, preview: "notes")
+    monkeypatch.setattr(pipeline, "embed_texts", lambda texts, workers=None: [[0.0]] * len(texts))
+    monkeypatch.setattr(pipeline, "write_embedded", write_embedded)
+    monkeypatch.setattr(pipeline, "delete_documents", lambda ids: state["deleted"].extend(ids))
+    monkeypatch.setattr(text_splitter, "_get_tokenizer", lambda: WhitespaceTokenizer())
+    state["manifest"] = manifest
+    return state
+
+
+def _run(paths, **options):
+    options.setdefault("queue_size", 2)
+    p = pipeline.IngestionPipeline(**options)
+    jobs = p.run(pipeline.IngestJob(path, subject="os") for path in paths)
+    return p, {job.file_path: job for job in jobs}
+
+
+def test_every_file_is_written_before_its_manifest_entry(world):
+    paths = [f"book{i}.pdf" for i in range(4)]
+    for path in paths:
+        world["pages"][path] = [(n, _text(path, n)) for n in range(1, 16)]
+
+    p, jobs = _run(paths, load_workers=2, classify_workers=2, split_workers=3, embed_workers=2, batch_size=5)
+
+    assert {job.status for job in jobs.values()} == {"done"}
+    assert sorted(path for path, _ in world["recorded"]) == paths
+    assert all(not missing for _, missing in world["recorded"])
+    assert len(world["written"]) == sum(job.chunks_written for job in jobs.values()) == p.stats["write"]["items"]
+    assert p.stats["load"]["items"] == p.stats["split"]["items"] == 60
+    assert {doc.metadata["subject"] for doc in world["written"]} == {"os"}
+
+
+def test_only_changed_pages_are_embedded_again(world):
+    world["pages"]["a.pdf"] = [(n, _text("a", n)) for n in range(1, 6)]
+    world["pages"]["b.pdf"] = [(n, _text("b", n)) for n in range(1, 4)]
+    _run(["a.pdf", "b.pdf"])
+    old_page_3 = world["manifest"].entry("a.pdf")["pages"]["3"]["ids"]
+
+    world["written"].clear()
+    world["pages"]["a.pdf"][2] = (3, _text("a", 3, version=2))
+    _, jobs = _run(["a.pdf", "b.pdf"])
+
+    assert jobs["b.pdf"].status == "skipped"
+    assert jobs["a.pdf"].pages_unchanged == 4
+    assert {doc.metadata["page_number"] for doc in world["written"]} == {3}
+    assert sorted(world["deleted"]) == sorted(old_page_3)
+
+
+def test_reupload_under_another_subject_is_ingested_again(world):
+    world["pages"]["a.pdf"] = [(n, _text("a", n)) for n in range(1, 4)]
+    _run(["a.pdf"])
+    world["written"].clear()
+
+    p = pipeline.IngestionPipeline(queue_size=2)
+    job, = p.run([pipeline.IngestJob("a.pdf", subject="dbms")])
+
+    assert job.status == "done" and job.pages_unchanged == 0
+    assert {doc.metadata["subject"] for doc in world["written"]} == {"dbms"}
+    assert len(world["written"]) == job.chunks_written > 0
+    assert world["manifest"].entry("a.pdf")["subject"] == "dbms"
+    assert not world["deleted"]
+
+
+def test_doc_type_is_stored_lowercase(world, monkeypatch):
+    world["pages"]["paper.pdf"] = [(1, _text("paper", 1))]
+    world["pages"]["notes.pdf"] = [(1, _text("notes", 1))]
+    monkeypatch.setattr(pipeline, "classify_document", lambda path, preview: " PYQ")
+
+    p = pipeline.IngestionPipeline(queue_size=2)
+    p.run([pipeline.IngestJob("paper.pdf", subject="os"),
+           pipeline.IngestJob("notes.pdf", subject="os", doc_type="Notes")])
+
+    assert {doc.metadata["source_file"]: doc.metadata["doc_type"] for doc in world["written"]} == \
+        {"paper.pdf": "pyq", "notes.pdf": "notes"}
+
+
+def test_a_repeated_paragraph_is_stored_once(world):
+    paragraph = " ".join(["Demand paging loads pages only when they are needed."] * 18)
+    world["pages"]["a.pdf"] = [(1, "\n\n".join([paragraph] * 4))]
+
+    _, jobs = _run(["a.pdf"])
+
+    ids = [doc.id for doc in world["written"]]
+    assert jobs["a.pdf"].status == "done"
+    assert ids and len(ids) == len(set(ids))
+    assert world["manifest"].entry("a.pdf")["pages"]["1"]["ids"] == ids
+
+
+def test_a_failing_file_does_not_stop_the_others(world):
+    world["pages"]["good.pdf"] = [(n, _text("good", n)) for n in range(1, 4)]
+    world["pages"]["bad.pdf"] = [(n, _text("bad", n)) for n in range(1, 4)]
+    world["fail"].add(("bad.pdf", 2))
+
+    _, jobs = _run(["bad.pdf", "good.pdf"])
+
+    assert jobs["good.pdf"].status == "done"
+    assert jobs["bad.pdf"].status == "failed" and "corrupt page" in jobs["bad.pdf"].error
+    # No manifest entry, so the file is retried next time.
+    assert world["manifest"].entry("bad.pdf") is None
+
+
+def test_nothing_is_stored_on_estimated_chunk_lengths(world, monkeypatch):
+    world["pages"]["a.pdf"] = [(n, _text("a", n)) for n in range(1, 4)]
+    monkeypatch.setattr(text_splitter, "_get_tokenizer", lambda: None)
+
+    _, jobs = _run(["a.pdf"])
+
+    assert jobs["a.pdf"].status == "failed" and "tokenizer" in jobs["a.pdf"].error
+    assert not world["written"]
+    assert world["manifest"].entry("a.pdf") is None
+
+
+def test_classification_is_attempted_once_per_file(world, monkeypatch):
+    world["pages"]["a.pdf"] = [(n, _text("a", n)) for n in range(1, 6)]
+    world["pages"]["b.pdf"] = [(n, _text("b", n)) for n in range(1, 3)]
+    calls = []
+
+    def classify_document(path, preview):
+        calls.append(path)
+        if path == "a.pdf":
+            raise RuntimeError("LLM unavailable")
+        return "notes"
+
+    monkeypatch.setattr(pipeline, "classify_document", classify_document)
+    _, jobs = _run(["a.pdf", "b.pdf"], classify_workers=2)
+
+    assert sorted(calls) == ["a.pdf", "b.pdf"]
+    assert jobs["a.pdf"].status == "failed" and "LLM unavailable" in jobs["a.pdf"].error
+    assert jobs["b.pdf"].status == "done"
+    assert {doc.metadata["source_file"] for doc in world["written"]} == {"b.pdf"}
+
+
+def test_a_failing_progress_callback_does_not_stop_the_run(world):
+    paths = ["a.pdf", "b.pdf", "c.pdf"]
+    for path in paths:
+        world["pages"][path] = [(n, _text(path, n)) for n in range(1, 3)]
+    seen = []
+
+    def progress(job):
+        seen.append(job.file_path)
+        raise ValueError("widget gone")
+
+    p = pipeline.IngestionPipeline(queue_size=2, progress=progress)
+    result = threading.Thread(target=lambda: seen.append(p.run(pipeline.IngestJob(path, subject="os") for path in paths)))
+    result.start()
+    result.join(10)
+
+    assert not result.is_alive()
+    assert sorted(seen[:3]) == paths
+    assert {job.status for job in seen[3]} == {"done"}
+
+
+def test_memory_cap_holds_back_new_files(world, monkeypatch):
+    paths = [f"scan{i}.pdf" for i in range(4)]
+    for path in paths:
+        world["pages"][path] = [(n, _text(path, n)) for n in range(1, 4)]
+
+    loading = []
+    peak = []
+    real_load = pipeline.load_pages
+
+    def tracked_load(path):
+        loading.append(path)
+        peak.append(len(loading))
+        yield from real_load(path)
+        loading.remove(path)
+
+    monkeypatch.setattr(pipeline, "load_pages", tracked_load)
+    monkeypatch.setattr(pipeline, "ingest_memory_mb", lambda: 4096)
+
+    p, jobs = _run(paths, load_workers=4, max_memory_mb=1024)
+
+    assert {job.status for job in jobs.values()} == {"done"}
+    # Always over the cap: files run one at a time, but they all run.
+    assert max(peak) == 1
+    assert p.memory_waits >= 1
+
+
+def test_memory_counts_shared_pages_once(monkeypatch):
+    class Info:
+        def __init__(self, rss, pss):
+            self.rss, self.pss = rss, pss
+
+    class Process:
+        def __init__(self, rss=300 * 2 ** 20, pss=100 * 2 ** 20, children=()):
+            self._info, self._children = Info(rss, pss), children
+
+        def memory_full_info(self):
+            return self._info
+
+        def memory_info(self):
+            return self._info
+
+        def children(self, recursive=False):
+            return self._children
+
+    class Gone(Process):
+        def memory_full_info(self):
+            raise FakePsutil.Error()
+
+    class FakePsutil:
+        class Error(Exception):
+            pass
+
+        class AccessDenied(Error):
+            pass
+
+        @staticmethod
+        def Process():
+            # Two workers mapping the same 200 MB model as the parent.
+            return Process(children=[Process(), Process(), Gone()])
+
+    monkeypatch.setitem(sys.modules, "psutil", FakePsutil)
+    assert pipeline.ingest_memory_mb() == pytest.approx(300)
+
+
+def test_pdfs_load_on_many_threads_at_once(world, tmp_path, monkeypatch):
+    # The real PDF loader: the pdfium engine is not thread-safe on its own.
+    monkeypatch.setattr(pipeline, "load_pages", pipeline.LOADERS[".pdf"])
+    monkeypatch.setattr(pipeline, "hash_file", hash_file)
+    paths = []
+    for i in range(8):
+        paths.append(str(tmp_path / f"copy{i}.pdf"))
+        with open(SAMPLE_PDF, "rb") as src, open(paths[-1], "wb") as dst:
+            dst.write(src.read() + f"%{i}\n".encode())
+
+    p, jobs = _run(paths, load_workers=8, queue_size=64)
+
+    assert {job.status for job in jobs.values()} == {"done"}
+    assert {job.pages for job in jobs.values()} == {12}
+    texts = [sorted(doc.page_content for doc in world["written"] if doc.metadata["source_file"] == f"copy{i}.pdf")
+             for i in range(8)]
+    assert texts[0] and all(text == texts[0] for text in texts)
+
+
+def _page_chunks(events, pages, per_page=2, changed=()):
+    for page in pages:
+        events.append(("read", page))
+        for i in range(per_page):
+            text = f"page {page} chunk {i}" + (" v2" if page in changed else "")
+            yield Document(id=chunk_id("h", page, text), page_content=text,
+                           metadata={"page_number": page, "subject": "os", "doc_type": "notes"})
+
+
+def test_sync_file_chunks_goes_through_the_pipeline(world, monkeypatch):
+    events = []
+    real_write = pipeline.write_embedded
+
+    def write_embedded(ids, embeddings, docs):
+        events.append(("write", [doc.metadata["page_number"] for doc in docs]))
+        real_write(ids, embeddings, docs)
+
+    monkeypatch.setattr(pipeline, "write_embedded", write_embedded)
+    written = store.sync_file_chunks("a.pdf", "h1", _page_chunks(events, range(1, 6)), batch_size=4)
+
+    assert written == len(world["written"]) == 10
+    writes = [pages for kind, pages in events if kind == "write"]
+    assert all(len(pages) <= 4 for pages in writes)
+    assert world["manifest"].is_unchanged("a.pdf", "h1", "os", "notes")
+
+    # Only the changed page is written again; its old chunks are removed.
+    events.clear()
+    world["written"].clear()
+    written = store.sync_file_chunks("a.pdf", "h2", _page_chunks(events, range(1, 6), changed={3}))
+    assert written == 2
+    assert [pages for kind, pages in events if kind == "write"] == [[3, 3]]
+    assert sorted(world["deleted"]) == sorted(chunk_id("h", 3, f"page 3 chunk {i}") for i in range(2))
+
+
+def test_find_files_skips_lock_files_and_unsupported_types(tmp_path):
+    from vectorstore.ingest import find_files
+
+    for name in ["b.pdf", "a.DOCX", "~$a.docx", "notes.txt", "scan.png"]:
+        (tmp_path / name).write_bytes(b"")
+    assert [os.path.basename(path) for path in find_files(str(tmp_path))] == ["a.DOCX", "b.pdf", "scan.png"]
@@ -0,0 +1,36 @@
+"""
+Tests for MMR re-ranking of retrieved chunks.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from vectorstore.retriever import maximal_marginal_relevance
+
+
+def test_near_duplicates_are_skipped():
+    query = np.array([1.0, 0.0, 0.0])
+    candidates = [
+        [0.9, 0.1, 0.0],
+        [0.9, 0.11, 0.0],   # near-copy of the first
+        [0.7, 0.0, 0.7],
+    ]
+    assert maximal_marginal_relevance(query, candidates, k=2) == [0, 2]
+
+
+def test_lambda_one_is_relevance_order():
+    rng = np.random.default_rng(0)
+    query = rng.standard_normal(8)
+    candidates = rng.standard_normal((20, 8))
+    relevance = (candidates / np.linalg.norm(candidates, axis=1, keepdims=True)) @ query
+    picks = maximal_marginal_relevance(query, candidates, k=5, lambda_mult=1.0)
+    assert picks == list(np.argsort(-relevance)[:5])
+
+
+def test_k_larger_than_candidates():
+    picks = maximal_marginal_relevance([1.0, 0.0], [[1.0, 0.0], [0.0, 1.0]], k=5)
+    assert sorted(picks) == [0, 1]
+    assert maximal_marginal_relevance([1.0, 0.0], [], k=3) == []
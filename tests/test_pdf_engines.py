@@ -0,0 +1,152 @@
+"""
+Tests for the pluggable PDF text engines.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ctypes
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pypdfium2
+import pypdfium2.raw as pdfium_c
+import pytest
+
+from document_processor.pdf_engines import (
+    PDF_ENGINES, PdfEngine, get_table_stats, may_have_ruled_table, open_pdf_engine, reset_table_stats
+)
+
+TEST_PDF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "sample_docs", "test.pdf")
+
+
+def _letters(text):
+    # pdfplumber drops the spaces between some words on this file and the
+    # engines order some blocks differently, so compare character counts.
+    return Counter("".join(text.split()))
+
+
+def test_engines_agree_on_page_text():
+    texts = {}
+    for engine in PDF_ENGINES:
+        with open_pdf_engine(TEST_PDF, engine) as pdf:
+            assert pdf.name == engine
+            texts[engine] = [pdf.page_text(i) for i in range(len(pdf))]
+
+    assert len(texts["pdfium"]) == len(texts["pdfplumber"]) == 12
+    for fast, reference in zip(texts["pdfium"], texts["pdfplumber"]):
+        assert "\r" not in fast
+        fast, reference = _letters(fast), _letters(reference)
+        assert sum((fast & reference).values()) / sum(reference.values()) > 0.98
+
+
+def test_pdfium_engine_is_safe_across_threads():
+    def read(_):
+        with open_pdf_engine(TEST_PDF, "pdfium") as pdf:
+            return [text for _, text in pdf.iter_pages()]
+
+    with open_pdf_engine(TEST_PDF, "pdfium") as pdf:
+        expected = [text for _, text in pdf.iter_pages()]
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(read, range(16))) == [expected] * 16
+
+
+def test_engines_must_implement_page_access():
+    class Incomplete(PdfEngine):
+        def __len__(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Incomplete(TEST_PDF)
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        open_pdf_engine(TEST_PDF, "mupdf")
+
+
+def _write_pdf(path, ruled_table):
+    """One page of text, optionally with a ruled 3 x 3 table below it."""
+    doc = pypdfium2.PdfDocument.new()
+    page = doc.new_page(612, 792)
+
+    def text(value, x, y):
+        obj = pdfium_c.FPDFPageObj_NewTextObj(doc.raw, b"Helvetica", ctypes.c_float(11))
+        buffer = ctypes.create_string_buffer((value + "\0").encode("utf-16-le"))
+        pdfium_c.FPDFText_SetText(obj, ctypes.cast(buffer, ctypes.POINTER(pdfium_c.FPDF_WCHAR)))
+        pdfium_c.FPDFPageObj_Transform(obj, 1, 0, 0, 1, x, y)
+        pdfium_c.FPDFPage_InsertObject(page.raw, obj)
+
+    def line(x0, y0, x1, y1):
+        path = pdfium_c.FPDFPageObj_CreateNewPath(x0, y0)
+        pdfium_c.FPDFPath_LineTo(path, x1, y1)
+        pdfium_c.FPDFPath_SetDrawMode(path, pdfium_c.FPDF_FILLMODE_NONE, True)
+        pdfium_c.FPDFPage_InsertObject(page.raw, path)
+
+    text("Page replacement algorithms", 72, 720)
+    line(72, 700, 300, 700)     # underline: one rule, no table
+    if ruled_table:
+        xs, ys = [72, 200, 330, 460], [600, 580, 560, 540]
+        for y in ys:
+            line(xs[0], y, xs[-1], y)
+        for x in xs:
+            line(x, ys[0], x, ys[-1])
+        for row in range(3):
+            for col in range(3):
+                text(f"r{row}c{col}", xs[col] + 5, ys[row + 1] + 5)
+
+    pdfium_c.FPDFPage_GenerateContent(page.raw)
+    page.close()
+    doc.save(path)
+    doc.close()
+
+
+@pytest.mark.parametrize("engine", sorted(PDF_ENGINES))
+@pytest.mark.parametrize("ruled_table", [True, False])
+def test_tables_only_extracted_where_ruled(tmp_path, engine, ruled_table):
+    path = str(tmp_path / "page.pdf")
+    _write_pdf(path, ruled_table)
+    reset_table_stats()
+
+    with open_pdf_engine(path, engine) as pdf:
+        text = pdf.page_text(0)
+        stats = pdf.table_stats
+
+    assert stats == {"pages": 1, "attempted": int(ruled_table), "found": int(ruled_table)}
+    assert get_table_stats() == stats
+    assert ("r1c0 | r1c1 | r1c2" in text) == ruled_table
+
+
+def test_ruling_heuristic():
+    grid_h = [(y, 0, 100) for y in (0, 50, 100)]
+    grid_v = [(x, 0, 100) for x in (0, 50, 100)]
+    assert may_have_ruled_table(grid_h, grid_v)
+
+    # Page border plus two framed figures: rules everywhere, but no grid.
+    border_h = [(0, 0, 612), (792, 0, 612), (100, 66, 546), (300, 66, 546)]
+    border_v = [(0, 0, 792), (612, 0, 792), (66, 100, 300), (546, 100, 300)]
+    assert not may_have_ruled_table(border_h, border_v)
+
+    # A single column of boxes: its cells repeat text already on the page.
+    stack_h = [(y, 0, 50) for y in range(0, 200, 20)]
+    stack_v = [(0, 0, 180), (50, 0, 180)]
+    assert not may_have_ruled_table(stack_h, stack_v)
+
+
+@pytest.mark.parametrize("engine", sorted(PDF_ENGINES))
+def test_iter_pages_releases_parsed_pages(tmp_path, engine):
+    path = str(tmp_path / "page.pdf")
+    _write_pdf(path, ruled_table=True)
+
+    with open_pdf_engine(path, engine) as pdf:
+        streamed = list(pdf.iter_pages())
+        # The pdfplumber handle (the pdfium engine opens one for tables).
+        plumber = pdf._pdf if engine == "pdfplumber" else pdf._plumber
+        cached = [page.page_number for page in plumber.pages
+                  if "_objects" in vars(page) or "_layout" in vars(page)]
+
+    assert [page_num for page_num, _ in streamed] == [0]
+    assert "r1c0 | r1c1 | r1c2" in streamed[0][1]
+    assert cached == []
@@ -0,0 +1,42 @@
+"""
+Tests for the query embedding / retrieval result LRU cache.
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vectorstore.retriever import _LRUCache
+
+
+def test_hits_misses_and_eviction():
+    cache = _LRUCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1      # "a" becomes most recently used
+    cache.put("c", 3)               # evicts "b"
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["size"] == 2
+
+
+def test_new_generation_invalidates():
+    cache = _LRUCache(maxsize=4)
+    assert cache.get("q", generation=1) is None
+    cache.put("q", "old", generation=1)
+    assert cache.get("q", generation=1) == "old"
+
+    assert cache.get("q", generation=2) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_put_from_older_generation_is_dropped():
+    cache = _LRUCache(maxsize=4)
+    cache.get("q", generation=2)
+    cache.put("q", "stale", generation=1)
+    assert cache.get("q", generation=2) is None
@@ -0,0 +1,179 @@
+"""
+Tests for retrieve_docs / retrieve_docs_batch: concurrent search legs,
+their latency budgets and the batch path.
+"""
+
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from langchain_chroma import Chroma
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from vectorstore import retriever
+from vectorstore.bm25_index import BM25Index
+from vectorstore.store import relevance_score
+
+
+def _hits(leg, queries, delay=0.0):
+    time.sleep(delay)
+    return [[(Document(page_content=f"{leg} {query}", id=f"{leg}-{query}"), 1.0)] for query in queries]
+
+
+@pytest.fixture
+def legs(monkeypatch):
+    """Fake vector / BM25 legs whose delay (or error) each test sets."""
+    retriever.clear_retrieval_cache()
+    settings = {"vector": 0.0, "bm25": 0.0, "warm_up": 0.0, "calls": []}
+
+    def leg(name):
+        def run(queries, **kwargs):
+            settings["calls"].append(name)
+            if isinstance(settings[name], Exception):
+                raise settings[name]
+            return _hits(name, queries, settings[name])
+        return run
+
+    monkeypatch.setattr(retriever, "retrieve_with_scores_batch", leg("vector"))
+    monkeypatch.setattr(retriever, "get_bm25_results_batch", leg("bm25"))
+    monkeypatch.setattr(retriever, "warm_up_vector_store", lambda: time.sleep(settings["warm_up"]))
+    monkeypatch.setattr(retriever, "get_collection_generation", lambda: ("test", id(settings)))
+    yield settings
+    retriever.clear_retrieval_cache()
+
+
+def test_legs_run_concurrently(legs):
+    legs["vector"] = legs["bm25"] = 0.4
+    start = time.perf_counter()
+    docs = retriever.retrieve_docs("paging", k=4)
+    assert time.perf_counter() - start < 0.7
+    assert sorted(docs.legs) == ["bm25", "vector"]
+    assert {doc.page_content for doc in docs} == {"vector paging", "bm25 paging"}
+
+
+def test_slow_leg_is_dropped_and_not_cached(legs):
+    legs["vector"] = 1.0
+    start = time.perf_counter()
+    docs = retriever.retrieve_docs("paging", k=4, vector_timeout=0.2)
+    assert time.perf_counter() - start < 0.8
+    assert docs.legs == ["bm25"] and docs.timed_out == ["vector"]
+    assert [doc.page_content for doc in docs] == ["bm25 paging"]
+
+    legs["vector"] = 0.0
+    assert sorted(retriever.retrieve_docs("paging", k=4, vector_timeout=0.2).legs) == ["bm25", "vector"]
+
+
+def test_failing_leg_raises_even_if_the_other_succeeds(legs):
+    legs["bm25"] = RuntimeError("index unreadable")
+    with pytest.raises(RuntimeError, match="index unreadable"):
+        retriever.retrieve_docs("paging", k=4)
+
+
+def test_model_load_is_outside_the_leg_budget(legs):
+    legs["warm_up"] = 0.5
+    docs = retriever.retrieve_docs("paging", k=4, vector_timeout=0.2, bm25_timeout=0.2)
+    assert sorted(docs.legs) == ["bm25", "vector"] and not docs.timed_out
+
+
+VOCABULARY = ["paging", "page", "fault", "deadlock", "semaphore", "file", "system", "normalization", "tables"]
+
+CHUNKS = [
+    ("c1", "Demand paging loads a page only when a page fault occurs.", {"subject": "os", "doc_type": "notes"}),
+    ("c2", "Deadlock needs mutual exclusion, hold and wait and circular wait.", {"subject": "os", "doc_type": "notes"}),
+    ("c3", "A semaphore guards the critical section.", {"subject": "os", "doc_type": "pyq"}),
+    ("c4", "The virtual file system hides differences between file systems.", {"subject": "os", "doc_type": "textbook"}),
+    ("c5", "Normalization removes redundancy from relational tables.", {"subject": "dbms", "doc_type": "notes"}),
+]
+
+
+class KeywordEmbeddings(Embeddings):
+    """Unit bag-of-words vectors over VOCABULARY, so queries land near matching chunks."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        words = text.lower().split()
+        vector = [sum(word.startswith(term) for word in words) + 0.1 for term in VOCABULARY]
+        norm = sum(v * v for v in vector) ** 0.5
+        return [v / norm for v in vector]
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    """A real Chroma collection and BM25 index holding CHUNKS."""
+    embeddings = KeywordEmbeddings()
+    store = Chroma(collection_name="test", embedding_function=embeddings,
+                   persist_directory=str(tmp_path / "chroma"), relevance_score_fn=relevance_score)
+    ids, texts, metadatas = (list(column) for column in zip(*CHUNKS))
+    store.add_texts(texts, metadatas=metadatas, ids=ids)
+    index = BM25Index(str(tmp_path / "bm25.sqlite3"))
+    index.add(ids, texts, metadatas)
+
+    retriever.clear_retrieval_cache()
+    monkeypatch.setattr(retriever, "get_vector_store", lambda: store)
+    monkeypatch.setattr(retriever, "encode_queries", embeddings.embed_documents)
+    monkeypatch.setattr(retriever, "get_bm25_index", lambda: index)
+    monkeypatch.setattr(retriever, "warm_up_vector_store", lambda: None)
+    monkeypatch.setattr(retriever, "get_collection_generation", lambda: ("test", str(tmp_path)))
+    yield store
+    retriever.clear_retrieval_cache()
+
+
+BATCH_QUERIES = ["demand paging page fault", "deadlock semaphore", "file system", "demand paging page fault"]
+
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"doc_type": "notes"},
+    {"subject": "os", "k": 2},
+    {"fusion": "minmax", "mmr": True},
+])
+def test_batch_matches_single_queries(collection, options):
+    batch = retriever.retrieve_docs_batch(BATCH_QUERIES, **options)
+    retriever.clear_retrieval_cache()
+    single = [retriever.retrieve_docs(query, **options) for query in BATCH_QUERIES]
+
+    assert len(batch) == len(BATCH_QUERIES)
+    for mine, expected in zip(batch, single):
+        assert [doc.id for doc in mine] == [doc.id for doc in expected]
+        assert [doc.metadata["relevance_score"] for doc in mine] == \
+            [doc.metadata["relevance_score"] for doc in expected]
+    assert batch[0] and batch[0][0].id == "c1"
+
+
+@pytest.mark.filterwarnings("ignore:Relevance scores must be between 0 and 1")
+def test_vector_relevance_uses_the_collection_distance(collection):
+    query = "demand paging page fault"
+    scores = dict((doc.id, score) for doc, score in retriever.retrieve_with_scores(query, top_k=5))
+    expected = collection.similarity_search_with_relevance_scores(query, k=5)
+    assert scores == pytest.approx({doc.id: score for doc, score in expected})
+    assert scores["c1"] == max(scores.values())
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "minmax"])
+def test_score_threshold_is_in_relevance_units(collection, fusion):
+    query = "demand paging page fault"
+    everything = retriever.retrieve_docs(query, k=5, fusion=fusion)
+    kept = retriever.retrieve_docs(query, k=5, fusion=fusion, score_threshold=0.4)
+
+    assert kept and kept[0].id == "c1"
+    assert all(doc.metadata["relevance_score"] >= 0.4 for doc in kept)
+    assert {doc.id for doc in kept} == \
+        {doc.id for doc in everything if doc.metadata["relevance_score"] >= 0.4}
+    assert len(kept) < len(everything)
+
+
+def test_relevance_is_the_best_leg_score():
+    def doc(doc_id):
+        return Document(page_content=doc_id, id=doc_id)
+
+    vector, bm25, relevance = retriever.relevant_hits(
+        [(doc("a"), 0.8), (doc("b"), 0.3)], [(doc("b"), 6.0), (doc("c"), 1.5)], score_threshold=0.5
+    )
+    assert [d.id for d, _ in vector] == ["a"]
+    assert bm25 == [(bm25[0][0], 1.0)] and bm25[0][0].id == "b"
+    assert relevance == {"a": 0.8, "b": 1.0}
@@ -0,0 +1,104 @@
+"""
+Tests for the embedding-tokenizer-aware chunk splitter.
+"""
+
+import sys
+import os
+import re
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from vectorstore import text_splitter
+from vectorstore.text_splitter import CHUNK_TOKENS, MIN_CHUNK_CHARS, count_tokens, split_text
+
+
+class WordPieceTokenizer:
+    """Stand-in for the MiniLM tokenizer: punctuation alone, words cut into 4-character pieces."""
+
+    def _spans(self, text):
+        for match in re.finditer(r"\w+|[^\w\s]", text):
+            for start in range(match.start(), match.end(), 4):
+                yield start, min(start + 4, match.end())
+
+    def tokenize(self, text):
+        return [text[start:end] for start, end in self._spans(text)]
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False):
+        return {"offset_mapping": list(self._spans(text))}
+
+
+@pytest.fixture
+def tokenizer(monkeypatch):
+    fake = WordPieceTokenizer()
+    monkeypatch.setattr(text_splitter, "_get_tokenizer", lambda: fake)
+    return fake
+
+
+PAGE = "\n\n".join(
+    " ".join(f"Paragraph {p} sentence {s} explains demand paging and page replacement." for s in range(6))
+    for p in range(30)
+)
+
+
+def test_every_chunk_fits_the_model_window(tokenizer):
+    chunks = split_text(PAGE)
+    assert all(count_tokens(chunk) <= CHUNK_TOKENS for chunk in chunks)
+    # Chunks are filled close to the window rather than cut short.
+    total = count_tokens(PAGE)
+    assert len(chunks) <= total // (CHUNK_TOKENS - text_splitter.CHUNK_OVERLAP_TOKENS) + 1
+    assert "Paragraph 29 sentence 5" in chunks[-1]
+
+
+def test_unbroken_text_is_cut_to_the_window(tokenizer):
+    chunks = split_text("x" * 5000)
+    assert chunks and all(count_tokens(chunk) <= CHUNK_TOKENS for chunk in chunks)
+    assert sum(len(chunk) for chunk in chunks) >= 5000
+
+
+def test_tiny_fragments_are_dropped(tokenizer):
+    assert split_text("Unit 1") == []
+    assert all(len(chunk.strip()) >= MIN_CHUNK_CHARS for chunk in split_text(PAGE + "\n\n12"))
+
+
+def test_character_estimate_without_tokenizer(monkeypatch):
+    monkeypatch.setattr(text_splitter, "_get_tokenizer", lambda: None)
+    chunks = split_text(PAGE)
+    assert chunks
+    assert all(len(chunk) <= CHUNK_TOKENS * text_splitter.EST_CHARS_PER_TOKEN for chunk in chunks)
+
+
+def test_tokenizer_comes_from_the_loaded_model(monkeypatch):
+    from vectorstore import store
+
+    class Model:
+        tokenizer = WordPieceTokenizer()
+
+    monkeypatch.setattr(store, "get_embedding_model", lambda: Model)
+    monkeypatch.setattr(text_splitter, "_tokenizer", None)
+    monkeypatch.setattr(text_splitter, "_tokenizer_failed_at", None)
+    assert text_splitter._get_tokenizer() is Model.tokenizer
+    assert not text_splitter.using_estimate()
+
+
+def test_a_failed_tokenizer_load_is_retried(monkeypatch):
+    from vectorstore import store
+
+    class Model:
+        tokenizer = WordPieceTokenizer()
+
+    def offline():
+        raise OSError("hub unreachable")
+
+    clock = [1000.0]
+    monkeypatch.setattr(text_splitter.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(store, "get_embedding_model", offline)
+    monkeypatch.setattr(text_splitter, "_tokenizer", None)
+    monkeypatch.setattr(text_splitter, "_tokenizer_failed_at", None)
+    assert text_splitter.using_estimate()
+
+    monkeypatch.setattr(store, "get_embedding_model", lambda: Model)
+    assert text_splitter.using_estimate()
+    clock[0] += text_splitter.TOKENIZER_RETRY_SECONDS
+    assert text_splitter._get_tokenizer() is Model.tokenizer
+    assert not text_splitter.using_estimate()
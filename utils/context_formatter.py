@@ -2,34 +2,185 @@ import os
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from functools import lru_cache
+
+
+# Prompt budgets for retrieved context, in tokens: no more than the old
+# per-chunk character caps allowed (500 characters x k=4 chunks by default,
+# 400 x 6 for revision notes).
+DEFAULT_CONTEXT_TOKENS = 500
+REVISION_CONTEXT_TOKENS = 600
+DEFAULT_HEADER = "[Source {n}: {source} | Page {page} | Type: {doc_type} | Subject: {subject}]"
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence.
+_MIN_OVERLAP_CHARS = 30
+# Don't start a truncated passage with less room than this.
+_MIN_PARTIAL_TOKENS = 40
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """cl100k_base encoder, or None if tiktoken or its BPE file is unavailable."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"⚠️ tiktoken encoding unavailable ({type(e).__name__}); estimating tokens as characters / 4")
+        return None
+
+
+def count_tokens(text):
+    """Number of tokens in text (cl100k_base; ~4 characters per token as fallback)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, backing off to the last sentence or word break."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        cut = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    if len(cut) >= len(text):
+        return text
+    for boundary in (". ", "\n", " "):
+        pos = cut.rfind(boundary)
+        if pos > len(cut) // 2:
+            return cut[:pos + 1].rstrip()
+    return cut
+
+
+def _doc_fields(doc):
+    """(text, metadata dict) for a Document or a plain dict."""
+    if hasattr(doc, 'metadata'):
+        return doc.page_content, doc.metadata
+    return doc.get("text", ""), doc
+
+
+def _overlap(a, b):
+    """Length of the longest suffix of a that is a prefix of b (0 if too short)."""
+    probe = b[:_MIN_OVERLAP_CHARS]
+    if len(probe) < _MIN_OVERLAP_CHARS:
+        return 0
+    start = a.find(probe, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def _merge_page_spans(spans):
+    """
+    Merge spans (rank, text) from one page: drop spans contained in another
+    and join pairs where one ends with the start of the other (chunk overlap).
+    A merged span keeps the best rank of its parts.
+    """
+    spans = list(spans)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(spans)):
+            for j in range(len(spans)):
+                if i == j:
+                    continue
+                (rank_a, a), (rank_b, b) = spans[i], spans[j]
+                if b in a:
+                    combined = a
+                else:
+                    overlap = _overlap(a, b)
+                    if not overlap:
+                        continue
+                    combined = a + b[overlap:]
+                spans[i] = (min(rank_a, rank_b), combined)
+                del spans[j]
+                merged = True
+                break
+            if merged:
+                break
+    return spans
+
+
+def pack_context(docs, max_tokens=DEFAULT_CONTEXT_TOKENS, header=DEFAULT_HEADER):
+    """
+    Packs retrieved docs (best first) into one context string of at most
+    max_tokens tokens.
 
-def format_context(docs):
+    Chunks from the same page are de-duplicated and their overlapping text
+    is sent once; the spans of a page share one header. Spans are added in
+    relevance order until the budget is spent, and the last one is cut at
+    a sentence break if only part of it fits.
+
+    header is a format string with {n}, {source}, {page}, {doc_type} and {subject}.
+    """
+    pages = {}
+    for rank, doc in enumerate(docs):
+        text, meta = _doc_fields(doc)
+        text = text.strip()
+        if not text:
+            continue
+        key = (meta.get("source_file", "unknown"), meta.get("page_number", "?"))
+        page = pages.setdefault(key, {"meta": meta, "spans": []})
+        page["spans"].append((rank, text))
+
+    spans = []
+    for key, page in pages.items():
+        for rank, text in _merge_page_spans(page["spans"]):
+            spans.append((rank, key, text))
+    spans.sort(key=lambda span: span[0])
+
+    def label(n, key):
+        meta = pages[key]["meta"]
+        return header.format(
+            n=n,
+            source=key[0],
+            page=key[1],
+            doc_type=meta.get("doc_type", "notes"),
+            subject=meta.get("subject", "general"),
+        )
+
+    blocks = {}
+    remaining = max_tokens
+    for rank, key, text in spans:
+        label_cost = 0 if key in blocks else count_tokens("\n" + label(len(blocks) + 1, key))
+        cost = label_cost + count_tokens("\n" + text + "\n")
+        if cost > remaining:
+            room = remaining - label_cost
+            # Nothing fits after the header and its line breaks.
+            if room <= 2:
+                break
+            # Always give the best passage whatever room there is.
+            if room < _MIN_PARTIAL_TOKENS and blocks:
+                break
+            text = truncate_to_tokens(text, room - 2)
+            if not text:
+                break
+            cost = remaining
+        blocks.setdefault(key, []).append(text)
+        remaining -= cost
+        if remaining <= 0:
+            break
+
+    context = ""
+    for n, (key, texts) in enumerate(blocks.items(), start=1):
+        context += "\n" + label(n, key) + "\n" + "\n...\n".join(texts) + "\n"
+    return context
+
+
+def format_context(docs, max_tokens=DEFAULT_CONTEXT_TOKENS):
     """
     Formats retrieved docs into a clean context string for LLM prompts.
     Handles both Document objects and plain dicts.
     """
-    context = ""
-    for i, doc in enumerate(docs):
-        if hasattr(doc, 'metadata'):
-            source = doc.metadata.get("source_file", "unknown")
-            page = doc.metadata.get("page_number", "?")
-            doc_type = doc.metadata.get("doc_type", "notes")
-            subject = doc.metadata.get("subject", "general")
-            text = doc.page_content[:500]
-        else:
-            source = doc.get("source_file", "unknown")
-            page = doc.get("page_number", "?")
-            doc_type = doc.get("doc_type", "notes")
-            subject = doc.get("subject", "general")
-            text = doc.get("text", "")[:500]
-
-        context += (
-            f"\n[Source {i+1}: {source} | "
-            f"Page {page} | "
-            f"Type: {doc_type} | "
-            f"Subject: {subject}]\n{text}\n"
-        )
-    return context
+    return pack_context(docs, max_tokens=max_tokens)
 
 
 def format_sources_list(docs):
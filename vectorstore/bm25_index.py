@@ -0,0 +1,513 @@
+"""
+Persistent BM25 inverted index.
+
+Postings, document lengths and collection statistics are kept in a small
+SQLite database next to the Chroma store. `add_documents` updates it as
+chunks are written, so lexical search never re-tokenizes the collection.
+
+Scoring runs on a sparse BM25 weight matrix (see bm25_matrix.py) that
+matches rank_bm25's BM25Okapi. Each process keeps the postings of its last
+snapshot in memory; after a write only the chunks added since (docs.gen)
+and removed since (the removed log) are read back, and the matrix is
+rebuilt from those arrays without another pass over the postings table.
+
+Reads never write: the schema is created once per index file, and read
+connections only run SELECTs, so with WAL they don't wait for an ingest
+holding the write lock.
+"""
+
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from vectorstore.bm25_matrix import BM25Matrix
+
+_script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BM25_INDEX_PATH = os.path.join(_script_dir, "vectorstore", "bm25_index.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc INTEGER PRIMARY KEY,
+    doc_id TEXT UNIQUE NOT NULL,
+    length INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    subject TEXT,
+    doc_type TEXT,
+    gen INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS removed (
+    gen INTEGER NOT NULL,
+    doc INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS removed_gen ON removed (gen);
+"""
+
+# Generations of removals kept in the removed log. A snapshot older than
+# that is reloaded in full.
+REMOVED_LOG_GENERATIONS = 1000
+
+# Serializes writers inside one process; SQLite handles cross-process locking.
+_write_lock = threading.Lock()
+# Index files whose schema this process has checked or created.
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def tokenize(text):
+    """Simple tokenization: lowercase, remove punctuation, split."""
+    text = text.lower()
+    text = re.sub(r'[^\w\s]', '', text)
+    return text.split()
+
+
+class BM25Index:
+    """SQLite-backed BM25 index keyed by the Chroma document id."""
+
+    def __init__(self, path=BM25_INDEX_PATH):
+        self.path = path
+
+    def _has_schema(self):
+        """True if the file already has every table (checked without writing)."""
+        if not os.path.exists(self.path):
+            return False
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(docs)")]
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master")}
+            return "gen" in columns and {"removed", "docs_gen"} <= tables and \
+                conn.execute("SELECT 1 FROM stats WHERE key = 'epoch'").fetchone() is not None
+        except sqlite3.DatabaseError:
+            return False
+        finally:
+            conn.close()
+
+    def _ensure_schema(self):
+        """Create (or upgrade) the tables once per index file and process."""
+        if self.path in _schema_ready and os.path.exists(self.path):
+            return
+        if self._has_schema():
+            _schema_ready.add(self.path)
+            return
+        with _schema_lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                with conn:
+                    # Index files written before docs.gen existed.
+                    if "gen" not in [row[1] for row in conn.execute("PRAGMA table_info(docs)")]:
+                        conn.execute("ALTER TABLE docs ADD COLUMN gen INTEGER NOT NULL DEFAULT 0")
+                    conn.execute("CREATE INDEX IF NOT EXISTS docs_gen ON docs (gen)")
+                    # A fresh epoch per index file tells cached snapshots apart after a clear.
+                    conn.execute(
+                        "INSERT OR IGNORE INTO stats (key, value) VALUES ('epoch', ?)",
+                        (random.getrandbits(31),)
+                    )
+            finally:
+                conn.close()
+            _schema_ready.add(self.path)
+
+    @contextmanager
+    def _connect(self):
+        """Open a write connection, commit on success and always close it."""
+        self._ensure_schema()
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        """
+        Open a read-only connection in autocommit mode. Statements run in
+        their own read transaction unless the caller issues BEGIN.
+        """
+        self._ensure_schema()
+        conn = sqlite3.connect(Path(os.path.abspath(self.path)).as_uri() + "?mode=ro",
+                               uri=True, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_stat(conn, key, default=0.0):
+        row = conn.execute("SELECT value FROM stats WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_stat(conn, key, value):
+        conn.execute(
+            "INSERT INTO stats (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def stats(self):
+        """Return collection statistics: doc count, average length, generation."""
+        with self._read() as conn:
+            n_docs = int(self._get_stat(conn, "n_docs"))
+            total_length = self._get_stat(conn, "total_length")
+            return {
+                "n_docs": n_docs,
+                "avgdl": total_length / n_docs if n_docs else 0.0,
+                "generation": int(self._get_stat(conn, "generation")),
+            }
+
+    def generation_key(self):
+        """(epoch, generation) pair that changes on every write or clear."""
+        with self._read() as conn:
+            return self._generation_key(conn)
+
+    @classmethod
+    def _generation_key(cls, conn):
+        return (
+            int(cls._get_stat(conn, "epoch")),
+            int(cls._get_stat(conn, "generation")),
+        )
+
+    def __len__(self):
+        return self.stats()["n_docs"]
+
+    # ------------------------------------------------------------------ writes
+
+    def _remove_locked(self, conn, doc_ids, generation):
+        """Delete doc_ids' rows, logging each removed doc under generation."""
+        removed = 0
+        for doc_id in doc_ids:
+            row = conn.execute(
+                "SELECT doc, length FROM docs WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+            if not row:
+                continue
+            doc, length = row
+            terms = [t for (t,) in conn.execute(
+                "SELECT term FROM postings WHERE doc = ?", (doc,)
+            )]
+            conn.executemany(
+                "UPDATE terms SET df = df - 1 WHERE term = ?",
+                [(t,) for t in terms]
+            )
+            conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+            conn.execute("DELETE FROM docs WHERE doc = ?", (doc,))
+            conn.execute("INSERT INTO removed (gen, doc) VALUES (?, ?)", (generation, doc))
+            self._set_stat(conn, "total_length",
+                           self._get_stat(conn, "total_length") - length)
+            removed += 1
+        if removed:
+            conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._set_stat(conn, "n_docs", self._get_stat(conn, "n_docs") - removed)
+        return removed
+
+    def _next_generation(self, conn):
+        return int(self._get_stat(conn, "generation")) + 1
+
+    def _set_generation(self, conn, generation):
+        self._set_stat(conn, "generation", generation)
+        floor = generation - REMOVED_LOG_GENERATIONS
+        if floor > self._get_stat(conn, "log_floor"):
+            conn.execute("DELETE FROM removed WHERE gen <= ?", (floor,))
+            self._set_stat(conn, "log_floor", floor)
+
+    def add(self, doc_ids, texts, metadatas):
+        """
+        Index chunks. Re-adding an existing doc_id replaces its postings.
+        """
+        if not doc_ids:
+            return
+        with _write_lock, self._connect() as conn:
+            generation = self._next_generation(conn)
+            self._remove_locked(conn, doc_ids, generation)
+
+            df_updates = Counter()
+            postings = []
+            total_length = 0
+            for doc_id, text, metadata in zip(doc_ids, texts, metadatas):
+                metadata = metadata or {}
+                tokens = tokenize(text)
+                cursor = conn.execute(
+                    "INSERT INTO docs (doc_id, length, content, metadata, subject, doc_type, gen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        doc_id,
+                        len(tokens),
+                        text,
+                        json.dumps(metadata),
+                        metadata.get("subject"),
+                        (metadata.get("doc_type") or "").lower(),
+                        generation,
+                    )
+                )
+                doc = cursor.lastrowid
+                for term, tf in Counter(tokens).items():
+                    postings.append((term, doc, tf))
+                    df_updates[term] += 1
+                total_length += len(tokens)
+
+            conn.executemany(
+                "INSERT INTO postings (term, doc, tf) VALUES (?, ?, ?)", postings
+            )
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) "
+                "ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                list(df_updates.items())
+            )
+            self._set_stat(conn, "n_docs", self._get_stat(conn, "n_docs") + len(doc_ids))
+            self._set_stat(conn, "total_length",
+                           self._get_stat(conn, "total_length") + total_length)
+            self._set_generation(conn, generation)
+
+    def remove(self, doc_ids):
+        """Drop chunks from the index. Unknown ids are ignored."""
+        with _write_lock, self._connect() as conn:
+            generation = self._next_generation(conn)
+            if self._remove_locked(conn, doc_ids, generation):
+                self._set_generation(conn, generation)
+
+    def clear(self):
+        """Delete the index file (and its WAL side files)."""
+        with _write_lock:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            _schema_ready.discard(self.path)
+
+    # ------------------------------------------------------------------- reads
+
+    def _load_snapshot(self):
+        """
+        Return the scoring matrix for the current index generation.
+        The matrix is built once per generation and shared by all queries
+        in this process. A snapshot of an older generation is brought up to
+        date from the rows added and removed since, instead of re-reading
+        every posting.
+        """
+        with self._read() as conn:
+            # One read transaction, so the generation and rows agree.
+            conn.execute("BEGIN")
+            generation = self._generation_key(conn)
+            cached = _snapshots.get(self.path)
+            if cached is not None and cached.is_current(generation):
+                return cached
+
+            with _snapshot_lock:
+                cached = _snapshots.get(self.path)
+                if cached is not None and cached.is_current(generation):
+                    return cached
+
+                corpus = None
+                if (cached is not None and cached.generation[0] == generation[0]
+                        and cached.generation[1] >= self._get_stat(conn, "log_floor")):
+                    corpus = cached.corpus.updated(conn, since=cached.generation[1])
+                if corpus is None:
+                    corpus = _Corpus.load(conn)
+                snapshot = _Snapshot(generation, corpus)
+                _snapshots[self.path] = snapshot
+                return snapshot
+
+    def search_batch(self, queries, top_k=5, doc_type=None, subject=None):
+        """
+        Score several queries in one sparse matrix product.
+
+        doc_type may be None, a lowercase string or a list of lowercase strings.
+        Returns one list per query of (doc_id, content, metadata, score)
+        with score > 0, best first.
+        """
+        if not queries:
+            return []
+
+        snapshot = self._load_snapshot()
+        if not snapshot.matrix.n_docs:
+            return [[] for _ in queries]
+
+        keys = None
+        if subject or doc_type:
+            # A doc_type list selects the union of its partitions.
+            types = None
+            if doc_type:
+                types = set(doc_type) if isinstance(doc_type, list) else {doc_type}
+            keys = [
+                key for key in snapshot.matrix.partitions
+                if (not subject or key[0] == subject)
+                and (types is None or key[1] in types)
+            ]
+
+        top = snapshot.matrix.top_k_batch(
+            [tokenize(query) for query in queries], top_k, keys=keys
+        )
+
+        wanted = sorted({int(snapshot.docs[col]) for hits in top for col, _ in hits})
+        rows = {}
+        if wanted:
+            with self._read() as conn:
+                for i in range(0, len(wanted), 500):
+                    chunk = wanted[i:i + 500]
+                    for doc, doc_id, content, metadata in conn.execute(
+                        "SELECT doc, doc_id, content, metadata FROM docs "
+                        f"WHERE doc IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ):
+                        rows[doc] = (doc_id, content, metadata)
+
+        results = []
+        for hits in top:
+            query_results = []
+            for col, score in hits:
+                row = rows.get(int(snapshot.docs[col]))
+                if row is None:
+                    # Removed (or replaced) by a write after the snapshot was taken.
+                    continue
+                doc_id, content, metadata = row
+                query_results.append((doc_id, content, json.loads(metadata), score))
+            results.append(query_results)
+        return results
+
+    def search(self, query, top_k=5, doc_type=None, subject=None):
+        """Score a single query. See search_batch."""
+        return self.search_batch([query], top_k=top_k, doc_type=doc_type, subject=subject)[0]
+
+
+class _Corpus:
+    """
+    Postings and per-document columns of one index generation, kept as
+    arrays so a later generation can be derived from the rows that changed.
+
+    docs (ascending docs.doc rowids), lengths and keys ((subject, doc_type))
+    have one entry per column; term_rows, posting_docs and tfs one per
+    posting. Terms are never dropped from vocab; a term without postings
+    scores nothing.
+    """
+
+    def __init__(self, vocab, docs, lengths, keys, term_rows, posting_docs, tfs):
+        self.vocab = vocab
+        self.docs = docs
+        self.lengths = lengths
+        self.keys = keys
+        self.term_rows = term_rows
+        self.posting_docs = posting_docs
+        self.tfs = tfs
+
+    @classmethod
+    def load(cls, conn):
+        """Read every document and posting."""
+        empty = cls({}, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), [],
+                    np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64),
+                    np.empty(0, dtype=np.int32))
+        return empty._appended(conn, since=None)
+
+    def updated(self, conn, since):
+        """This corpus with the removals and additions after generation since."""
+        removed = np.array(
+            [doc for (doc,) in conn.execute("SELECT doc FROM removed WHERE gen > ?", (since,))],
+            dtype=np.int64
+        )
+        corpus = self
+        if len(removed):
+            keep = ~np.isin(self.docs, removed)
+            keep_postings = ~np.isin(self.posting_docs, removed)
+            corpus = _Corpus(
+                self.vocab, self.docs[keep], self.lengths[keep],
+                [key for key, kept in zip(self.keys, keep) if kept],
+                self.term_rows[keep_postings], self.posting_docs[keep_postings],
+                self.tfs[keep_postings],
+            )
+        return corpus._appended(conn, since=since)
+
+    def _appended(self, conn, since):
+        """
+        This corpus plus the documents written after generation since (all
+        documents if since is None). SQLite gives a new row the highest rowid
+        + 1, so added documents sort after every document still present
+        here, and their postings are exactly those with doc >= the first one.
+        """
+        if since is None:
+            doc_rows = conn.execute(
+                "SELECT doc, length, subject, doc_type FROM docs ORDER BY doc"
+            ).fetchall()
+        else:
+            doc_rows = conn.execute(
+                "SELECT doc, length, subject, doc_type FROM docs WHERE gen > ? ORDER BY doc",
+                (since,)
+            ).fetchall()
+
+        vocab = self.vocab
+        term_rows, posting_docs, tfs = [], [], []
+        if doc_rows:
+            vocab = dict(vocab)
+            for term, doc, tf in conn.execute(
+                "SELECT term, doc, tf FROM postings WHERE doc >= ?", (doc_rows[0][0],)
+            ):
+                term_rows.append(vocab.setdefault(term, len(vocab)))
+                posting_docs.append(doc)
+                tfs.append(tf)
+
+        return _Corpus(
+            vocab,
+            np.concatenate([self.docs, np.array([row[0] for row in doc_rows], dtype=np.int64)]),
+            np.concatenate([self.lengths, np.array([row[1] for row in doc_rows], dtype=np.int64)]),
+            self.keys + [(row[2], row[3] or "") for row in doc_rows],
+            np.concatenate([self.term_rows, np.array(term_rows, dtype=np.int32)]),
+            np.concatenate([self.posting_docs, np.array(posting_docs, dtype=np.int64)]),
+            np.concatenate([self.tfs, np.array(tfs, dtype=np.int32)]),
+        )
+
+    def matrix(self):
+        # One partition per (subject, doc_type) so filters pick blocks
+        # instead of scanning per-document metadata.
+        return BM25Matrix(
+            self.vocab, self.term_rows, np.searchsorted(self.docs, self.posting_docs),
+            self.tfs, self.lengths, partition_keys=self.keys
+        )
+
+
+class _Snapshot:
+    """Scoring matrix plus the column -> doc mapping it was built from."""
+
+    def __init__(self, generation, corpus):
+        self.generation = generation
+        self.corpus = corpus
+        self.matrix = corpus.matrix()
+        self.docs = corpus.docs
+
+    def is_current(self, generation):
+        """
+        True if this snapshot can serve a reader at generation (a reader
+        whose transaction started just before a newer load is served too).
+        """
+        return self.generation[0] == generation[0] and self.generation[1] >= generation[1]
+
+
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+
+def get_bm25_index() -> BM25Index:
+    """Return the index stored alongside the Chroma collection."""
+    return BM25Index(BM25_INDEX_PATH)
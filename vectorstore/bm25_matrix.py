@@ -0,0 +1,192 @@
+"""
+Vectorized BM25 scoring engine.
+
+Holds a CSR term-document matrix whose entries are the precomputed BM25
+term-frequency weights, so scoring a query is one sparse row product and
+scoring a batch of queries is one sparse matrix product. Top-k selection
+uses argpartition over the non-zero scores only. The matrix can be split
+into per-filter partitions so filtered queries only score matching blocks.
+
+Scores are identical to rank_bm25's BM25Okapi (same k1, b, epsilon and
+IDF floor).
+"""
+
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+
+class BM25Matrix:
+    """
+    BM25 weights for a fixed corpus.
+
+    vocab maps term -> row. Postings are given as parallel arrays of
+    (term row, doc column, term frequency); doc_lengths has one entry per
+    column.
+
+    If partition_keys (one hashable key per column) is given, the weight
+    matrix is split column-wise into one CSR block per key. Queries can then
+    be restricted to a set of keys and only touch those blocks, so filtered
+    search costs scale with the partition size rather than the corpus.
+    IDF and average document length are always corpus-wide.
+    """
+
+    def __init__(self, vocab, term_rows, doc_cols, tfs, doc_lengths,
+                 partition_keys=None, k1=K1, b=B, epsilon=EPSILON):
+        self.vocab = vocab
+        doc_lengths = np.asarray(doc_lengths, dtype=np.float64)
+        self.n_docs = len(doc_lengths)
+
+        tfs = np.asarray(tfs, dtype=np.float64)
+        term_rows = np.asarray(term_rows, dtype=np.int32)
+        doc_cols = np.asarray(doc_cols, dtype=np.int32)
+
+        avgdl = doc_lengths.mean() if self.n_docs else 0.0
+        if avgdl > 0:
+            norms = k1 * (1 - b + b * doc_lengths[doc_cols] / avgdl)
+        else:
+            norms = np.full(len(tfs), k1 * (1 - b))
+        weights = tfs * (k1 + 1) / (tfs + norms)
+        del norms
+
+        df = np.bincount(term_rows, minlength=len(vocab)).astype(np.float64)
+        idf = np.log(self.n_docs - df + 0.5) - np.log(df + 0.5)
+        # Like rank_bm25, the average only covers terms that occur in the corpus.
+        present = df > 0
+        self.average_idf = idf[present].mean() if present.any() else 0.0
+        idf[idf < 0] = epsilon * self.average_idf
+        self.idf = idf
+
+        # key -> (CSR weight block, global column of each block column).
+        # Blocks are built straight from the postings so the full matrix is
+        # never materialized next to its partitions.
+        self.partitions = {}
+        if partition_keys is None:
+            self.partitions[None] = (
+                sparse.csr_matrix((weights, (term_rows, doc_cols)),
+                                  shape=(len(vocab), self.n_docs)),
+                np.arange(self.n_docs)
+            )
+            return
+
+        key_list, col_part = [], np.empty(self.n_docs, dtype=np.int64)
+        key_codes = {}
+        for col, key in enumerate(partition_keys):
+            if key not in key_codes:
+                key_codes[key] = len(key_list)
+                key_list.append(key)
+            col_part[col] = key_codes[key]
+
+        col_order = np.argsort(col_part, kind="stable")
+        col_bounds = np.searchsorted(col_part[col_order], np.arange(len(key_list) + 1))
+        local_col = np.empty(self.n_docs, dtype=np.int64)
+        local_col[col_order] = np.arange(self.n_docs) - col_bounds[col_part[col_order]]
+
+        posting_part = col_part[doc_cols]
+        posting_order = np.argsort(posting_part, kind="stable")
+        posting_bounds = np.searchsorted(posting_part[posting_order], np.arange(len(key_list) + 1))
+        del posting_part
+
+        for code, key in enumerate(key_list):
+            cols = col_order[col_bounds[code]:col_bounds[code + 1]]
+            sel = posting_order[posting_bounds[code]:posting_bounds[code + 1]]
+            block = sparse.csr_matrix(
+                (weights[sel], (term_rows[sel], local_col[doc_cols[sel]])),
+                shape=(len(vocab), len(cols))
+            )
+            self.partitions[key] = (block, cols)
+
+    @property
+    def nnz(self):
+        return sum(block.nnz for block, _ in self.partitions.values())
+
+    @classmethod
+    def from_corpus(cls, tokenized_docs, **kwargs):
+        """Build from a list of token lists (column i = document i)."""
+        vocab = {}
+        term_rows, doc_cols, tfs = [], [], []
+        for col, tokens in enumerate(tokenized_docs):
+            for term, tf in Counter(tokens).items():
+                term_rows.append(vocab.setdefault(term, len(vocab)))
+                doc_cols.append(col)
+                tfs.append(tf)
+        doc_lengths = [len(tokens) for tokens in tokenized_docs]
+        return cls(vocab, term_rows, doc_cols, tfs, doc_lengths, **kwargs)
+
+    def query_matrix(self, tokenized_queries):
+        """
+        One row per query holding count(term) * idf(term).
+        Repeated tokens count once per occurrence, as in rank_bm25.
+        """
+        rows, cols, data = [], [], []
+        for row, tokens in enumerate(tokenized_queries):
+            for term, count in Counter(tokens).items():
+                term_row = self.vocab.get(term)
+                if term_row is not None:
+                    rows.append(row)
+                    cols.append(term_row)
+                    data.append(count * self.idf[term_row])
+        return sparse.csr_matrix(
+            (data, (rows, cols)),
+            shape=(len(tokenized_queries), len(self.vocab))
+        )
+
+    def _scored_blocks(self, tokenized_queries, keys=None):
+        """Yield (sparse scores, global columns) for each selected partition."""
+        queries = self.query_matrix(tokenized_queries)
+        if keys is None:
+            keys = self.partitions
+        for key in keys:
+            if key in self.partitions:
+                block, cols = self.partitions[key]
+                yield (queries @ block).tocsr(), cols
+
+    def get_scores(self, tokenized_query):
+        """Dense scores for every document, like BM25Okapi.get_scores."""
+        scores = np.zeros(self.n_docs)
+        for block_scores, cols in self._scored_blocks([tokenized_query]):
+            scores[cols] = block_scores.toarray()[0]
+        return scores
+
+    def top_k_batch(self, tokenized_queries, top_k, keys=None):
+        """
+        Best positive-scoring documents per query as lists of (column, score).
+
+        keys, if given, restricts scoring to those partitions; the union of
+        their columns is searched.
+        """
+        if top_k <= 0:
+            return [[] for _ in tokenized_queries]
+
+        n_queries = len(tokenized_queries)
+        found_cols = [[] for _ in range(n_queries)]
+        found_values = [[] for _ in range(n_queries)]
+        for scores, block_cols in self._scored_blocks(tokenized_queries, keys):
+            for row in range(n_queries):
+                start, end = scores.indptr[row], scores.indptr[row + 1]
+                if start < end:
+                    found_cols[row].append(block_cols[scores.indices[start:end]])
+                    found_values[row].append(scores.data[start:end])
+
+        results = []
+        for row in range(n_queries):
+            if not found_values[row]:
+                results.append([])
+                continue
+            cols = np.concatenate(found_cols[row])
+            values = np.concatenate(found_values[row])
+
+            keep = values > 0
+            cols, values = cols[keep], values[keep]
+
+            if len(values) > top_k:
+                part = np.argpartition(-values, top_k - 1)[:top_k]
+                cols, values = cols[part], values[part]
+            order = np.argsort(-values, kind="stable")
+            results.append([(int(cols[i]), float(values[i])) for i in order])
+        return results
@@ -1,18 +1,19 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
-import pdfplumber
 import docx
 from pptx import Presentation
-from document_processor.ocr_loader import load_image, load_scanned_pdf
+from document_processor.ocr_loader import load_image
+from document_processor.hybrid_loader import iter_pdf_hybrid
+from document_processor.pdf_engines import open_pdf_engine
+from vectorstore.manifest import chunk_id, hash_file
+from vectorstore.text_splitter import split_text
 import os
 
-def extract_text_from_pdf(file_path: str) -> list[dict]:
+def extract_text_from_pdf(file_path: str, engine: str = None) -> list[dict]:
     """Extract digital text page by page from PDF."""
     pages = []
     try:
-        with pdfplumber.open(file_path) as pdf:
-            for i, page in enumerate(pdf.pages):
-                text = page.extract_text()
+        with open_pdf_engine(file_path, engine) as pdf:
+            for i, text in pdf.iter_pages():
                 if text and text.strip():
                     pages.append({
                         "text": text,
@@ -53,24 +54,22 @@ def detect_doc_type(file_name: str) -> str:
         return "lecture_slides"
     return "notes"
 
-def chunk_document(file_path: str, subject: str = "general") -> list[Document]:
+def iter_document_chunks(file_path: str, subject: str = "general", file_hash: str = None):
     """
-    Main entry point. Loads file, handles OCR for images/scanned PDFs, 
-    and splits into chunks for ChromaDB.
+    Streaming form of chunk_document: yields chunks page by page as each
+    page is loaded (scanned PDF pages arrive when their OCR finishes), so
+    a caller can store them in batches without holding the whole file.
+    All chunks of a page are yielded together.
     """
     file_name = os.path.basename(file_path)
+    file_hash = file_hash or hash_file(file_path)
     extension = file_name.split(".")[-1].lower()
     doc_type = detect_doc_type(file_name)
 
     # --- STEP 1: Load Content ---
-    pages = []
-    
     if extension == "pdf":
-        # First try standard extraction, if empty, use OCR
-        pages = extract_text_from_pdf(file_path)
-        if not pages:
-            print(f"🔍 PDF {file_name} looks scanned. Switching to OCR...")
-            pages = load_scanned_pdf(file_path)
+        # One pass: text layer where present, OCR for scanned pages
+        pages = iter_pdf_hybrid(file_path)
             
     elif extension in ["png", "jpg", "jpeg"]:
         print(f"📸 Processing Image with OCR: {file_name}")
@@ -84,30 +83,21 @@ def chunk_document(file_path: str, subject: str = "general") -> list[Document]:
         
     else:
         print(f"❌ Unsupported file type: {extension}")
-        return []
-
-    if not pages:
-        print(f"⚠️ No text could be extracted from {file_name}")
-        return []
+        return
 
     # --- STEP 2: Splitting Logic ---
-    # We use a slightly larger chunk for technical OS concepts
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=600,
-        chunk_overlap=120,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-
-    all_chunks = []
+    # Chunks are sized in the embedding model's word pieces (see text_splitter.py)
+    page_count = 0
+    chunk_count = 0
 
     for page in pages:
-        chunks = splitter.split_text(page["text"])
+        page_count += 1
+        chunks = split_text(page["text"])
 
         for chunk in chunks:
-            if len(chunk.strip()) < 40:
-                continue
-
-            doc = Document(
+            chunk_count += 1
+            yield Document(
+                id=chunk_id(file_hash, page.get("page_number", 1), chunk),
                 page_content=chunk,
                 metadata={
                     "source_file": file_name,
@@ -117,7 +107,19 @@ def chunk_document(file_path: str, subject: str = "general") -> list[Document]:
                     "file_path": file_path
                 }
             )
-            all_chunks.append(doc)
 
-    print(f"✅ {file_name} → {len(all_chunks)} chunks (Type: {doc_type})")
-    return all_chunks
\ No newline at end of file
+    if not page_count:
+        print(f"⚠️ No text could be extracted from {file_name}")
+        return
+
+    print(f"✅ {file_name} → {chunk_count} chunks (Type: {doc_type})")
+
+def chunk_document(file_path: str, subject: str = "general", file_hash: str = None) -> list[Document]:
+    """
+    Main entry point. Loads file, handles OCR for images/scanned PDFs, 
+    and splits into chunks for ChromaDB.
+    Each chunk gets a deterministic id from the file content, page and text;
+    pass file_hash if the caller has already hashed the file.
+    See iter_document_chunks to stream chunks instead.
+    """
+    return list(iter_document_chunks(file_path, subject, file_hash))
@@ -0,0 +1,318 @@
+"""
+Persistent embedding cache.
+
+Vectors are stored in a memory-mapped float32 file (one row per slot) and a
+small SQLite index maps the hash of (model name, text) to a slot. The cache
+lives outside chroma_db, so it survives `clear_vector_store` and a rebuild
+or a change of chunker settings only encodes texts that were never seen.
+
+The cache holds at most `max_entries` vectors; when it is full the least
+recently used slots are reused. Inserts run inside an IMMEDIATE
+transaction, so several processes can share one cache; lookups only read.
+Their hits are remembered in memory and stamped on the next insert, so the
+use clock only moves when something is written anyway.
+
+Evicted slots are freed in one transaction and handed out in a later one,
+and every free bumps a counter. A lookup copies its vectors and then checks
+the counter: if nothing was freed since its snapshot, no slot it read can
+have been reused under it.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMBEDDING_CACHE_DIR = os.path.join(_script_dir, "vectorstore", "embedding_cache")
+# ~300 MB of float32 MiniLM vectors; override with EMBEDDING_CACHE_MAX_ENTRIES.
+EMBEDDING_CACHE_MAX_ENTRIES = 200_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    slot INTEGER UNIQUE NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS free (
+    slot INTEGER PRIMARY KEY
+);
+"""
+
+# Slots are added to the vector file in blocks of this many rows.
+_GROW_ROWS = 4096
+
+
+def text_key(model_name, text):
+    """Cache key for one text under one model."""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+class EmbeddingCache:
+    """Size-bounded, disk-backed map from text key to embedding vector."""
+
+    def __init__(self, path, max_entries=EMBEDDING_CACHE_MAX_ENTRIES):
+        """path is the file prefix; <path>.sqlite3 and <path>.f32 are created."""
+        self.index_path = path + ".sqlite3"
+        self.vectors_path = path + ".f32"
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._vectors = None
+        # Keys served by get_many since the last put_many.
+        self._touched = set()
+
+    @contextmanager
+    def _transaction(self):
+        """IMMEDIATE transaction: one writer at a time across processes."""
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        """Read-only connection holding one read transaction."""
+        conn = sqlite3.connect(Path(os.path.abspath(self.index_path)).as_uri() + "?mode=ro",
+                               uri=True, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_meta(conn, key, default=0):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def _tick(self, conn):
+        """Advance the shared use clock and return the new value."""
+        clock = self._get_meta(conn, "clock") + 1
+        self._set_meta(conn, "clock", clock)
+        return clock
+
+    @staticmethod
+    def _slots(conn, keys):
+        """{key: slot} for the given keys that are cached."""
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for start in range(0, len(unique), 500):
+            part = unique[start:start + 500]
+            found.update(conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})",
+                part
+            ).fetchall())
+        return found
+
+    def _map(self, dim, rows):
+        """Memory-map the vector file, growing it to at least `rows` slots."""
+        row_bytes = dim * 4
+        size = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        if size < rows * row_bytes:
+            rows = -(-rows // _GROW_ROWS) * _GROW_ROWS
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+            self._vectors = None
+        else:
+            rows = size // row_bytes
+        if self._vectors is None or self._vectors.shape != (rows, dim):
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(rows, dim))
+        return self._vectors
+
+    def get_many(self, keys, attempts=3):
+        """Return {key: vector} for the keys that are cached."""
+        if not keys or not os.path.exists(self.index_path):
+            return {}
+        for _ in range(attempts):
+            try:
+                with self._read() as conn:
+                    dim = self._get_meta(conn, "dim")
+                    if not dim:
+                        return {}
+                    found = self._slots(conn, keys)
+                    if not found:
+                        return {}
+                    freed = self._get_meta(conn, "freed")
+                    next_slot = self._get_meta(conn, "next_slot")
+            except sqlite3.OperationalError:
+                # Older cache file without the current tables: nothing to serve yet.
+                return {}
+            with self._lock:
+                vectors = self._map(dim, next_slot)
+            copied = {key: np.array(vectors[slot]) for key, slot in found.items()}
+            with self._read() as conn:
+                if self._get_meta(conn, "freed") == freed:
+                    with self._lock:
+                        self._touched.update(copied)
+                    return copied
+        # Slots keep being recycled under us; encode these texts instead.
+        return {}
+
+    def _make_room(self, conn, keys, dim):
+        """
+        Stamp the pending and given keys as used, and free least recently
+        used slots until the new keys fit. Freed slots are reused by a later
+        transaction only.
+        """
+        stored_dim = self._get_meta(conn, "dim")
+        if stored_dim != dim:
+            if stored_dim:
+                # The model behind this name changed shape; start over.
+                conn.execute("DELETE FROM entries")
+                conn.execute("DELETE FROM free")
+                self._set_meta(conn, "freed", self._get_meta(conn, "freed") + 1)
+            self._set_meta(conn, "next_slot", 0)
+            self._set_meta(conn, "dim", dim)
+
+        existing = self._slots(conn, keys)
+        clock = self._tick(conn)
+        with self._lock:
+            touched, self._touched = self._touched, set()
+        conn.executemany(
+            "UPDATE entries SET last_used = ? WHERE key = ?",
+            [(clock, key) for key in touched.union(existing)]
+        )
+
+        new = len(set(keys) - set(existing))
+        available = self.max_entries - self._get_meta(conn, "next_slot") + \
+            conn.execute("SELECT COUNT(*) FROM free").fetchone()[0]
+        if new > available:
+            victims = conn.execute(
+                "SELECT key, slot FROM entries WHERE last_used < ? ORDER BY last_used LIMIT ?",
+                (clock, new - available)
+            ).fetchall()
+            conn.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+            conn.executemany("INSERT INTO free (slot) VALUES (?)", [(slot,) for _, slot in victims])
+            self._set_meta(conn, "freed", self._get_meta(conn, "freed") + 1)
+
+    def put_many(self, items):
+        """Store {key: vector}, evicting least recently used slots if full."""
+        if not items or self.max_entries <= 0:
+            return
+        items = list(items.items())[:self.max_entries]
+        dim = len(items[0][1])
+        keys = [key for key, _ in items]
+
+        with self._transaction() as conn:
+            self._make_room(conn, keys, dim)
+
+        with self._transaction() as conn:
+            if self._get_meta(conn, "dim") != dim:
+                return  # another process switched the model in between
+            existing = self._slots(conn, keys)
+            clock = self._get_meta(conn, "clock")
+            new_keys = [key for key in dict.fromkeys(keys) if key not in existing]
+
+            next_slot = self._get_meta(conn, "next_slot")
+            fresh = min(len(new_keys), self.max_entries - next_slot)
+            slots = list(range(next_slot, next_slot + fresh))
+            self._set_meta(conn, "next_slot", next_slot + fresh)
+            reused = [slot for (slot,) in conn.execute(
+                "SELECT slot FROM free LIMIT ?", (len(new_keys) - fresh,)
+            )]
+            conn.executemany("DELETE FROM free WHERE slot = ?", [(slot,) for slot in reused])
+            slots.extend(reused)
+            # Another process may have taken freed slots first; skip the rest.
+            new_keys = new_keys[:len(slots)]
+
+            assigned = dict(existing)
+            assigned.update(zip(new_keys, slots))
+            conn.executemany(
+                "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, clock) for key, slot in zip(new_keys, slots)]
+            )
+
+            with self._lock:
+                vectors = self._map(dim, self._get_meta(conn, "next_slot"))
+                for key, vector in items:
+                    if key in assigned:
+                        vectors[assigned[key]] = vector
+                vectors.flush()
+
+    def __len__(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        with self._read() as conn:
+            return conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._touched.clear()
+            for path in (self.index_path, self.index_path + "-wal",
+                         self.index_path + "-shm", self.vectors_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves embed_documents from an EmbeddingCache
+    and only encodes texts it has not seen. Queries pass straight through;
+    to embed several queries in one batch without caching them, call
+    embed_documents on the wrapped model (see store.encode_queries).
+    """
+
+    def __init__(self, embeddings, model_name, cache):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        keys = [text_key(self.model_name, text) for text in texts]
+        found = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += len(missing)
+
+        if missing:
+            computed = self.embeddings.embed_documents(list(missing.values()))
+            new = dict(zip(missing.keys(), computed))
+            self.cache.put_many({key: np.asarray(v, dtype=np.float32) for key, v in new.items()})
+            found.update(new)
+
+        return [np.asarray(found[key], dtype=np.float32).tolist() for key in keys]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def get_embedding_cache(model_name):
+    """Cache file for one model under EMBEDDING_CACHE_DIR."""
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+    max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", EMBEDDING_CACHE_MAX_ENTRIES))
+    return EmbeddingCache(os.path.join(EMBEDDING_CACHE_DIR, safe_name), max_entries)
@@ -0,0 +1,572 @@
+"""
+Memory-mapped flat vector store.
+
+An alternative to the Chroma persistent client for per-course corpora of up
+to a few hundred thousand chunks. Search is exact: one scan over a float16
+embedding matrix mapped from disk, so several processes serving the same
+index share it through the OS page cache instead of each holding a copy.
+
+Layout of the store directory:
+    vectors.f16     (capacity, dim) float16 embeddings
+    vectors.i8      int8 codes of the same vectors, with per-row scales.f32
+                    (only in stores written with quantization="int8")
+    norms.f32       squared L2 norm of each stored vector
+    live.u8         1 for rows in use, 0 for deleted / unused rows
+    <column>.i32    dictionary codes of the filterable metadata columns
+    rows.sqlite3    id, text and full metadata per row, the code
+                    dictionaries and counters
+
+Distances are squared L2, like Chroma's default space, and the same
+relevance function is used, so score thresholds mean the same thing with
+either backend. `where` filters use Chroma's syntax; filters on the columnar
+keys are evaluated on the code arrays, anything else through SQLite.
+
+With quantization="int8" the first pass scans the int8 codes instead of the
+float16 matrix (half the bytes) and the best candidates are re-scored from
+float16. The codes cost another (dim + 4) bytes per row on disk, so they are
+only written by an int8 store; the first int8 write to a store without them
+quantizes the existing rows. Until then an int8 handle scans float16.
+
+Searches only take the instance lock to pick up the current snapshot (the
+mapped arrays and code dictionaries of one generation); the scan itself runs
+unlocked, so concurrent queries in one process run in parallel. Writers
+map their own arrays and only append rows past the published ones: an
+upserted id gets a new row and its old row is marked deleted in live.u8,
+so a reader never sees a vector next to another version's norm or scale.
+Deleted rows keep their slots.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import torch
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+# Metadata keys stored as columns, i.e. the keys retrieve_with_scores filters on.
+FILTER_COLUMNS = ("subject", "doc_type", "source_file")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    row INTEGER PRIMARY KEY,
+    id TEXT UNIQUE NOT NULL,
+    document TEXT,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS codes (
+    column_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    PRIMARY KEY (column_name, value)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Rows are added to the mapped files in blocks of this many.
+_GROW_ROWS = 8192
+# Rows scored per matrix product during a full scan.
+_SCAN_BLOCK = 65536
+# Minimum shortlist re-scored exactly after the float16 pass.
+_RESCORE_POOL = 64
+
+_write_lock = threading.Lock()
+
+
+class _Snapshot:
+    """Mapped arrays and code dictionaries of one store generation."""
+
+    def __init__(self, generation=None, dim=0, n_rows=0, arrays=None, codes=None, quantized=False):
+        self.generation = generation
+        self.dim = dim
+        self.n_rows = n_rows
+        # True if arrays holds int8 codes for every row.
+        self.quantized = quantized
+        self.arrays = arrays or {}
+        self.codes = codes or {}
+
+
+def _quantize(vectors):
+    """Symmetric per-vector int8 quantization: vectors ~= scales[:, None] * codes."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return scales.astype(np.float32), codes
+
+
+class FlatVectorStore(VectorStore):
+    """Exact search over a memory-mapped float16 matrix with a columnar metadata sidecar."""
+
+    def __init__(self, path, embedding_function, filter_columns=FILTER_COLUMNS, quantization=None):
+        """
+        quantization="int8" keeps int8 codes next to the float16 vectors,
+        runs the first search pass on them (half the bytes of float16) and
+        re-scores the shortlist from the float16 vectors.
+        """
+        if quantization not in (None, "none", "int8"):
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        self.path = path
+        self.quantization = quantization if quantization == "int8" else None
+        self.rescore_factor = 8 if self.quantization else 4
+        self._embedding_function = embedding_function
+        self.filter_columns = tuple(filter_columns)
+        os.makedirs(path, exist_ok=True)
+        self._db_path = os.path.join(path, "rows.sqlite3")
+        # Guards swapping self._snapshot; searches run outside it.
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot()
+        with _write_lock:
+            conn = sqlite3.connect(self._db_path, timeout=30)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            finally:
+                conn.close()
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    # ---- storage -----------------------------------------------------------
+
+    @contextmanager
+    def _connect(self, write=False):
+        """Open a connection; writes run in an IMMEDIATE transaction."""
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        try:
+            if not write:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _get_meta(conn, key, default=0):
+        row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @staticmethod
+    def _set_meta(conn, key, value):
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def _array_specs(self, dim, quantized):
+        specs = {
+            "vectors": ("vectors.f16", np.float16, (dim,)),
+            "norms": ("norms.f32", np.float32, ()),
+            "live": ("live.u8", np.uint8, ()),
+        }
+        if quantized:
+            specs["codes"] = ("vectors.i8", np.int8, (dim,))
+            specs["scales"] = ("scales.f32", np.float32, ())
+        for column in self.filter_columns:
+            specs[column] = (f"{column}.i32", np.int32, ())
+        return specs
+
+    def _map_arrays(self, dim, capacity, quantized=False):
+        """(Re)map every column file at `capacity` rows, growing files as needed."""
+        arrays = {}
+        for name, (file_name, dtype, tail) in self._array_specs(dim, quantized).items():
+            file_path = os.path.join(self.path, file_name)
+            size = capacity * int(np.prod(tail, dtype=np.int64)) * np.dtype(dtype).itemsize
+            if not os.path.exists(file_path) or os.path.getsize(file_path) < size:
+                with open(file_path, "ab") as f:
+                    f.truncate(size)
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode="r+", shape=(capacity,) + tail)
+        return arrays
+
+    def _load_codes(self, conn):
+        codes = {column: {} for column in self.filter_columns}
+        for column, value, code in conn.execute("SELECT column_name, value, code FROM codes"):
+            codes.setdefault(column, {})[value] = code
+        return codes
+
+    def _refresh(self, conn):
+        """
+        The snapshot of the current generation, picking up writes made by
+        this or any other process since the last call.
+        """
+        generation = self._get_meta(conn, "generation")
+        with self._lock:
+            if generation != self._snapshot.generation:
+                dim = self._get_meta(conn, "dim")
+                capacity = self._get_meta(conn, "capacity")
+                quantized = bool(self.quantization and self._get_meta(conn, "quantized"))
+                self._snapshot = _Snapshot(
+                    generation, dim, self._get_meta(conn, "n_rows"),
+                    self._map_arrays(dim, capacity, quantized) if dim and capacity else {},
+                    self._load_codes(conn), quantized,
+                )
+            return self._snapshot
+
+    @staticmethod
+    def _code(conn, codes, column, value):
+        """Dictionary code for a column value, allocating one if new. 0 means missing."""
+        if value is None:
+            return 0
+        value = str(value)
+        codes = codes.setdefault(column, {})
+        if value not in codes:
+            code = conn.execute(
+                "SELECT COALESCE(MAX(code), 0) + 1 FROM codes WHERE column_name = ?", (column,)
+            ).fetchone()[0]
+            conn.execute("INSERT INTO codes VALUES (?, ?, ?)", (column, value, code))
+            codes[value] = code
+        return codes[value]
+
+    def upsert_vectors(self, ids, embeddings, documents, metadatas):
+        """Write precomputed embeddings; existing ids move to a new row and their old one is deleted."""
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        metadatas = [m or {} for m in metadatas]
+
+        with _write_lock, self._connect(write=True) as conn:
+            # Loaded inside the write transaction, so codes are never allocated twice.
+            codes = self._load_codes(conn)
+            dim = self._get_meta(conn, "dim")
+            if not dim:
+                dim = vectors.shape[1]
+                self._set_meta(conn, "dim", dim)
+            elif dim != vectors.shape[1]:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store ({dim})")
+
+            existing = {}
+            for start in range(0, len(ids), 500):
+                part = list(ids[start:start + 500])
+                existing.update(conn.execute(
+                    f"SELECT id, row FROM rows WHERE id IN ({','.join('?' * len(part))})", part
+                ).fetchall())
+
+            n_rows = self._get_meta(conn, "n_rows")
+            assigned = {}
+            for doc_id in ids:
+                if doc_id not in assigned:
+                    assigned[doc_id] = n_rows
+                    n_rows += 1
+            rows = np.asarray([assigned[doc_id] for doc_id in ids])
+            replaced = list(existing.values())
+
+            capacity = self._get_meta(conn, "capacity")
+            if n_rows > capacity:
+                capacity = -(-n_rows // _GROW_ROWS) * _GROW_ROWS
+                self._set_meta(conn, "capacity", capacity)
+            quantized = self.quantization == "int8"
+            arrays = self._map_arrays(dim, capacity, quantized)
+            if quantized and not self._get_meta(conn, "quantized"):
+                # Codes of rows written without int8, or before it was enabled.
+                old_rows = self._get_meta(conn, "n_rows")
+                for start in range(0, old_rows, _SCAN_BLOCK):
+                    part = slice(start, min(start + _SCAN_BLOCK, old_rows))
+                    arrays["scales"][part], arrays["codes"][part] = \
+                        _quantize(arrays["vectors"][part].astype(np.float32))
+
+            stored = vectors.astype(np.float16)
+            arrays["vectors"][rows] = stored
+            # Norms of the stored (rounded) vectors keep distances consistent.
+            arrays["norms"][rows] = np.einsum("ij,ij->i", stored.astype(np.float32), stored.astype(np.float32))
+            for column in self.filter_columns:
+                arrays[column][rows] = [self._code(conn, codes, column, m.get(column)) for m in metadatas]
+            if quantized:
+                arrays["scales"][rows], arrays["codes"][rows] = _quantize(vectors)
+            arrays["live"][rows] = 1
+            arrays["live"][replaced] = 0
+            for array in arrays.values():
+                array.flush()
+
+            conn.executemany(
+                "INSERT INTO rows (row, id, document, metadata) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET row = excluded.row, document = excluded.document, "
+                "metadata = excluded.metadata",
+                [(int(row), doc_id, text, json.dumps(meta))
+                 for row, doc_id, text, meta in zip(rows, ids, documents, metadatas)]
+            )
+            self._set_meta(conn, "n_rows", n_rows)
+            # A float16-only write leaves the codes of these rows behind.
+            self._set_meta(conn, "quantized", int(quantized))
+            self._set_meta(conn, "generation", self._get_meta(conn, "generation") + 1)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        embeddings = self._embedding_function.embed_documents(texts)
+        self.upsert_vectors(ids, embeddings, texts, metadatas)
+        return ids
+
+    def delete(self, ids=None, **kwargs):
+        """Remove rows by id. Their slots stay allocated but are never matched."""
+        if not ids:
+            return
+        with _write_lock, self._connect(write=True) as conn:
+            rows = []
+            for start in range(0, len(ids), 500):
+                part = list(ids[start:start + 500])
+                rows += [r for (r,) in conn.execute(
+                    f"SELECT row FROM rows WHERE id IN ({','.join('?' * len(part))})", part
+                )]
+                conn.execute(f"DELETE FROM rows WHERE id IN ({','.join('?' * len(part))})", part)
+            dim, capacity = self._get_meta(conn, "dim"), self._get_meta(conn, "capacity")
+            if rows and dim and capacity:
+                live = self._map_arrays(dim, capacity)["live"]
+                live[rows] = 0
+                live.flush()
+            self._set_meta(conn, "generation", self._get_meta(conn, "generation") + 1)
+
+    # ---- filters -----------------------------------------------------------
+
+    @staticmethod
+    def _leaves(where):
+        """Split a Chroma where clause into ("and"/"or", [sub-clauses]) or a leaf."""
+        if len(where) == 1:
+            key, value = next(iter(where.items()))
+            if key in ("$and", "$or"):
+                return key[1:], value
+            return None, (key, value)
+        return "and", [{key: value} for key, value in where.items()]
+
+    @staticmethod
+    def _condition(value):
+        """Normalize a leaf condition to (operator, operand)."""
+        if isinstance(value, dict):
+            return next(iter(value.items()))
+        return "$eq", value
+
+    def _mask(self, conn, snapshot, where, n):
+        """Boolean row mask for a where clause."""
+        combine, parts = self._leaves(where)
+        if combine is not None:
+            masks = [self._mask(conn, snapshot, part, n) for part in parts]
+            return np.logical_and.reduce(masks) if combine == "and" else np.logical_or.reduce(masks)
+
+        key, value = parts
+        op, operand = self._condition(value)
+        if key in self.filter_columns and op in ("$eq", "$ne", "$in", "$nin"):
+            codes = snapshot.codes.get(key, {})
+            values = operand if op in ("$in", "$nin") else [operand]
+            wanted = [codes[str(v)] for v in values if str(v) in codes]
+            mask = np.isin(snapshot.arrays[key][:n], wanted)
+            return ~mask if op in ("$ne", "$nin") else mask
+
+        # Other keys are matched against the JSON metadata in SQLite.
+        sql, params = self._where_sql(where)
+        mask = np.zeros(n, dtype=bool)
+        rows = [r for (r,) in conn.execute(f"SELECT row FROM rows WHERE {sql}", params)]
+        mask[[r for r in rows if r < n]] = True
+        return mask
+
+    _SQL_OPS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+    def _where_sql(self, where):
+        """Translate a Chroma where clause into an SQL condition on the metadata JSON."""
+        combine, parts = self._leaves(where)
+        if combine is not None:
+            clauses = [self._where_sql(part) for part in parts]
+            sql = f" {combine.upper()} ".join(f"({c})" for c, _ in clauses)
+            return sql, [p for _, params in clauses for p in params]
+
+        key, value = parts
+        op, operand = self._condition(value)
+        field = f"json_extract(metadata, '$.\"{key}\"')"
+        if op in ("$in", "$nin"):
+            negate = "NOT " if op == "$nin" else ""
+            return f"{field} {negate}IN ({','.join('?' * len(operand))})", list(operand)
+        if op not in self._SQL_OPS:
+            raise ValueError(f"Unsupported where operator: {op}")
+        return f"{field} {self._SQL_OPS[op]} ?", [operand]
+
+    # ---- reads -------------------------------------------------------------
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=("documents", "metadatas"), **kwargs):
+        """Chroma-compatible get: returns {"ids", "documents", "metadatas", "embeddings"}."""
+        include = list(include)
+        clauses, params = [], []
+        if ids is not None:
+            ids = [ids] if isinstance(ids, str) else list(ids)
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params += ids
+        if where:
+            sql, where_params = self._where_sql(where)
+            clauses.append(sql)
+            params += where_params
+        query = "SELECT row, id, document, metadata FROM rows"
+        if clauses:
+            query += " WHERE " + " AND ".join(f"({c})" for c in clauses)
+        query += " ORDER BY row"
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset or 0]
+
+        with self._connect() as conn:
+            snapshot = self._refresh(conn)
+            found = conn.execute(query, params).fetchall()
+        embeddings = None
+        if "embeddings" in include:
+            rows = [r for r, _, _, _ in found if r < snapshot.n_rows]
+            embeddings = snapshot.arrays["vectors"][rows].astype(np.float32) if rows else np.empty((0, snapshot.dim))
+
+        return {
+            "ids": [doc_id for _, doc_id, _, _ in found],
+            "documents": [text for _, _, text, _ in found] if "documents" in include else None,
+            "metadatas": [json.loads(meta) for _, _, _, meta in found] if "metadatas" in include else None,
+            "embeddings": embeddings,
+            "included": include,
+        }
+
+    def count(self):
+        """Number of stored chunks, like chromadb's Collection.count()."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    @staticmethod
+    def _dot(block, query):
+        """float16 block @ query, computed by torch without copying the block."""
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return (torch.from_numpy(block) @ query).float().numpy()
+
+    @staticmethod
+    def _int8_dot(block, query_codes):
+        """int8 block @ int8 query with int32 accumulation."""
+        # torch._int_mm is private: missing from older builds, and some
+        # CPU / shape combinations have no kernel for it.
+        if hasattr(torch, "_int_mm"):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                try:
+                    # _int_mm wants a second operand with at least 8 columns.
+                    query = torch.from_numpy(query_codes).repeat(8, 1).T.contiguous()
+                    return torch._int_mm(torch.from_numpy(block), query)[:, 0].numpy()
+                except RuntimeError:
+                    pass
+        return np.einsum("ij,j->i", block, query_codes, dtype=np.int32, casting="unsafe")
+
+    def _first_pass(self, snapshot, rows, n, query):
+        """
+        Approximate query dot products for `rows` (all n rows if None),
+        scanning either the float16 matrix or the int8 codes.
+        """
+        def blocks():
+            if rows is not None:
+                yield rows
+            else:
+                for start in range(0, n, _SCAN_BLOCK):
+                    yield slice(start, min(start + _SCAN_BLOCK, n))
+
+        if snapshot.quantized:
+            codes, scales = snapshot.arrays["codes"], snapshot.arrays["scales"]
+            query_scale, query_codes = _quantize(query[None, :])
+            query_codes = query_codes[0]
+            return np.concatenate([
+                self._int8_dot(np.ascontiguousarray(codes[part]), query_codes)
+                * scales[part] * query_scale[0]
+                for part in blocks()
+            ])
+
+        vectors = snapshot.arrays["vectors"]
+        query_half = torch.from_numpy(query.astype(np.float16))
+        return np.concatenate([
+            self._dot(np.ascontiguousarray(vectors[part]), query_half) for part in blocks()
+        ])
+
+    def _read_vectors(self, snapshot, rows):
+        """
+        Full-precision vectors for a few rows. With int8 search they are read
+        from the file rather than the map, so the float16 matrix never
+        becomes resident in the serving process.
+        """
+        if not snapshot.quantized:
+            return snapshot.arrays["vectors"][rows].astype(np.float32)
+        row_bytes = snapshot.dim * 2
+        out = np.empty((len(rows), snapshot.dim), dtype=np.float32)
+        with open(os.path.join(self.path, "vectors.f16"), "rb") as f:
+            for i, row in enumerate(rows):
+                f.seek(int(row) * row_bytes)
+                out[i] = np.frombuffer(f.read(row_bytes), dtype=np.float16)
+        return out
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, filter=None, **kwargs):
+        """Top k (Document, squared L2 distance) pairs, nearest first."""
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._connect() as conn:
+            snapshot = self._refresh(conn)
+            arrays, n = snapshot.arrays, snapshot.n_rows
+            if not n or k <= 0:
+                return []
+
+            candidates = arrays["live"][:n].astype(bool)
+            if filter:
+                candidates &= self._mask(conn, snapshot, filter, n)
+            rows = np.flatnonzero(candidates)
+            if not len(rows):
+                return []
+
+            if filter:
+                dots = self._first_pass(snapshot, rows, n, query)
+            else:
+                dots = self._first_pass(snapshot, None, n, query)[rows]
+
+            # Shortlist on the approximate products, then re-score it exactly.
+            pool = min(len(rows), max(self.rescore_factor * k, _RESCORE_POOL))
+            approx = arrays["norms"][rows] - 2 * dots
+            if len(rows) > pool:
+                shortlist = np.sort(rows[np.argpartition(approx, pool - 1)[:pool]])
+            else:
+                shortlist = rows
+            exact = self._read_vectors(snapshot, shortlist) @ query
+            distances = arrays["norms"][shortlist] + float(query @ query) - 2 * exact
+            # A few spares, in case a writer deletes some of them meanwhile.
+            top = np.argsort(distances, kind="stable")[:k + 8]
+
+            hit_rows = [int(shortlist[i]) for i in top]
+            payload = dict((r, (doc_id, text, meta)) for r, doc_id, text, meta in conn.execute(
+                f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(hit_rows))})",
+                hit_rows
+            ))
+
+        results = []
+        for i, row in zip(top, hit_rows):
+            if row not in payload:
+                continue
+            doc_id, text, meta = payload[row]
+            results.append((Document(id=doc_id, page_content=text, metadata=json.loads(meta)),
+                            max(float(distances[i]), 0.0)))
+        return results[:k]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        embedding = self._embedding_function.embed_query(query)
+        return self.similarity_search_by_vector_with_relevance_scores(embedding, k=k, filter=filter)
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_relevance_scores(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Same mapping Chroma uses for its default l2 space.
+        return self._euclidean_relevance_score_fn
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=None, **kwargs):
+        store = cls(path, embedding)
+        store.add_texts(texts, metadatas=metadatas, ids=ids)
+        return store
@@ -0,0 +1,91 @@
+"""
+Rank fusion for hybrid retrieval.
+
+Each search leg returns (doc, score) pairs, best first, on its own scale:
+Chroma relevance in [0, 1], BM25 unbounded. The fusion methods here turn
+those lists into one ranking without comparing raw scores directly.
+
+    rrf     reciprocal-rank fusion: sum of weight / (RRF_K + rank) per leg
+    minmax  per-leg min-max normalised scores, summed with the leg weights
+
+Docs are identified by chunk id, so the same chunk found by both legs is
+counted once, with contributions from each.
+"""
+
+RRF_K = 60
+FUSION_METHODS = ("rrf", "minmax")
+DEFAULT_FUSION = "rrf"
+
+
+def doc_key(doc):
+    """Chunk id of a retrieved Document (first 100 characters if it has none)."""
+    return doc.id or doc.metadata.get('id') or doc.page_content[:100]
+
+
+def _collect(legs):
+    """{key: doc} (first copy seen) and each leg's ranked, de-duplicated keys."""
+    docs = {}
+    ranked = {}
+    for name, results in legs.items():
+        keys = []
+        seen = set()
+        for doc, score in results:
+            key = doc_key(doc)
+            if key in seen:
+                continue
+            seen.add(key)
+            docs.setdefault(key, doc)
+            keys.append((key, score))
+        ranked[name] = keys
+    return docs, ranked
+
+
+def reciprocal_rank_fusion(legs, weights=None, rrf_k=RRF_K):
+    """{key: fused score} from each leg's ranks."""
+    _, ranked = _collect(legs)
+    fused = {}
+    for name, keys in ranked.items():
+        weight = (weights or {}).get(name, 1.0)
+        for rank, (key, _) in enumerate(keys, start=1):
+            fused[key] = fused.get(key, 0.0) + weight / (rrf_k + rank)
+    return fused
+
+
+def min_max_fusion(legs, weights=None):
+    """{key: fused score} from each leg's scores rescaled to [0, 1]."""
+    _, ranked = _collect(legs)
+    fused = {}
+    for name, keys in ranked.items():
+        if not keys:
+            continue
+        weight = (weights or {}).get(name, 1.0)
+        scores = [score for _, score in keys]
+        low, high = min(scores), max(scores)
+        for key, score in keys:
+            normalized = (score - low) / (high - low) if high > low else 1.0
+            fused[key] = fused.get(key, 0.0) + weight * normalized
+    return fused
+
+
+def fuse(legs, top_k, method=DEFAULT_FUSION, weights=None):
+    """
+    Fuse ranked legs ({leg name: [(doc, score), ...]}) into the top_k
+    (doc, fused score, source) triples, best first. source names the legs
+    that found the doc, e.g. "vector", "bm25" or "vector+bm25".
+    Ties keep the order in which docs were first seen.
+    """
+    if method == "rrf":
+        fused = reciprocal_rank_fusion(legs, weights)
+    elif method == "minmax":
+        fused = min_max_fusion(legs, weights)
+    else:
+        raise ValueError(f"Unknown fusion method {method!r}; expected one of {FUSION_METHODS}")
+
+    docs, ranked = _collect(legs)
+    sources = {}
+    for name, keys in ranked.items():
+        for key, _ in keys:
+            sources.setdefault(key, []).append(name)
+
+    order = sorted(fused, key=fused.get, reverse=True)[:top_k]
+    return [(docs[key], fused[key], "+".join(sources[key])) for key in order]
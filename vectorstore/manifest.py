@@ -0,0 +1,251 @@
+"""
+Content-addressed chunk IDs and the per-file ingestion manifest.
+
+Chunk IDs are derived from the file's content hash, the page number and the
+chunk text, so re-ingesting the same file produces the same IDs and writes
+become upserts instead of duplicates.
+
+The manifest records, for every ingested file, the content hash, the
+subject and doc_type it was stored under and the chunk IDs stored for each
+page. Files whose hash and classification have not changed are skipped
+before extraction; for changed files only pages whose chunks differ are
+embedded again and the chunks of vanished or changed pages are deleted.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+_script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MANIFEST_PATH = os.path.join(_script_dir, "vectorstore", "ingest_manifest.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    subject TEXT,
+    doc_type TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pages (
+    path TEXT NOT NULL,
+    page TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    ids TEXT NOT NULL,
+    PRIMARY KEY (path, page)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk TEXT NOT NULL,
+    path TEXT NOT NULL,
+    PRIMARY KEY (chunk, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunks_path ON chunks (path);
+"""
+
+# Manifest files whose schema this process has created.
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def hash_file(file_path: str) -> str:
+    """SHA-256 of the file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_page(texts: list[str]) -> str:
+    """Hash of a page's chunk texts, in order."""
+    digest = hashlib.sha256()
+    for text in texts:
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def chunk_id(file_hash: str, page_number, text: str) -> str:
+    """Deterministic chunk ID from file content, page and chunk text."""
+    key = f"{file_hash}\0{page_number}\0{text}".encode("utf-8")
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+def page_record(old_pages: dict, page_number, texts: list[str], ids: list[str]) -> tuple[dict, bool]:
+    """
+    Manifest record ({"hash", "ids"}) for one page's chunks, and whether it
+    differs from the page's entry in old_pages (a stored "pages" dict).
+    """
+    page_hash = hash_page(texts)
+    old = old_pages.get(str(page_number))
+    if old is not None and old["hash"] == page_hash:
+        return old, False
+    return {"hash": page_hash, "ids": list(ids)}, True
+
+
+class IngestManifest:
+    """
+    SQLite manifest of ingested files, keyed by absolute path.
+
+    files:  path -> file_hash, subject, doc_type
+    pages:  (path, page) -> page hash and its chunk ids (JSON list)
+    chunks: (chunk, path) for every stored chunk, so the stale check after
+            a re-ingest is an index lookup per old chunk
+
+    Recording a file only touches that file's rows, inside one write
+    transaction, so concurrent ingests (threads or processes) don't lose
+    each other's entries.
+    """
+
+    def __init__(self, path: str = MANIFEST_PATH):
+        self.path = path
+
+    def _ensure_schema(self):
+        """Create the tables once per manifest file and process."""
+        if self.path in _schema_ready and os.path.exists(self.path):
+            return
+        with _schema_lock:
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                with conn:
+                    self._import_json(conn)
+            finally:
+                conn.close()
+            _schema_ready.add(self.path)
+
+    def _import_json(self, conn):
+        """Carry over the JSON manifest written by older versions, once."""
+        legacy = os.path.splitext(self.path)[0] + ".json"
+        if not os.path.exists(legacy) or conn.execute("SELECT 1 FROM files LIMIT 1").fetchone():
+            return
+        with open(legacy, encoding="utf-8") as f:
+            files = json.load(f).get("files", {})
+        for path, entry in files.items():
+            self._write_locked(conn, path, entry["file_hash"], entry["pages"], None, None)
+
+    @contextmanager
+    def _connect(self):
+        """Open a write connection; the body runs in one IMMEDIATE transaction."""
+        self._ensure_schema()
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self):
+        """Open a read-only connection holding one read transaction."""
+        self._ensure_schema()
+        conn = sqlite3.connect(Path(os.path.abspath(self.path)).as_uri() + "?mode=ro",
+                               uri=True, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    @staticmethod
+    def _pages(conn, key: str) -> dict:
+        return {
+            page: {"hash": page_hash, "ids": json.loads(ids)}
+            for page, page_hash, ids in conn.execute(
+                "SELECT page, hash, ids FROM pages WHERE path = ?", (key,)
+            )
+        }
+
+    def entry(self, file_path: str) -> Optional[dict]:
+        """{"file_hash", "subject", "doc_type", "pages": {page: {"hash", "ids"}}} or None."""
+        key = self._key(file_path)
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT file_hash, subject, doc_type FROM files WHERE path = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            file_hash, subject, doc_type = row
+            return {"file_hash": file_hash, "subject": subject, "doc_type": doc_type,
+                    "pages": self._pages(conn, key)}
+
+    def is_unchanged(self, file_path: str, file_hash: str,
+                     subject: Optional[str] = None, doc_type: Optional[str] = None) -> bool:
+        """
+        True if the file was ingested with these bytes and, where given, the
+        same subject and doc_type. A re-upload under another classification
+        has to be ingested again, since both are stored on every chunk.
+        """
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT file_hash, subject, doc_type FROM files WHERE path = ?",
+                (self._key(file_path),)
+            ).fetchone()
+        return row is not None and row[0] == file_hash and \
+            (subject is None or row[1] == subject) and \
+            (doc_type is None or row[2] == doc_type)
+
+    @staticmethod
+    def _write_locked(conn, key, file_hash, pages, subject, doc_type):
+        conn.execute("DELETE FROM pages WHERE path = ?", (key,))
+        conn.execute("DELETE FROM chunks WHERE path = ?", (key,))
+        conn.execute(
+            "INSERT OR REPLACE INTO files (path, file_hash, subject, doc_type) VALUES (?, ?, ?, ?)",
+            (key, file_hash, subject, doc_type)
+        )
+        conn.executemany(
+            "INSERT INTO pages (path, page, hash, ids) VALUES (?, ?, ?, ?)",
+            [(key, str(page), info["hash"], json.dumps(info["ids"])) for page, info in pages.items()]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO chunks (chunk, path) VALUES (?, ?)",
+            [(chunk, key) for info in pages.values() for chunk in info["ids"]]
+        )
+
+    def record(self, file_path: str, file_hash: str, pages: dict,
+               subject: Optional[str] = None, doc_type: Optional[str] = None) -> list[str]:
+        """
+        Stores the file's pages ({page_number: {"hash", "ids"}}) and
+        classification, and returns the chunk IDs of the previous entry that
+        no file references any more.
+        """
+        key = self._key(file_path)
+        with self._connect() as conn:
+            old = self._pages(conn, key)
+            self._write_locked(conn, key, file_hash, pages, subject, doc_type)
+            # A byte-identical copy under another path shares chunk ids.
+            return [
+                chunk for info in old.values() for chunk in info["ids"]
+                if conn.execute("SELECT 1 FROM chunks WHERE chunk = ? LIMIT 1", (chunk,)).fetchone() is None
+            ]
+
+    def clear(self):
+        """Delete the manifest file, its WAL side files and any old JSON manifest."""
+        with _schema_lock:
+            legacy = os.path.splitext(self.path)[0] + ".json"
+            for path in (self.path, self.path + "-wal", self.path + "-shm", legacy):
+                if os.path.exists(path):
+                    os.remove(path)
+            _schema_ready.discard(self.path)
+
+
+_manifest = IngestManifest()
+
+
+def get_ingest_manifest() -> IngestManifest:
+    return _manifest
@@ -0,0 +1,495 @@
+"""
+Staged ingestion pipeline shared by the ingest.py CLI and the upload page.
+
+    load ──▶ classify ──▶ split ──▶ embed ──▶ write
+     files     pages       pages     chunks    batches
+
+Each stage runs its own worker threads and hands work to the next through
+a bounded queue, so a slow stage (OCR in load, the LLM fallback in
+classify, the model in embed) applies back-pressure instead of letting
+pages or chunks pile up.
+
+    load      streams a file's pages (PDF pages as soon as they are final);
+              files unchanged since the last ingest are skipped
+    classify  doc_type (classify_document) and, unless given, subject
+              (detect_subject) from the first page loaded
+    split     chunks sized to the embedding model (text_splitter.split_text);
+              pages whose chunks match the manifest stop here. Without the
+              model's tokenizer the file fails rather than being stored
+              under estimated chunk boundaries
+    embed     encodes chunks in batches of up to EMBED_BATCH_SIZE
+    write     single writer: Chroma + BM25 upserts, then per file the
+              manifest record and removal of stale chunks
+
+A job may also bring its chunks already split (IngestJob(chunks=...), see
+store.sync_file_chunks): they replace the file's loaded and split pages.
+
+A file's manifest entry is written only after all of its chunks are
+stored, so an interrupted or failed file is simply redone next time.
+Per-stage item counts and busy time are kept in pipeline.stats.
+
+With max_memory_mb set, load workers only start another file while the
+memory of this process and its OCR / embedding workers (summed as PSS, so
+shared pages count once; USS, then RSS, where PSS is unavailable) is under
+the cap. One file always runs, so ingestion can't stall.
+"""
+
+import os
+import queue
+import threading
+import time
+from itertools import groupby
+
+from langchain_core.documents import Document
+
+from document_processor.classifier import classify_document, detect_subject
+from document_processor.docx_loader import load_docx
+from document_processor.hybrid_loader import iter_pdf_hybrid
+from document_processor.ocr_loader import load_image
+from document_processor.pptx_loader import load_pptx
+from vectorstore.manifest import chunk_id, get_ingest_manifest, hash_file, page_record
+from vectorstore.store import EMBED_BATCH_SIZE, EMBED_WORKERS, delete_documents, embed_texts, write_embedded
+from vectorstore.text_splitter import split_text, using_estimate
+
+LOADERS = {
+    ".pdf": iter_pdf_hybrid,
+    ".docx": load_docx,
+    ".pptx": load_pptx,
+    ".png": load_image,
+    ".jpg": load_image,
+    ".jpeg": load_image,
+}
+
+STAGES = ("load", "classify", "split", "embed", "write")
+
+# Worker threads per stage (write always has one). Load workers each read a
+# different file; OCR inside a PDF is parallel on its own (OCR_WORKERS).
+INGEST_LOAD_WORKERS = int(os.getenv("INGEST_LOAD_WORKERS", "1"))
+INGEST_CLASSIFY_WORKERS = int(os.getenv("INGEST_CLASSIFY_WORKERS", "1"))
+INGEST_SPLIT_WORKERS = int(os.getenv("INGEST_SPLIT_WORKERS", "1"))
+# Items each inter-stage queue holds before the producer waits.
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+# Memory (MB, see ingest_memory_mb) above which no new file is started; 0 = no cap.
+INGEST_MAX_MEMORY_MB = int(os.getenv("INGEST_MAX_MEMORY_MB", "0"))
+MEMORY_POLL_SECONDS = 0.2
+
+_STOP = object()
+
+
+def ingest_memory_mb():
+    """
+    Memory of this process plus its child processes (OCR and embedding
+    pools), in MB. Summed as PSS, which splits each shared page between the
+    processes mapping it: summed RSS would count the shared libraries and
+    model files every worker maps once per process. Where PSS isn't
+    available (not Linux), USS (private pages only) is used, then RSS.
+    """
+    import psutil
+
+    def footprint(process):
+        try:
+            info = process.memory_full_info()
+        except psutil.AccessDenied:
+            return process.memory_info().rss
+        return getattr(info, "pss", None) or getattr(info, "uss", None) or info.rss
+
+    process = psutil.Process()
+    total = footprint(process)
+    for child in process.children(recursive=True):
+        try:
+            total += footprint(child)
+        except psutil.Error:
+            pass
+    return total / 2 ** 20
+
+
+def load_pages(file_path):
+    """Pages of any supported file, as the document_processor loaders return them."""
+    loader = LOADERS.get(os.path.splitext(file_path)[1].lower())
+    if loader is None:
+        print(f"  Unsupported file type: {file_path}")
+        return []
+    return loader(file_path)
+
+
+def chunk_pages(chunks):
+    """
+    Groups already split chunks (each page's chunks together, "page_number"
+    in metadata) into pages that carry them, as the load stage yields them.
+    """
+    for page_number, docs in groupby(chunks, key=lambda doc: doc.metadata.get("page_number", 1)):
+        docs = list(docs)
+        yield {"page_number": page_number, "text": "\n".join(doc.page_content for doc in docs), "chunks": docs}
+
+
+class IngestJob:
+    """
+    One file going through the pipeline, with its classification, the
+    manifest records of its pages and a count of its work still in flight.
+    chunks, if given, are the file's chunks already split (see chunk_pages).
+    """
+
+    def __init__(self, file_path, subject=None, doc_type=None, file_hash=None, chunks=None):
+        self.file_path = file_path
+        self.chunks = chunks
+        self.subject = subject
+        # Stored lowercase, so metadata filters match one spelling.
+        self.doc_type = doc_type.strip().lower() if doc_type else None
+        self.file_hash = file_hash
+        self.preview = ""
+        self.old_pages = {}
+        self.old_classification = None
+        self.page_records = {}
+        self.pages = 0
+        self.pages_unchanged = 0
+        self.chunks_written = 0
+        self.status = "pending"   # "skipped", "empty", "failed" or "done" when finished
+        self.error = None
+        self._classified = False
+        self._outstanding = 0
+        # Reentrant: fail() may be called while classification holds it.
+        self._lock = threading.RLock()
+
+    def hold(self):
+        with self._lock:
+            self._outstanding += 1
+
+    def release(self):
+        """True when this was the job's last unit of work in flight."""
+        with self._lock:
+            self._outstanding -= 1
+            return self._outstanding == 0
+
+    def fail(self, stage, error):
+        with self._lock:
+            if self.error is None:
+                self.error = f"{stage}: {error}"
+        print(f"  {stage} failed for {os.path.basename(self.file_path)}: {error}")
+
+
+class _FileDone:
+    def __init__(self, job):
+        self.job = job
+
+
+class IngestionPipeline:
+    """
+    Runs IngestJobs through load → classify → split → embed → write.
+
+        pipeline = IngestionPipeline(load_workers=2)
+        jobs = pipeline.run([IngestJob(path, subject="os") for path in paths])
+        pipeline.print_report(jobs)
+
+    Worker counts default to the INGEST_*_WORKERS settings and EMBED_WORKERS.
+    """
+
+    def __init__(self, load_workers=None, classify_workers=None, split_workers=None,
+                 embed_workers=None, batch_size=None, queue_size=None, progress=None,
+                 max_memory_mb=None):
+        self.workers = {
+            "load": load_workers or INGEST_LOAD_WORKERS,
+            "classify": classify_workers or INGEST_CLASSIFY_WORKERS,
+            "split": split_workers or INGEST_SPLIT_WORKERS,
+            "embed": embed_workers or EMBED_WORKERS,
+            "write": 1,
+        }
+        self.batch_size = batch_size or EMBED_BATCH_SIZE
+        self.queue_size = queue_size or INGEST_QUEUE_SIZE
+        # Called from the writer thread as progress(job) when a file finishes.
+        self.progress = progress
+        self.max_memory_mb = INGEST_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+        self.stats = {stage: {"items": 0, "seconds": 0.0} for stage in STAGES}
+        self.seconds = 0.0
+        self.memory_waits = 0
+        self._stats_lock = threading.Lock()
+        # Files started by a load worker and not yet finished by the writer.
+        self._files_open = 0
+        self._files_open_changed = threading.Condition()
+
+    def _start_file(self):
+        """Blocks a load worker while memory is over the cap and other files are still open."""
+        with self._files_open_changed:
+            if self.max_memory_mb:
+                waited = False
+                while self._files_open and ingest_memory_mb() > self.max_memory_mb:
+                    waited = True
+                    self._files_open_changed.wait(MEMORY_POLL_SECONDS)
+                self.memory_waits += waited
+            self._files_open += 1
+
+    def _end_file(self):
+        with self._files_open_changed:
+            self._files_open -= 1
+            self._files_open_changed.notify_all()
+
+    def _count(self, stage, items, seconds):
+        with self._stats_lock:
+            self.stats[stage]["items"] += items
+            self.stats[stage]["seconds"] += seconds
+
+    # --- stages -----------------------------------------------------------
+
+    def _load(self, job, out):
+        manifest = get_ingest_manifest()
+        job.file_hash = job.file_hash or hash_file(job.file_path)
+        if manifest.is_unchanged(job.file_path, job.file_hash, job.subject, job.doc_type):
+            job.status = "skipped"
+            return
+        entry = manifest.entry(job.file_path)
+        if entry is not None:
+            job.old_pages = entry["pages"]
+            job.old_classification = (entry["subject"], entry["doc_type"])
+
+        start = time.perf_counter()
+        pages = load_pages(job.file_path) if job.chunks is None else chunk_pages(job.chunks)
+        for page in pages:
+            if not page["text"].strip():
+                continue
+            if not job.pages:
+                job.preview = page["text"][:300]
+            job.pages += 1
+            self._count("load", 1, time.perf_counter() - start)
+            job.hold()
+            out.put((job, page))
+            start = time.perf_counter()
+
+    def _classify(self, job, page, out):
+        with job._lock:
+            if not job._classified:
+                # One attempt per file: a failing classifier (e.g. the LLM
+                # fallback) is not called again for every remaining page.
+                job._classified = True
+                try:
+                    job.doc_type = job.doc_type or classify_document(job.file_path, job.preview).strip().lower()
+                    job.subject = job.subject or detect_subject(job.file_path, job.preview)
+                except Exception as e:
+                    job.fail("classify", e)
+                else:
+                    if job.old_classification not in (None, (job.subject, job.doc_type)):
+                        # Every chunk carries the classification: no page is unchanged.
+                        job.old_pages = {}
+                    print(f"  {os.path.basename(job.file_path)} | Doc type: {job.doc_type} | Subject: {job.subject}")
+            if job.error is not None:
+                # The file has failed; its remaining pages go no further.
+                return
+        job.hold()
+        out.put((job, page))
+
+    def _split(self, job, page, out):
+        if using_estimate():
+            # Estimated boundaries give other chunk ids than the real ones;
+            # stored in the manifest they would stick until the file changes.
+            raise RuntimeError("embedding model tokenizer unavailable, not splitting on estimated lengths")
+        page_number = page.get("page_number", 1)
+        if "chunks" in page:
+            # Split by the caller; a repeated id keeps its last copy.
+            docs = list({doc.id: doc for doc in page["chunks"]}.values())
+        else:
+            docs = self._page_chunks(job, page, page_number)
+        if not docs:
+            return
+        record, changed = page_record(
+            job.old_pages, page_number, [doc.page_content for doc in docs], [doc.id for doc in docs]
+        )
+        with job._lock:
+            job.page_records[page_number] = record
+            job.pages_unchanged += not changed
+        if changed:
+            job.hold()
+            out.put((job, docs))
+
+    @staticmethod
+    def _page_chunks(job, page, page_number):
+        return [
+            Document(
+                id=chunk_id(job.file_hash, page_number, chunk),
+                page_content=chunk,
+                metadata={
+                    "source_file": os.path.basename(job.file_path),
+                    "page_number": page_number,
+                    "doc_type": job.doc_type,
+                    "subject": job.subject,
+                    "extraction_method": page.get("extraction_method", "unknown"),
+                    "file_path": job.file_path,
+                }
+            )
+            # A paragraph repeated on a page gives the same id twice.
+            for chunk in dict.fromkeys(split_text(page["text"]))
+        ]
+
+    def _embed(self, items, out):
+        """Encodes the chunks of several (job, docs) items as one batch."""
+        docs = [doc for _, item_docs in items for doc in item_docs]
+        embeddings = embed_texts([doc.page_content for doc in docs], self.workers["embed"])
+        # The job of each chunk, so the writer can count them per file.
+        jobs = [job for job, item_docs in items for _ in item_docs]
+        out.put((jobs, docs, embeddings))
+
+    def _write(self, jobs, docs, embeddings):
+        write_embedded([doc.id for doc in docs], embeddings, docs)
+        for job in jobs:
+            job.chunks_written += 1
+
+    def _finish_file(self, job):
+        if job.status == "skipped":
+            pass
+        elif job.error is not None:
+            # No manifest entry: the file is ingested again next time.
+            job.status = "failed"
+        elif not job.page_records:
+            job.status = "empty"
+            print(f"  No text extracted from {job.file_path} — skipping")
+        else:
+            try:
+                stale = get_ingest_manifest().record(
+                    job.file_path, job.file_hash, job.page_records, job.subject, job.doc_type
+                )
+                delete_documents(stale)
+                job.status = "done"
+                print(f"  {os.path.basename(job.file_path)}: {job.chunks_written} chunks written, "
+                      f"{job.pages_unchanged} unchanged pages skipped, {len(stale)} stale chunks removed")
+            except Exception as e:
+                job.fail("write", e)
+                job.status = "failed"
+        self._end_file()
+        if self.progress:
+            # Runs on the writer thread: an exception here would stop the writer.
+            try:
+                self.progress(job)
+            except Exception as e:
+                print(f"  progress callback failed for {os.path.basename(job.file_path)}: {e}")
+
+    # --- plumbing ---------------------------------------------------------
+
+    def _release(self, job, done_queue):
+        if job.release():
+            # Everything this file produced is already queued ahead of this.
+            done_queue.put(_FileDone(job))
+
+    def _worker(self, stage, inbox, outbox, done_queue):
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            job, payload = item
+            start = time.perf_counter()
+            try:
+                if stage == "load":
+                    self._start_file()
+                    self._load(job, outbox)
+                elif stage == "classify":
+                    self._classify(job, payload, outbox)
+                else:
+                    self._split(job, payload, outbox)
+            except Exception as e:
+                job.fail(stage, e)
+            if stage != "load":
+                self._count(stage, 1, time.perf_counter() - start)
+            self._release(job, done_queue)
+
+    def _embed_worker(self, inbox, outbox, done_queue):
+        stopping = False
+        while not stopping:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            # Top the batch up with whatever is already waiting.
+            items = [item]
+            while sum(len(docs) for _, docs in items) < self.batch_size:
+                try:
+                    extra = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is _STOP:
+                    stopping = True
+                    break
+                items.append(extra)
+
+            start = time.perf_counter()
+            try:
+                self._embed(items, outbox)
+            except Exception as e:
+                for job, _ in items:
+                    job.fail("embed", e)
+            self._count("embed", sum(len(docs) for _, docs in items), time.perf_counter() - start)
+            for job, _ in items:
+                self._release(job, done_queue)
+
+    def _writer(self, inbox):
+        while True:
+            item = inbox.get()
+            if item is _STOP:
+                return
+            if isinstance(item, _FileDone):
+                self._finish_file(item.job)
+                continue
+            jobs, docs, embeddings = item
+            start = time.perf_counter()
+            try:
+                self._write(jobs, docs, embeddings)
+            except Exception as e:
+                for job in set(jobs):
+                    job.fail("write", e)
+            self._count("write", len(docs), time.perf_counter() - start)
+
+    def run(self, jobs):
+        """Ingests every job; returns the jobs with status and counts filled in."""
+        jobs = list(jobs)
+        queues = {stage: queue.Queue(self.queue_size) for stage in STAGES}
+        # Files are all queued up front; the other queues are bounded.
+        queues["load"] = queue.Queue()
+        outputs = {"load": queues["classify"], "classify": queues["split"], "split": queues["embed"]}
+
+        threads = {}
+        for stage in ("load", "classify", "split"):
+            threads[stage] = [
+                threading.Thread(target=self._worker, name=f"ingest-{stage}-{i}",
+                                 args=(stage, queues[stage], outputs[stage], queues["write"]), daemon=True)
+                for i in range(self.workers[stage])
+            ]
+        threads["embed"] = [
+            threading.Thread(target=self._embed_worker, name=f"ingest-embed-{i}",
+                             args=(queues["embed"], queues["write"], queues["write"]), daemon=True)
+            for i in range(self.workers["embed"])
+        ]
+        threads["write"] = [threading.Thread(target=self._writer, name="ingest-write",
+                                             args=(queues["write"],), daemon=True)]
+
+        start = time.perf_counter()
+        for stage_threads in threads.values():
+            for thread in stage_threads:
+                thread.start()
+
+        for job in jobs:
+            job.hold()
+            queues["load"].put((job, None))
+
+        # Each stage stops once everything upstream has finished.
+        for stage in STAGES:
+            for _ in threads[stage]:
+                queues[stage].put(_STOP)
+            for thread in threads[stage]:
+                thread.join()
+
+        self.seconds = time.perf_counter() - start
+        return jobs
+
+    def print_report(self, jobs=None):
+        print(f"\nIngestion finished in {self.seconds:.1f}s")
+        if jobs is not None:
+            counts = {}
+            for job in jobs:
+                counts[job.status] = counts.get(job.status, 0) + 1
+            print("  files: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+        if self.seconds:
+            print(f"  throughput: {self.stats['load']['items'] / self.seconds:.1f} pages/s, "
+                  f"{self.stats['write']['items'] / self.seconds:.1f} chunks/s (wall clock)")
+        if self.memory_waits:
+            print(f"  memory cap {self.max_memory_mb} MB delayed {self.memory_waits} file start(s)")
+        for stage in STAGES:
+            stats = self.stats[stage]
+            unit = {"load": "pages", "classify": "pages", "split": "pages"}.get(stage, "chunks")
+            rate = stats["items"] / stats["seconds"] if stats["seconds"] else 0.0
+            print(f"  {stage:8s} x{self.workers[stage]:<2d} {stats['items']:6d} {unit:6s} "
+                  f"{stats['seconds']:7.1f}s busy  {rate:8.1f} {unit}/s")
+
@@ -1,17 +1,129 @@
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from vectorstore.store import get_vector_store
+from vectorstore.store import (
+    encode_queries, get_collection_generation, get_vector_store, rebuild_bm25_index,
+    relevance_score, warm_up_vector_store
+)
+from vectorstore.bm25_index import get_bm25_index, tokenize
+from vectorstore.fusion import DEFAULT_FUSION, doc_key, fuse
 from langchain_core.documents import Document
-from rank_bm25 import BM25Okapi
-import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+import copy
+import math
+import threading
+import time
 
-def tokenize(text):
-    """Simple tokenization: lowercase, remove punctuation, split."""
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    return text.split()
+import numpy as np
 
+# Latency budgets (seconds) for each search leg of retrieve_docs.
+VECTOR_LEG_TIMEOUT = 10.0
+BM25_LEG_TIMEOUT = 10.0
+
+# Shared by every retrieve_docs call so legs never wait on thread start-up.
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="retrieval")
+
+EMBEDDING_CACHE_SIZE = 1024
+RESULT_CACHE_SIZE = 256
+
+# Candidates fetched per search leg, as a multiple of k (see benchmarks/bench_fusion.py).
+LEG_DEPTH_FACTOR = 1.5
+
+# MMR trade-off: 1.0 ranks by relevance only, 0.0 by diversity only.
+MMR_LAMBDA = 0.5
+
+
+class _LRUCache:
+    """
+    Thread-safe LRU cache with hit/miss counters.
+    Entries are dropped as soon as a lookup sees a new generation.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _sync(self, generation):
+        if generation != self._generation:
+            self._data.clear()
+            self._generation = generation
+
+    def get(self, key, generation=None):
+        with self._lock:
+            self._sync(generation)
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation != self._generation:
+                return  # computed against an older collection
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+_embedding_cache = _LRUCache(EMBEDDING_CACHE_SIZE)
+_result_cache = _LRUCache(RESULT_CACHE_SIZE)
+
+
+def get_cache_stats():
+    """Hit/miss counters for the query embedding and retrieval result caches."""
+    return {
+        "embeddings": _embedding_cache.stats(),
+        "results": _result_cache.stats(),
+    }
+
+
+def clear_retrieval_cache():
+    """Empty both caches and reset their counters."""
+    _embedding_cache.clear()
+    _result_cache.clear()
+
+
+def embed_queries(queries):
+    """
+    Embed queries, reusing vectors from the in-memory query cache. Queries
+    not in it are embedded together in one model forward pass.
+    """
+    vectors = [_embedding_cache.get(query) for query in queries]
+    missing = list(dict.fromkeys(
+        query for query, vector in zip(queries, vectors) if vector is None
+    ))
+    if missing:
+        fresh = dict(zip(missing, encode_queries(missing)))
+        for query, vector in fresh.items():
+            _embedding_cache.put(query, vector)
+        vectors = [
+            vector if vector is not None else fresh[query]
+            for query, vector in zip(queries, vectors)
+        ]
+    return vectors
 
 def normalize_doc_type_filter(doc_type):
     """Normalize doc_type to None, string, or list of strings."""
@@ -36,145 +148,373 @@ def normalize_doc_type_filter(doc_type):
 
 
 def get_bm25_results(query, top_k=5, doc_type=None, subject=None):
-    vector_store = get_vector_store()
-    
-    # Normalize and support multiple doc_type values.
+    """
+    Lexical search against the persistent BM25 index.
+    subject/doc_type filters only score the matching index partitions.
+    """
+    return get_bm25_results_batch([query], top_k=top_k, doc_type=doc_type, subject=subject)[0]
+
+def get_bm25_results_batch(queries, top_k=5, doc_type=None, subject=None):
+    """Lexical search for several queries in one sparse matrix product."""
     doc_type = normalize_doc_type_filter(doc_type)
 
-    # Get all documents
-    all_docs = vector_store.get()
-    documents = []
-    metadatas = []
-    ids = []
-    
-    for i, doc_id in enumerate(all_docs['ids']):
-        metadata = all_docs['metadatas'][i]
-
-        if doc_type:
-            actual_type = (metadata.get('doc_type') or "").lower()
-            if isinstance(doc_type, list):
-                if actual_type not in doc_type:
-                    continue
-            elif actual_type != doc_type:
-                continue
-
-        if subject and metadata.get('subject') != subject:
-            continue
-
-        documents.append(all_docs['documents'][i])
-        metadatas.append(metadata)
-        ids.append(doc_id)
-    
-    if not documents:
-        return []
-    
-    # Tokenize corpus
-    corpus = [tokenize(doc) for doc in documents]
-    
-    # Build BM25 index
-    bm25 = BM25Okapi(corpus)
-    
-    # Tokenize query
-    query_tokens = tokenize(query)
-    
-    # Get scores
-    scores = bm25.get_scores(query_tokens)
-    
-    # Get top k indices
-    top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-    
+    bm25_index = get_bm25_index()
+    if len(bm25_index) == 0 and get_vector_store().get(limit=1)['ids']:
+        # Collection predates the index — build it once.
+        rebuild_bm25_index()
+
     results = []
-    for idx in top_indices:
-        if scores[idx] > 0:  # Only include if score > 0
-            metadata = metadatas[idx].copy()
-            metadata['id'] = ids[idx]  # Add id to metadata for uniqueness
-            doc = Document(page_content=documents[idx], metadata=metadata)
-            results.append((doc, scores[idx]))
-    
+    for hits in bm25_index.search_batch(
+        list(queries), top_k=top_k, doc_type=doc_type, subject=subject
+    ):
+        query_results = []
+        for doc_id, content, metadata, score in hits:
+            metadata = metadata.copy()
+            metadata['id'] = doc_id  # Add id to metadata for uniqueness
+            query_results.append((Document(page_content=content, metadata=metadata, id=doc_id), score))
+        results.append(query_results)
     return results
 
+def _build_where_filter(doc_type, subject):
+    """
+    Build filter for Chroma. If multiple doc_types, use $in; otherwise exact match.
+    Chroma only accepts one top-level key, so subject + doc_type go under $and.
+    """
+    conditions = []
+    if subject:
+        conditions.append({"subject": subject})
+
+    if doc_type:
+        if isinstance(doc_type, list):
+            conditions.append({"doc_type": {"$in": doc_type}})
+        else:
+            conditions.append({"doc_type": doc_type})
+
+    if len(conditions) > 1:
+        return {"$and": conditions}
+    return conditions[0] if conditions else {}
+
+
+def _filter_by_doc_type(results, doc_type, top_k):
+    """Client-side doc_type filter used when Chroma rejects the where filter."""
+    allowed = set(doc_type) if isinstance(doc_type, list) else {doc_type}
+    filtered = [
+        (doc, score) for doc, score in results
+        if (doc.metadata.get("doc_type") or "").lower() in allowed
+    ]
+    return filtered[:top_k]
+
+
 def retrieve_with_scores(query, top_k=5, doc_type=None, subject=None):
+    """Vector search returning (doc, relevance_score) pairs, best first."""
+    return retrieve_with_scores_batch([query], top_k=top_k, doc_type=doc_type, subject=subject)[0]
+
+def retrieve_with_scores_batch(queries, top_k=5, doc_type=None, subject=None):
+    """
+    Vector search for several queries. Query embeddings come from the cache,
+    and any misses are embedded in one model forward pass; returns one
+    (doc, relevance_score) list per query.
+    """
+    if not queries:
+        return []
+
     vector_store = get_vector_store()
     doc_type = normalize_doc_type_filter(doc_type)
+    where_filter = _build_where_filter(doc_type, subject)
 
-    # Build filter for Chroma. If multiple values, use $in; otherwise exact match.
-    where_filter = {}
-    if subject:
-        where_filter["subject"] = subject
+    embeddings = embed_queries(list(queries))
 
-    if doc_type:
-        if isinstance(doc_type, list):
-            where_filter["doc_type"] = {"$in": doc_type}
+    def search(embedding, k, where):
+        # Both backends return squared L2 distances here, despite the name.
+        hits = vector_store.similarity_search_by_vector_with_relevance_scores(
+            embedding, k=k, filter=where
+        )
+        return [(doc, relevance_score(distance)) for doc, distance in hits]
+
+    results = []
+    for embedding in embeddings:
+        if where_filter:
+            try:
+                results.append(search(embedding, top_k, where_filter))
+            except Exception:
+                # Fallback: fetch unfiltered and apply client-side doc_type filter.
+                hits = search(embedding, top_k*3, None)
+                results.append(_filter_by_doc_type(hits, doc_type, top_k) if doc_type else hits)
+        else:
+            results.append(search(embedding, top_k, None))
+    return results
+
+def merge_results(vector_results, bm25_results, top_k=4, method=DEFAULT_FUSION):
+    """
+    Fuse vector and BM25 results by rank ("rrf") or normalised score
+    ("minmax"), counting a chunk found by both legs once. Returns the top k
+    as (doc, fused score, source) triples.
+    """
+    return fuse({"vector": vector_results, "bm25": bm25_results}, top_k, method=method)
+
+
+def relevant_hits(vector_results, bm25_results, score_threshold=-1):
+    """
+    Both legs' hits on one relevance scale, with those below score_threshold
+    dropped. Vector hits keep their relevance (1 - d/sqrt(2)); BM25 scores
+    are divided by the query's best BM25 score. Returns the two filtered
+    legs and {doc key: best relevance over the legs}.
+    """
+    best_bm25 = max((score for _, score in bm25_results), default=0.0)
+    legs = {
+        "vector": list(vector_results),
+        "bm25": [(doc, score / best_bm25 if best_bm25 > 0 else 0.0) for doc, score in bm25_results],
+    }
+    relevance = {}
+    for name, results in legs.items():
+        legs[name] = [(doc, score) for doc, score in results if score >= score_threshold]
+        for doc, score in legs[name]:
+            key = doc_key(doc)
+            relevance[key] = max(relevance.get(key, score), score)
+    return legs["vector"], legs["bm25"], relevance
+
+
+def leg_depth(k):
+    """Default number of candidates each search leg fetches for a top-k answer."""
+    return max(k, math.ceil(k * LEG_DEPTH_FACTOR))
+
+
+def maximal_marginal_relevance(query_vector, candidate_vectors, k, lambda_mult=MMR_LAMBDA):
+    """
+    Greedy MMR over candidate embeddings. Returns the indices of up to k
+    candidates, each chosen to maximise
+    lambda * sim(query, c) - (1 - lambda) * max sim(c, already chosen).
+    """
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    if k <= 0 or len(candidates) == 0:
+        return []
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_vector, dtype=np.float32)
+    query = query / max(np.linalg.norm(query), 1e-12)
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    redundancy = np.full(len(candidates), -np.inf, dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+
+    chosen = []
+    for _ in range(min(k, len(candidates))):
+        if chosen:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
         else:
-            where_filter["doc_type"] = doc_type
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        chosen.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return chosen
+
+
+def _doc_id(doc):
+    return doc.id or doc.metadata.get('id')
+
 
-    # Similarity search with scores
-    if where_filter:
+def _stored_embeddings(ids):
+    """{id: embedding} for the given chunk ids, read from the vector store."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return {}
+    page = get_vector_store().get(ids=ids, include=["embeddings"])
+    embeddings = page.get("embeddings")
+    if embeddings is None:
+        return {}
+    return dict(zip(page["ids"], embeddings))
+
+
+def _diversify(query_vector, merged, k, lambda_mult):
+    """
+    Re-rank merged (doc, score, source) candidates with MMR, using the
+    embeddings already stored for them. Candidates without a stored
+    embedding keep their merge order after the MMR picks.
+    """
+    stored = _stored_embeddings([_doc_id(doc) for doc, _, _ in merged if _doc_id(doc)])
+    with_vectors = [i for i, (doc, _, _) in enumerate(merged) if _doc_id(doc) in stored]
+    if not with_vectors:
+        return merged[:k]
+
+    picks = maximal_marginal_relevance(
+        query_vector,
+        [stored[_doc_id(merged[i][0])] for i in with_vectors],
+        k,
+        lambda_mult
+    )
+    order = [with_vectors[i] for i in picks]
+    order += [i for i in range(len(merged)) if i not in set(with_vectors)]
+    return [merged[i] for i in order[:k]]
+
+
+class RetrievalResults(list):
+    """
+    List of retrieved docs plus which search legs contributed.
+
+    legs:      legs that finished in time, e.g. ["vector", "bm25"]
+    timed_out: legs that missed their latency budget
+    """
+
+    def __init__(self, docs=(), legs=(), timed_out=()):
+        super().__init__(docs)
+        self.legs = list(legs)
+        self.timed_out = list(timed_out)
+
+
+def _run_legs(legs, timeouts):
+    """
+    Run search legs concurrently on the shared executor.
+
+    legs maps leg name -> zero-arg callable; timeouts maps leg name -> seconds,
+    measured from when the legs were submitted. A leg that misses its budget
+    is left running in the background and its results are dropped; a leg
+    that raises raises here, as a plain search call would.
+    """
+    start = time.monotonic()
+    futures = {name: _executor.submit(fn) for name, fn in legs.items()}
+
+    results, timed_out = {}, []
+    for name, future in futures.items():
+        remaining = max(0.0, timeouts[name] - (time.monotonic() - start))
         try:
-            results = vector_store.similarity_search_with_relevance_scores(
-                query=query,
-                k=top_k,
-                filter=where_filter
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeout:
+            print(f"⚠️ {name} search missed its {timeouts[name]}s budget — skipping")
+            timed_out.append(name)
+    return results, timed_out
+
+
+def retrieve_docs(query, k=4, doc_type=None, subject=None, score_threshold=-1,
+                  vector_timeout=VECTOR_LEG_TIMEOUT, bm25_timeout=BM25_LEG_TIMEOUT,
+                  mmr=False, mmr_lambda=MMR_LAMBDA,
+                  fusion=DEFAULT_FUSION, vector_depth=None, bm25_depth=None):
+    """
+    The main entry point for Person 1's agents. Uses both vector and BM25 search.
+
+    Both legs run concurrently, each with its own timeout in seconds. If a leg
+    misses its budget the other leg's results are returned on their own;
+    `.legs` on the returned list says which legs contributed. A leg that
+    raises fails the call. The embedding model and collection are loaded
+    before the legs start, so a cold start doesn't count against a budget.
+
+    With mmr=True the merged candidates are re-ranked by maximal marginal
+    relevance over their stored embeddings, so near-duplicate chunks (e.g.
+    overlapping neighbours from one page) don't take several of the k slots.
+    mmr_lambda trades relevance (1.0) against diversity (0.0).
+
+    The legs are combined with `fusion` ("rrf" or "minmax", see
+    vectorstore/fusion.py); vector_depth / bm25_depth set how many
+    candidates each leg fetches (default leg_depth(k)). score_threshold
+    applies to each leg's relevance before fusion (see relevant_hits), so it
+    means the same thing whichever fusion is used; the fused score only
+    orders the results. metadata["relevance_score"] is the chunk's best
+    relevance over the legs that found it.
+
+    Results are cached per (query, k, doc_type, subject, score_threshold,
+    mmr, fusion, depths) until the collection is next written to or cleared.
+    """
+    return retrieve_docs_batch(
+        [query], k=k, doc_type=doc_type, subject=subject,
+        score_threshold=score_threshold,
+        vector_timeout=vector_timeout, bm25_timeout=bm25_timeout,
+        mmr=mmr, mmr_lambda=mmr_lambda,
+        fusion=fusion, vector_depth=vector_depth, bm25_depth=bm25_depth
+    )[0]
+
+
+def retrieve_docs_batch(queries, k=4, doc_type=None, subject=None, score_threshold=-1,
+                        vector_timeout=VECTOR_LEG_TIMEOUT, bm25_timeout=BM25_LEG_TIMEOUT,
+                        mmr=False, mmr_lambda=MMR_LAMBDA,
+                        fusion=DEFAULT_FUSION, vector_depth=None, bm25_depth=None):
+    """
+    retrieve_docs for several queries at once.
+
+    Cached queries are answered from the result cache. The rest are embedded
+    in one model forward pass and scored against the BM25 index in one batch.
+    Returns one RetrievalResults list per query, in the same order as `queries`.
+    """
+    queries = list(queries)
+    if not queries:
+        return []
+
+    vector_depth = vector_depth or leg_depth(k)
+    bm25_depth = bm25_depth or leg_depth(k)
+
+    generation = get_collection_generation()
+    normalized = normalize_doc_type_filter(doc_type)
+    doc_type_key = tuple(normalized) if isinstance(normalized, list) else normalized
+
+    def cache_key(query):
+        return (query, k, doc_type_key, subject, score_threshold, mmr_lambda if mmr else None,
+                fusion, vector_depth, bm25_depth)
+
+    answers = {}
+    for query in queries:
+        if query not in answers:
+            cached = _result_cache.get(cache_key(query), generation)
+            if cached is not None:
+                answers[query] = cached
+    missing = [query for query in dict.fromkeys(queries) if query not in answers]
+
+    if missing:
+        # Load the model and collection outside the legs' latency budgets.
+        warm_up_vector_store()
+        results, timed_out = _run_legs(
+            {
+                "vector": lambda: retrieve_with_scores_batch(missing, top_k=vector_depth, doc_type=doc_type, subject=subject),
+                "bm25": lambda: get_bm25_results_batch(missing, top_k=bm25_depth, doc_type=doc_type, subject=subject),
+            },
+            {"vector": vector_timeout, "bm25": bm25_timeout}
+        )
+
+        # MMR needs the query vectors, which the vector leg has just cached.
+        diversify = mmr and "vector" in results
+        query_vectors = embed_queries(missing) if diversify else [None] * len(missing)
+
+        empty = [[] for _ in missing]
+        for query, query_vector, vector_results, bm25_results in zip(
+            missing, query_vectors, results.get("vector", empty), results.get("bm25", empty)
+        ):
+            vector_results, bm25_results, relevance = relevant_hits(
+                vector_results, bm25_results, score_threshold
+            )
+            if diversify:
+                # Every candidate from both legs is eligible for the MMR picks.
+                merged = merge_results(vector_results, bm25_results, top_k=vector_depth + bm25_depth, method=fusion)
+                merged = _diversify(query_vector, merged, k, mmr_lambda)
+            else:
+                merged = merge_results(vector_results, bm25_results, top_k=k, method=fusion)
+            answers[query] = _build_results(
+                merged, relevance, legs=list(results), timed_out=timed_out
             )
-        except Exception:
-            # Fallback: fetch from unfiltered and apply client-side doc_type filter.
-            results = vector_store.similarity_search_with_relevance_scores(query=query, k=top_k*3)
-
-            if doc_type:
-                filtered = []
-                allowed = set(doc_type) if isinstance(doc_type, list) else {doc_type}
-                for doc, score in results:
-                    if (doc.metadata.get("doc_type") or "").lower() in allowed:
-                        filtered.append((doc, score))
-                return filtered[:top_k]
-
-        return results
-
-    return vector_store.similarity_search_with_relevance_scores(query=query, k=top_k)
-
-def merge_results(vector_results, bm25_results, top_k=4):
-    """Merge vector and BM25 results, removing duplicates and keeping top k."""
-    seen_ids = set()
-    merged = []
-    
-    # Add vector results first
-    for doc, score in vector_results:
-        doc_id = doc.metadata.get('id', doc.page_content[:100])  # Use id or first 100 chars as unique key
-        if doc_id not in seen_ids:
-            seen_ids.add(doc_id)
-            merged.append((doc, score, 'vector'))
-    
-    # Add BM25 results
-    for doc, score in bm25_results:
-        doc_id = doc.metadata.get('id', doc.page_content[:100])
-        if doc_id not in seen_ids:
-            seen_ids.add(doc_id)
-            merged.append((doc, score, 'bm25'))
-    
-    # Sort by score descending
-    merged.sort(key=lambda x: x[1], reverse=True)
-    
-    # Return top k
-    return merged[:top_k]
-
-def retrieve_docs(query, k=4, doc_type=None, subject=None, score_threshold=-1):
-    """The main entry point for Person 1's agents. Now uses both vector and BM25 search."""
-    # Get vector results
-    vector_results = retrieve_with_scores(query, top_k=k*2, doc_type=doc_type, subject=subject)
-    
-    # Get BM25 results
-    bm25_results = get_bm25_results(query, top_k=k*2, doc_type=doc_type, subject=subject)
-    
-    # Merge results
-    merged = merge_results(vector_results, bm25_results, top_k=k)
-    
-    filtered = []
-    for doc, score, source in merged:
-        if score >= score_threshold:
-            doc.metadata["relevance_score"] = round(score, 3)
-            doc.metadata["search_source"] = source
-            filtered.append(doc)
-    return filtered
+            # Partial answers (a leg timed out) are not cached.
+            if not timed_out:
+                _result_cache.put(cache_key(query), answers[query], generation)
+
+    return [_copy_results(answers[query]) for query in queries]
+
+
+def _copy_results(results):
+    """Fresh Document copies so callers can't mutate cached entries."""
+    docs = []
+    for doc in results:
+        doc = copy.copy(doc)
+        doc.metadata = dict(doc.metadata)
+        docs.append(doc)
+    return RetrievalResults(docs, legs=results.legs, timed_out=results.timed_out)
+
+
+def _build_results(merged, relevance, legs, timed_out):
+    """Tag merged (doc, fused score, source) docs with their relevance and source."""
+    docs = []
+    for doc, _, source in merged:
+        doc.metadata["relevance_score"] = round(relevance[doc_key(doc)], 4)
+        doc.metadata["search_source"] = source
+        docs.append(doc)
+    return RetrievalResults(docs, legs=legs, timed_out=timed_out)
+
 if __name__ == "__main__":
     test_queries = [
         "Explain Banker's algorithm",
@@ -1,60 +1,451 @@
+import itertools
+import math
+import multiprocessing
 import os
 import shutil
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import chromadb
 from langchain_chroma import Chroma  # Updated import for newer versions
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 from dotenv import load_dotenv
+from vectorstore.bm25_index import get_bm25_index
+from vectorstore.manifest import get_ingest_manifest
+from vectorstore.embedding_cache import CachedEmbeddings, get_embedding_cache
 
 load_dotenv()
 
 # Path where ChromaDB saves data to disk - use absolute path based on script location
 _script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CHROMA_PATH = os.path.join(_script_dir, "vectorstore", "chroma_db")
+FLAT_PATH = os.path.join(_script_dir, "vectorstore", "flat_db")
+
+# "chroma" (default) or "flat" (see vectorstore/flat_store.py).
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+# Flat backend only: "int8" also stores int8 codes of the vectors, scans them
+# and re-scores the best candidates from float16. The scan touches half the
+# bytes of the float16 matrix; the codes add ~(dim + 4) bytes per row on disk.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+COLLECTION_NAME = "academic_docs"
+
+# add_documents encoding: chunks per embedding call and encoder processes.
+# EMBED_WORKERS > 1 spreads encoding over a process pool for bulk loads.
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# Set EMBEDDING_CACHE=0 to encode every text (see vectorstore/embedding_cache.py).
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE", "1") != "0"
+
+# Process-wide handles. The embedding model and the Chroma client are
+# expensive to create, so they are built once and shared by every caller.
+_registry_lock = threading.RLock()
+_embedding_function = None
+_vector_store = None
+# chromadb's own handle on the collection behind _vector_store (Chroma backend).
+_chroma_collection = None
+_embed_executor = None
+_embed_executor_workers = None
+# The embedding model warm_up_vector_store last ran, so it only runs once per load.
+_warmed_up_model = None
+
+# Bumped on every write so retrieval caches can tell stale entries apart.
+_collection_generation = 0
 
 def get_embedding_function():
     """
     Returns a FREE local embedding model. 
     'all-MiniLM-L6-v2' is small, fast, and perfect for college notes.
+    The model is loaded once per process and shared.
+    Document embeddings go through the persistent embedding cache, so a
+    text is never encoded twice, even across collection rebuilds.
     """
-    return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    global _embedding_function
+    if _embedding_function is None:
+        with _registry_lock:
+            if _embedding_function is None:
+                _embedding_function = _load_embeddings()
+    return _embedding_function
 
-def get_vector_store() -> Chroma:
-    """Load or create the ChromaDB vector store."""
+def _load_embeddings():
+    embeddings = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+    if EMBEDDING_CACHE_ENABLED:
+        embeddings = CachedEmbeddings(
+            embeddings, EMBEDDING_MODEL_NAME, get_embedding_cache(EMBEDDING_MODEL_NAME)
+        )
+    return embeddings
+
+def _uncached_embeddings():
     embeddings = get_embedding_function()
-    
-    return Chroma(
-        collection_name="academic_docs",
-        embedding_function=embeddings,
-        persist_directory=CHROMA_PATH
+    if isinstance(embeddings, CachedEmbeddings):
+        embeddings = embeddings.embeddings
+    return embeddings
+
+def get_embedding_model():
+    """The SentenceTransformer behind get_embedding_function(), e.g. for its tokenizer."""
+    return _uncached_embeddings()._client
+
+def encode_queries(queries: list[str]) -> list[list[float]]:
+    """
+    Embeds search queries in one forward pass. Queries skip the persistent
+    embedding cache, which is for chunk texts: caching every query string
+    would take a write transaction per search and evict chunk vectors.
+    """
+    return _uncached_embeddings().embed_documents(queries)
+
+def relevance_score(distance: float) -> float:
+    """
+    Relevance for a squared L2 distance, the space both backends search in
+    (Chroma's default): 1.0 for an identical vector, lower as they drift
+    apart. Same mapping LangChain applies to Chroma's l2 space.
+    """
+    return 1.0 - distance / math.sqrt(2)
+
+def get_vector_store():
+    """
+    Load or create the vector store (shared per process).
+    VECTOR_BACKEND=flat selects the memory-mapped FlatVectorStore instead of ChromaDB,
+    and VECTOR_QUANTIZATION=int8 makes it search int8 codes.
+    """
+    global _vector_store, _chroma_collection
+    if _vector_store is None:
+        with _registry_lock:
+            if _vector_store is None:
+                if VECTOR_BACKEND == "flat":
+                    from vectorstore.flat_store import FlatVectorStore
+                    _vector_store = FlatVectorStore(
+                        FLAT_PATH, get_embedding_function(), quantization=VECTOR_QUANTIZATION
+                    )
+                else:
+                    client = chromadb.PersistentClient(path=CHROMA_PATH)
+                    _chroma_collection = client.get_or_create_collection(
+                        COLLECTION_NAME, embedding_function=None
+                    )
+                    _vector_store = Chroma(
+                        client=client,
+                        collection_name=COLLECTION_NAME,
+                        embedding_function=get_embedding_function(),
+                        relevance_score_fn=relevance_score
+                    )
+    return _vector_store
+
+def _upsert_vectors(ids, embeddings, documents) -> None:
+    """Writes precomputed embeddings to whichever backend is in use."""
+    vector_store = get_vector_store()
+    if isinstance(vector_store, Chroma):
+        _chroma_collection.upsert(
+            ids=ids,
+            embeddings=embeddings,
+            documents=[doc.page_content for doc in documents],
+            metadatas=[doc.metadata or None for doc in documents]
+        )
+    else:
+        vector_store.upsert_vectors(
+            ids, embeddings,
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents]
+        )
+
+def warm_up_vector_store() -> None:
+    """
+    Loads the embedding model and opens the collection ahead of the first query,
+    so the first student request does not pay the model load. Returns at once
+    when both are already loaded and the model has run.
+    """
+    global _warmed_up_model
+    get_vector_store()
+    embeddings = get_embedding_function()
+    if _warmed_up_model is not embeddings:
+        embeddings.embed_query("warm up")
+        _warmed_up_model = embeddings
+
+def reload_vector_store(reload_model: bool = False):
+    """
+    Drops the shared handles and reopens the collection.
+    Pass reload_model=True to also reload the embedding model.
+    """
+    global _embedding_function, _vector_store, _chroma_collection, _embed_executor
+    with _registry_lock:
+        _vector_store = None
+        _chroma_collection = None
+        if reload_model:
+            _embedding_function = None
+            # Worker processes hold their own copy of the model.
+            if _embed_executor is not None:
+                _embed_executor.shutdown(wait=True)
+                _embed_executor = None
+        return get_vector_store()
+
+def count_chunks() -> int:
+    """Number of chunks in the collection, counted by the backend without reading them."""
+    vector_store = get_vector_store()
+    if isinstance(vector_store, Chroma):
+        return _chroma_collection.count()
+    return vector_store.count()
+
+def iter_chunks(where: dict = None, fields=("documents", "metadatas"), page_size: int = 500):
+    """
+    Streams chunks from the collection one page at a time.
+
+    where:     Chroma metadata filter, evaluated inside Chroma (e.g. {"doc_type": "pyq"})
+    fields:    columns to load — any of "documents", "metadatas", "embeddings".
+               Ids are always included; pass () for ids only.
+    page_size: chunks fetched per round trip
+
+    Yields dicts with "id" plus "document" / "metadata" / "embedding" for the
+    requested fields, so peak memory is one page rather than the whole library.
+    """
+    vector_store = get_vector_store()
+    fields = list(fields)
+    offset = 0
+    while True:
+        page = vector_store.get(where=where, limit=page_size, offset=offset, include=fields)
+        ids = page["ids"]
+        if not ids:
+            return
+        for i, chunk_id in enumerate(ids):
+            chunk = {"id": chunk_id}
+            for field in fields:
+                chunk[field[:-1]] = page[field][i]
+            yield chunk
+        if len(ids) < page_size:
+            return
+        offset += len(ids)
+
+def get_collection_generation() -> tuple:
+    """
+    Changes whenever the collection is written to or cleared.
+    The BM25 index part also picks up writes made by other processes.
+    """
+    return (_collection_generation, get_bm25_index().generation_key())
+
+def _bump_collection_generation() -> None:
+    global _collection_generation
+    with _registry_lock:
+        _collection_generation += 1
+
+def _init_embed_worker(threads: int):
+    """Loads the embedding model once in each worker process."""
+    global _embedding_function
+    import torch
+    torch.set_num_threads(threads)
+    _embedding_function = _load_embeddings()
+
+def _encode_batch(texts: list[str]) -> list[list[float]]:
+    return get_embedding_function().embed_documents(texts)
+
+def _get_embed_executor(workers: int):
+    """
+    Returns the executor that encodes add_documents batches.
+    workers <= 1 encodes on a single background thread with the shared model;
+    more workers start a process pool (kept alive between calls), each
+    process loading its own copy of the model. Workers are spawned rather
+    than forked: the pool is created lazily, often from an ingestion
+    thread, after torch, tokenizers and Chroma have started threads whose
+    locks a forked child could inherit while held.
+    """
+    global _embed_executor, _embed_executor_workers
+    with _registry_lock:
+        if _embed_executor is None or _embed_executor_workers != workers:
+            if _embed_executor is not None:
+                _embed_executor.shutdown(wait=True)
+            if workers <= 1:
+                _embed_executor = ThreadPoolExecutor(1, thread_name_prefix="embed")
+            else:
+                threads = max(1, (os.cpu_count() or 1) // workers)
+                _embed_executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_embed_worker,
+                    initargs=(threads,)
+                )
+            _embed_executor_workers = workers
+        return _embed_executor
+
+def embed_texts(texts: list[str], workers: int = None) -> list[list[float]]:
+    """Encodes one batch of chunk texts on the embedding executor (see add_documents)."""
+    return _get_embed_executor(workers or EMBED_WORKERS).submit(_encode_batch, texts).result()
+
+def write_embedded(ids: list[str], embeddings, documents: list[Document]) -> None:
+    """
+    Upserts already-encoded chunks into the vector store and the BM25 index.
+    A repeated id keeps its last copy: Chroma rejects duplicate ids in one
+    upsert, and byte-identical files under two paths share chunk ids.
+    """
+    last = {doc_id: i for i, doc_id in enumerate(ids)}
+    if len(last) < len(ids):
+        keep = sorted(last.values())
+        ids = [ids[i] for i in keep]
+        embeddings = [embeddings[i] for i in keep]
+        documents = [documents[i] for i in keep]
+    _upsert_vectors(ids, embeddings, documents)
+    # Keep the lexical index in step with the collection.
+    get_bm25_index().add(
+        ids,
+        [doc.page_content for doc in documents],
+        [doc.metadata for doc in documents]
     )
+    _bump_collection_generation()
+
+def add_documents(documents: list[Document], batch_size: int = None, workers: int = None) -> dict:
+    """
+    Adds Document chunks to the vector store.
+
+    Batches of batch_size chunks are encoded by the embedding executor while
+    the previous batches are written to Chroma and the BM25 index; at most
+    two batches per worker are in flight, which bounds memory.
+    batch_size and workers default to EMBED_BATCH_SIZE / EMBED_WORKERS.
 
-def add_documents(documents: list[Document]) -> None:
-    """Adds Document chunks to the vector store."""
+    Documents with an id (see vectorstore.manifest.chunk_id) replace any
+    stored chunk with the same id; the rest get a random id.
+
+    Returns {"chunks", "seconds", "chunks_per_sec"}.
+    """
     if not documents:
         print("⚠️ No documents to add.")
+        return {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+
+    # Chunks with an id are upserted; a repeated id within one call keeps the
+    # last copy (Chroma rejects duplicate ids in a single upsert).
+    by_id = {}
+    for doc in documents:
+        by_id[doc.id or str(uuid.uuid4())] = doc
+    documents = list(by_id.values())
+    all_ids = list(by_id.keys())
+
+    batch_size = batch_size or EMBED_BATCH_SIZE
+    workers = workers or EMBED_WORKERS
+    executor = _get_embed_executor(workers)
+    max_in_flight = 2 * max(1, workers)
+
+    start = time.perf_counter()
+    batches = (
+        (all_ids[i:i + batch_size], documents[i:i + batch_size])
+        for i in range(0, len(documents), batch_size)
+    )
+    in_flight = deque()
+    written = 0
+    batch_number = 0
+
+    def submit_next():
+        ids, batch = next(batches, (None, None))
+        if batch is not None:
+            texts = [doc.page_content for doc in batch]
+            in_flight.append((ids, batch, executor.submit(_encode_batch, texts)))
+
+    for _ in range(max_in_flight):
+        submit_next()
+
+    while in_flight:
+        ids, batch, future = in_flight.popleft()
+        embeddings = future.result()
+        submit_next()
+
+        write_embedded(ids, embeddings, batch)
+        written += len(batch)
+        batch_number += 1
+        print(f"  Added batch {batch_number} ({len(batch)} chunks)")
+
+    seconds = time.perf_counter() - start
+    rate = written / seconds if seconds > 0 else 0.0
+    print(f"✅ Total {written} chunks successfully stored in ChromaDB ({rate:.1f} chunks/sec)")
+    return {"chunks": written, "seconds": seconds, "chunks_per_sec": rate}
+
+def delete_documents(ids: list[str]) -> None:
+    """Removes chunks by id from the collection and the BM25 index."""
+    if not ids:
         return
+    get_vector_store().delete(ids=list(ids))
+    get_bm25_index().remove(list(ids))
+    _bump_collection_generation()
 
-    vector_store = get_vector_store()
-    
-    # Process in batches
-    batch_size = 100
-    for i in range(0, len(documents), batch_size):
-        batch = documents[i:i + batch_size]
-        vector_store.add_documents(batch)
-        print(f"  Added batch {i//batch_size + 1} ({len(batch)} chunks)")
+def sync_file_documents(file_path: str, file_hash: str, documents: list[Document]) -> int:
+    """
+    Brings the stored chunks of one file in line with `documents`, its full
+    current set of chunks (ids from chunk_id, "page_number" in metadata).
+    Returns the number of chunks written; see sync_file_chunks.
+    """
+    documents = sorted(documents, key=lambda doc: doc.metadata.get("page_number", 1))
+    return sync_file_chunks(file_path, file_hash, documents)
+
+def sync_file_chunks(file_path: str, file_hash: str, chunks, batch_size: int = None) -> int:
+    """
+    Streaming form of sync_file_documents for a chunk iterable such as
+    chunker.iter_document_chunks, where each page's chunks arrive together.
+
+    The chunks go through the ingestion pipeline's split, embed and write
+    stages (vectorstore/pipeline.py): pages whose chunks match the manifest
+    are not embedded again, changed pages are written in batches of up to
+    batch_size chunks (default EMBED_BATCH_SIZE) while later pages are still
+    being read, and stale chunks are removed once the manifest is recorded.
+    subject and doc_type come from the first chunk's metadata.
+    Returns the number of chunks written.
+    """
+    from vectorstore.pipeline import IngestJob, IngestionPipeline
 
-    print(f"✅ Total {len(documents)} chunks successfully stored in ChromaDB")
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    job = IngestJob(
+        file_path, subject=first.metadata.get("subject"), doc_type=first.metadata.get("doc_type"),
+        file_hash=file_hash, chunks=itertools.chain([first], chunks)
+    )
+    job, = IngestionPipeline(batch_size=batch_size).run([job])
+    if job.error is not None:
+        raise RuntimeError(f"{file_path}: {job.error}")
+    return job.chunks_written
+
+def rebuild_bm25_index() -> int:
+    """
+    Rebuilds the BM25 index from the Chroma collection.
+    Only needed for collections written before the index existed.
+    """
+    bm25_index = get_bm25_index()
+    bm25_index.clear()
+
+    total = 0
+    batch = []
+    for chunk in iter_chunks(page_size=1000):
+        batch.append(chunk)
+        if len(batch) == 1000:
+            total += _index_chunks(bm25_index, batch)
+            batch = []
+    total += _index_chunks(bm25_index, batch)
+
+    print(f"✅ BM25 index rebuilt with {total} chunks")
+    return total
+
+def _index_chunks(bm25_index, chunks) -> int:
+    bm25_index.add(
+        [chunk["id"] for chunk in chunks],
+        [chunk["document"] for chunk in chunks],
+        [chunk["metadata"] for chunk in chunks]
+    )
+    return len(chunks)
 
 def clear_vector_store():
-    # 1. If you have a global vector_store object, try to set it to None 
-    # to release the file lock
-    global _vector_store
-    _vector_store = None 
+    # 1. Drop the shared vector_store handle to release the file lock
+    global _vector_store, _chroma_collection
+    with _registry_lock:
+        _vector_store = None
+        _chroma_collection = None
+
+    get_bm25_index().clear()
+    get_ingest_manifest().clear()
     
-    if os.path.exists(CHROMA_PATH):
-        try:
-            shutil.rmtree(CHROMA_PATH)
-            print("🗑️ Vector store cleared.")
-        except PermissionError:
-            print("⚠️ Could not delete ChromaDB folder because it is in use.")
-            print("👉 Try restarting your terminal or VS Code.")
\ No newline at end of file
+    for path in (CHROMA_PATH, FLAT_PATH):
+        if os.path.exists(path):
+            try:
+                shutil.rmtree(path)
+                print("🗑️ Vector store cleared.")
+            except PermissionError:
+                print("⚠️ Could not delete the vector store folder because it is in use.")
+                print("👉 Try restarting your terminal or VS Code.")
+
+    _bump_collection_generation()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Chunk splitting sized by the embedding model's own tokenizer.
+
+all-MiniLM-L6-v2 reads at most EMBEDDING_MAX_TOKENS word pieces per text,
+[CLS] and [SEP] included, and silently drops the rest. Chunks are measured
+in the model's word pieces instead of characters, so every stored chunk
+fits the window: nothing embedded is thrown away, and chunks are as long
+as the model allows instead of a fixed, conservative character count.
+
+chunker.chunk_document and the split stage of the ingestion pipeline
+(vectorstore/pipeline.py) both split with split_text. The tokenizer is the
+one of the loaded embedding model (store.get_embedding_model), so it can't
+drift from the model that encodes the chunks. If the model can't be loaded
+(offline, no cached copy), lengths are estimated at EST_CHARS_PER_TOKEN
+characters per word piece, which errs on the short side for English text.
+Estimated boundaries differ from the real ones, and so do the chunk ids
+derived from them: the pipeline does not ingest on the estimate (see
+using_estimate).
+"""
+
+import threading
+import time
+from functools import lru_cache
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+# sentence-transformers' max_seq_length for the model.
+EMBEDDING_MAX_TOKENS = 256
+# Word pieces of text per chunk: the window minus [CLS] and [SEP].
+CHUNK_TOKENS = EMBEDDING_MAX_TOKENS - 2
+CHUNK_OVERLAP_TOKENS = 48
+# Fragments shorter than this (stray headers, page numbers) are dropped.
+MIN_CHUNK_CHARS = 40
+EST_CHARS_PER_TOKEN = 3
+# After a failed tokenizer load, seconds before it is tried again.
+TOKENIZER_RETRY_SECONDS = 30
+
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+_tokenizer_lock = threading.Lock()
+_tokenizer = None
+# time.monotonic() of the last failed load, if it hasn't loaded since.
+_tokenizer_failed_at = None
+
+
+def _get_tokenizer():
+    """
+    The embedding model's tokenizer, or None if the model can't be loaded.
+    A failed load (e.g. the hub offline) is retried once TOKENIZER_RETRY_SECONDS
+    have passed, so a transient error doesn't stick for the whole process.
+    """
+    global _tokenizer, _tokenizer_failed_at
+    if _tokenizer is None:
+        # Split workers run in threads; only one of them loads the tokenizer.
+        with _tokenizer_lock:
+            retry = (_tokenizer_failed_at is None
+                     or time.monotonic() - _tokenizer_failed_at >= TOKENIZER_RETRY_SECONDS)
+            if _tokenizer is None and retry:
+                try:
+                    from vectorstore.store import get_embedding_model
+                    _tokenizer = get_embedding_model().tokenizer
+                    _tokenizer_failed_at = None
+                except Exception as e:
+                    print(f"⚠️ Embedding model tokenizer unavailable ({type(e).__name__}); "
+                          f"estimating word pieces as characters / {EST_CHARS_PER_TOKEN}")
+                    _tokenizer_failed_at = time.monotonic()
+    return _tokenizer
+
+
+def using_estimate():
+    """True if chunk lengths are estimated because the tokenizer is unavailable."""
+    return _get_tokenizer() is None
+
+
+def count_tokens(text):
+    """Word pieces the embedding model sees for text, special tokens excluded."""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // EST_CHARS_PER_TOKEN)
+    return len(tokenizer.tokenize(text))
+
+
+def _fit_window(chunk, max_tokens):
+    """Cuts chunk into pieces of at most max_tokens (only needed for unbreakable runs)."""
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        size = max_tokens * EST_CHARS_PER_TOKEN
+        return [chunk[i:i + size] for i in range(0, len(chunk), size)]
+    offsets = tokenizer(chunk, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+    pieces = []
+    for i in range(0, len(offsets), max_tokens):
+        window = offsets[i:i + max_tokens]
+        pieces.append(chunk[window[0][0]:window[-1][1]])
+    return pieces
+
+
+@lru_cache(maxsize=4)
+def get_text_splitter(chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens,
+        chunk_overlap=overlap_tokens,
+        length_function=count_tokens,
+        separators=SEPARATORS
+    )
+
+
+def split_text(text, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Splits text into chunks of at most chunk_tokens word pieces, breaking
+    at paragraphs, lines, sentences and words in that order of preference.
+    """
+    chunks = []
+    for chunk in get_text_splitter(chunk_tokens, overlap_tokens).split_text(text):
+        # Merged pieces can tokenize slightly longer than their parts.
+        pieces = [chunk] if count_tokens(chunk) <= chunk_tokens else _fit_window(chunk, chunk_tokens)
+        chunks.extend(piece for piece in pieces if len(piece.strip()) >= MIN_CHUNK_CHARS)
+    return chunks